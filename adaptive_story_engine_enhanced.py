@@ -8,12 +8,29 @@ import os
 os.environ['TRANSFORMERS_NO_ADVISORY_WARNINGS'] = '1'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
-# Import only GPT2 models to avoid triggering Auto classes that import TensorFlow
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-# Lazy import for Auto classes only when needed
+# torch and transformers take seconds to import - nothing here imports them until a
+# model is actually loaded, so the server binds its port (and answers /healthz) at once
+_torch = None
+_GPT2Classes = None
 _AutoModelForCausalLM = None
 _AutoTokenizer = None
 
+def get_torch():
+    """Lazy import of torch (first model load or generation pays for it)"""
+    global _torch
+    if _torch is None:
+        import torch
+        _torch = torch
+    return _torch
+
+def get_gpt2_classes():
+    """Lazy import of (GPT2LMHeadModel, GPT2Tokenizer) - only GPT2 classes, so Auto classes don't pull in TensorFlow"""
+    global _GPT2Classes
+    if _GPT2Classes is None:
+        from transformers import GPT2LMHeadModel, GPT2Tokenizer
+        _GPT2Classes = (GPT2LMHeadModel, GPT2Tokenizer)
+    return _GPT2Classes
+
 def get_auto_model():
     """Lazy import of AutoModelForCausalLM to avoid TensorFlow import on startup"""
     global _AutoModelForCausalLM
@@ -30,12 +47,84 @@ def get_auto_tokenizer():
         _AutoTokenizer = AutoTokenizer
     return _AutoTokenizer
 
-import torch
+import hashlib
 import re
-from typing import List, Dict, Tuple, Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Hashable, List, Dict, Tuple, Optional
 from enum import Enum
 from collections import defaultdict
 
+from background_tasks import get_background_worker
+from generation_cache import GenerationCache, get_generation_cache, make_cache_key
+from metrics import get_metrics
+from model_artifacts import find_artifact, load_artifact
+from output_constraints import (
+    BREAK_MARKERS, META_MARKERS, ChoiceListFormat, compile_choice_format, compile_constraints, contains_word,
+    looks_like_code
+)
+from sampling_profiler import get_torch_op_profiler
+
+
+# Loaded tokenizers/models, shared by every engine for the same model name
+_pretrained = {}  # model_name -> (tokenizer, model)
+_pretrained_locks = {}  # model_name -> lock held while that model loads
+_pretrained_lock = threading.Lock()
+_padding_side_lock = threading.Lock()  # Shared tokenizers: one padding-side swap at a time
+
+def pretrained_classes(model_name: str) -> Tuple:
+    """(tokenizer class, model class) used to load a model name"""
+    # Support different model architectures
+    # Only use GPT2 classes for actual GPT-2 models
+    is_gpt2_model = (
+        model_name in ['distilgpt2', 'gpt2', 'gpt2-medium', 'gpt2-large', 'gpt2-xl'] or
+        (model_name.startswith('gpt2') and '/' not in model_name)
+    )
+    
+    if is_gpt2_model:
+        # Standard GPT-2 models
+        GPT2LMHeadModel, GPT2Tokenizer = get_gpt2_classes()
+        return GPT2Tokenizer, GPT2LMHeadModel
+    # For GPT-Neo, OPT, Qwen, and other models - use Auto classes
+    return get_auto_tokenizer(), get_auto_model()
+
+
+def load_pretrained(model_name: str) -> Tuple:
+    """
+    Load a tokenizer and model once per process (later calls return the same objects)
+    
+    Sessions only read the weights, so one copy serves every engine - and a
+    model preloaded at boot is the one the first player gets. A model prepared
+    with `model_artifacts.py prepare` is loaded from its local artifact.
+    """
+    with _pretrained_lock:
+        if model_name in _pretrained:
+            return _pretrained[model_name]
+        load_lock = _pretrained_locks.setdefault(model_name, threading.Lock())
+    
+    with load_lock:
+        with _pretrained_lock:
+            if model_name in _pretrained:
+                return _pretrained[model_name]
+        
+        tokenizer_class, model_class = pretrained_classes(model_name)
+        artifact = find_artifact(model_name)
+        if artifact is not None:
+            tokenizer, model = load_artifact(artifact, tokenizer_class, model_class)
+        else:
+            tokenizer = tokenizer_class.from_pretrained(model_name)
+            model = model_class.from_pretrained(model_name)
+        
+        # Set padding token
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        
+        model.eval()
+        with _pretrained_lock:
+            _pretrained[model_name] = (tokenizer, model)
+        return tokenizer, model
+
 
 class StoryBeat(Enum):
     """Narrative structure following classic storytelling"""
@@ -507,6 +596,101 @@ Response: Martinez's fingers traced the edge of the photograph—torn deliberate
 """
 
 
+class StepTimer:
+    """
+    Logits processor that timestamps every decoding step - the first one marks
+    the end of the prompt prefill (duck-typed, so defining it needs no transformers import)
+    """
+    
+    def __init__(self):
+        self.step_times = []
+    
+    def __call__(self, input_ids, scores):
+        self.step_times.append(time.perf_counter())
+        return scores
+
+
+class SeededSampler:
+    """
+    Logits processor that samples each sequence's next token with its own
+    torch.Generator and leaves only that token (duck-typed, like StepTimer)
+    
+    generate() runs greedy around it, so seeded sampling never touches the
+    global RNG: other threads generating meanwhile can't change a seeded
+    output, and each row of a batch follows its own seed.
+    """
+    
+    def __init__(self, seeds: List[int], temperature: float, top_k: int, top_p: float):
+        torch = get_torch()
+        self.generators = [torch.Generator().manual_seed(seed) for seed in seeds]
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+    
+    def __call__(self, input_ids, scores):
+        torch = get_torch()
+        scores = scores.float() / self.temperature
+        
+        # Same filtering as transformers' top-k and top-p warpers
+        if self.top_k:
+            kth_best = torch.topk(scores, min(self.top_k, scores.shape[-1]), dim=-1).values[..., -1:]
+            scores = scores.masked_fill(scores < kth_best, float('-inf'))
+        if self.top_p < 1.0:
+            sorted_scores, order = torch.sort(scores, descending=False)
+            tail = sorted_scores.softmax(dim=-1).cumsum(dim=-1) <= (1 - self.top_p)
+            tail[..., -1:] = False  # Always keep the best token
+            scores = scores.masked_fill(tail.scatter(1, order, tail), float('-inf'))
+        
+        probs = scores.softmax(dim=-1).cpu()
+        chosen = torch.full_like(scores, float('-inf'))
+        for row, generator in enumerate(self.generators):
+            token_id = torch.multinomial(probs[row], 1, generator=generator).item()
+            chosen[row, token_id] = 0.0
+        return chosen
+
+
+class GenerationCancelled(Exception):
+    """A speculative generation was cancelled before it finished"""
+
+
+class CancelCheck:
+    """
+    Stopping criterion that ends generate() at the next step once its event
+    is set (duck-typed, like StepTimer - a plain bool stops every row)
+    """
+    
+    def __init__(self, event: threading.Event):
+        self.event = event
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
+
+
+# Speculative work marks its thread; every other model call counts as foreground
+_speculation = threading.local()
+_foreground_generations = 0
+_foreground_lock = threading.Lock()
+
+@contextmanager
+def speculative_generation(cancel_event: threading.Event):
+    """
+    Run model calls on this thread as cancellable speculative work
+    
+    Setting cancel_event stops the running generate() at its next step and
+    raises GenerationCancelled, so the shared model is freed for players.
+    """
+    _speculation.cancel_event = cancel_event
+    try:
+        yield
+    finally:
+        _speculation.cancel_event = None
+
+def foreground_generation_in_flight() -> bool:
+    """True while any non-speculative generate() call is running (any engine)"""
+    with _foreground_lock:
+        return _foreground_generations > 0
+
+
 class AdaptiveStoryEngine:
     """
     Enhanced engine for adaptive storytelling with advanced narrative quality
@@ -541,27 +725,7 @@ class AdaptiveStoryEngine:
         self.genre_elements = {}
         
         try:
-            # Support different model architectures
-            # Only use GPT2 classes for actual GPT-2 models
-            is_gpt2_model = (
-                model_name in ['distilgpt2', 'gpt2', 'gpt2-medium', 'gpt2-large', 'gpt2-xl'] or
-                (model_name.startswith('gpt2') and '/' not in model_name)
-            )
-            
-            if is_gpt2_model:
-                # Standard GPT-2 models
-                self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-                self.model = GPT2LMHeadModel.from_pretrained(model_name)
-            else:
-                # For GPT-Neo, OPT, Qwen, and other models - use Auto classes
-                AutoTokenizer = get_auto_tokenizer()
-                AutoModelForCausalLM = get_auto_model()
-                self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-                self.model = AutoModelForCausalLM.from_pretrained(model_name)
-            
-            # Set padding token
-            if self.tokenizer.pad_token is None:
-                self.tokenizer.pad_token = self.tokenizer.eos_token
+            self._load_model(model_name)
             
             print("✓ Model loaded successfully!")
             print(f"✓ Enhanced prompts: {'ENABLED' if use_enhanced_prompts else 'DISABLED'}\n")
@@ -617,20 +781,136 @@ class AdaptiveStoryEngine:
         self.length_penalty = 1.0  # Neutral - allow natural stopping
         self.min_new_tokens = 40  # Ensure complete thoughts (at least 1-2 sentences)
         
+        # Output filters applied while decoding (see output_constraints) - garbage and
+        # forbidden genre words are never generated, meta-text ends the generation
+        self.constrained_decoding = True
+        
         # Context management for long stories
         self.key_events = []  # Track important moments to keep in context
         
-    def start_story(self, initial_prompt: Optional[str] = None, genre: str = "mystery") -> str:
+        # Rolling summary of older history - condensed off the request path
+        # so the prompt stays roughly constant size however long the story runs
+        self.summary_keep_recent = 4  # Raw segments never folded into the summary
+        self.summary_length = 120  # Max tokens for the condensed summary
+        self._summary_state = ("", 1)  # (summary text, story_history index summarized up to)
+        self._summary_epoch = 0  # Bumped on story restart to discard stale summaries
+        
+        # Opt-in generation cache - identical requests skip the model entirely
+        self.generation_cache = None  # See enable_generation_cache
+        self.generation_seed = None  # Seeds sampling so a cached output is one the model really gives
+        self._rejected_attempts = {}  # request key -> outputs rejected so far (retries sample anew)
+        
+        # Per-stage timing (shared registry; spans are free while it is disabled)
+        self.metrics = get_metrics()
+        self.op_profiler = get_torch_op_profiler()  # Op-level profile of generate() on request
+        
+    def _load_model(self, model_name: str):
+        """Load tokenizer and model (overridden by stand-in engines that never touch a model)"""
+        self.tokenizer, self.model = load_pretrained(model_name)
+    
+    def warmup(self, max_new_tokens: int = 8) -> float:
+        """
+        Run one short generation so the first player doesn't pay one-time costs
+        (lazy initialization, kernel selection, allocator growth)
+        
+        Returns:
+            Seconds taken
+        """
+        start = time.time()
+        self._output_constraints()  # Decodes the vocabulary once per tokenizer
+        encoded = self.tokenizer(self._format_prompt("The story begins."), return_tensors='pt')
+        generation_kwargs = self._build_generation_kwargs(max_length=max_new_tokens)
+        generation_kwargs['min_new_tokens'] = 0
+        generation_kwargs['attention_mask'] = encoded['attention_mask']
+        with get_torch().no_grad():
+            self.model.generate(encoded['input_ids'], **generation_kwargs)
+        return time.time() - start
+    
+    def enable_generation_cache(self, cache: Optional[GenerationCache] = None, seed: Optional[int] = 0):
+        """
+        Reuse earlier outputs for identical requests (model, prompt, sampling params, seed)
+        
+        Args:
+            cache: Cache to use (default: the shared cache under ConfigManager.cache_dir)
+            seed: Sampling seed - makes generation deterministic so cached and
+                  fresh results agree. None keeps random sampling, and the cache
+                  then simply freezes the first sample for each prompt.
+        """
+        self.generation_cache = cache or get_generation_cache()
+        self.generation_seed = seed
+        print(f"💾 Generation cache enabled (seed: {seed})")
+    
+    def _request_key(self, full_prompt: str, generation_kwargs: Dict,
+                     output_format: Optional[ChoiceListFormat] = None) -> Optional[str]:
+        """Content key of a request - the cache key and seed source (None when neither is on)"""
+        if self.generation_cache is None and self.generation_seed is None:
+            return None
+        params = {key: value for key, value in generation_kwargs.items() if isinstance(value, (bool, int, float, str))}
+        constraints = self._output_constraints()
+        if constraints is not None:
+            params['constraints'] = constraints.signature
+        if output_format is not None:
+            params['format'] = output_format.signature
+        # A prepared half-precision artifact samples differently from the float32 hub weights
+        model_id = self.model_name
+        dtype = str(getattr(self.model, 'dtype', 'torch.float32')).replace('torch.', '')
+        if dtype != 'float32':
+            model_id = f"{model_id}@{dtype}"
+        return make_cache_key(model_id, full_prompt, params, self.generation_seed)
+    
+    def _sampling_seed(self, request_key: Optional[str]) -> Optional[int]:
+        """
+        Seed for a fresh generation of a request (None keeps unseeded sampling)
+        
+        Derived from the request and how many of its outputs were rejected, so
+        a retry samples something new and every run still retries the same way.
+        """
+        if self.generation_seed is None or request_key is None:
+            return None
+        attempt = self._rejected_attempts.get(request_key, 0)
+        digest = hashlib.blake2b(f"{request_key}:{attempt}".encode('utf-8'), digest_size=4).digest()
+        return int.from_bytes(digest, 'little')
+    
+    def _record_attempt(self, request_key: Optional[str], generated_text: str):
+        """Count a rejected output so the next attempt at the request gets a new seed"""
+        if request_key is None:
+            return
+        if generated_text:
+            self._rejected_attempts.pop(request_key, None)
+        else:
+            self._rejected_attempts[request_key] = self._rejected_attempts.get(request_key, 0) + 1
+    
+    def start_story(self, initial_prompt: Optional[str] = None, genre: str = "mystery",
+                    pregenerated: Optional[str] = None) -> str:
         """
         Start a new story with GENRE-CONSTRAINED opening
         
         Args:
             initial_prompt: Custom story opening
             genre: Story genre (mystery/detective, romcom/romance, horror)
+            pregenerated: Continuation of the genre's built-in opening made earlier
+                          by generate_opening (skips the model entirely)
             
         Returns:
             Generated story opening
         """
+        prompt = self._begin_story(initial_prompt, genre)
+        
+        if pregenerated and not initial_prompt:
+            # Ready-made continuation from the opening pool
+            full_story = pregenerated
+            self._track_key_event(full_story)
+        else:
+            full_story = self._generate_opening_continuation(prompt)
+        
+        self.story_history.append(full_story)
+        self._extract_story_elements(prompt + " " + full_story)
+        self._extract_genre_elements(full_story)
+        
+        return prompt + "\n\n" + full_story
+    
+    def _begin_story(self, initial_prompt: Optional[str], genre: str) -> str:
+        """Reset story and genre state for a new story; returns the opening prompt"""
         # Initialize genre constraints
         self.current_genre = genre
         self.genre_config = GenreConfig.get_config(genre)
@@ -641,6 +921,10 @@ class AdaptiveStoryEngine:
         print(f"   Narrative beats: {len(self.genre_config['beats'])} stages")
         print(f"   Current beat: {self.genre_config['beats'][0]}\n")
         
+        # Fresh story - forget any summary of a previous one
+        self._summary_state = ("", 1)
+        self._summary_epoch += 1
+        
         if initial_prompt:
             self.story_history = [initial_prompt]
             prompt = initial_prompt
@@ -665,6 +949,10 @@ class AdaptiveStoryEngine:
             prompt = openings.get(genre, openings["mystery"])
             self.story_history = [prompt]
         
+        return prompt
+    
+    def _generate_opening_continuation(self, prompt: str, track_events: bool = True) -> str:
+        """Continue an opening until the first user choice"""
         # Generate GENRE-CONSTRAINED continuation
         current_beat = self.genre_config["beats"][self.genre_beat_index]
         
@@ -673,18 +961,23 @@ class AdaptiveStoryEngine:
         system_instruction = ""  # GPT-2 doesn't follow instructions well
         
         # Generate initial story with auto-continuation until user choice needed
-        full_story = self._generate_until_user_choice(
+        return self._generate_until_user_choice(
             prompt,
             system_instruction=system_instruction,
             current_beat=current_beat,
-            recent_action=""
+            recent_action="",
+            track_events=track_events
         )
+    
+    def generate_opening(self, genre: str = "mystery") -> str:
+        """
+        Generate a continuation of a genre's built-in opening for later use
+        with start_story(pregenerated=...)
         
-        self.story_history.append(full_story)
-        self._extract_story_elements(prompt + " " + full_story)
-        self._extract_genre_elements(full_story)
-        
-        return prompt + "\n\n" + full_story
+        Resets this engine's story to that opening (meant for a spare engine).
+        """
+        prompt = self._begin_story(None, genre)
+        return self._generate_opening_continuation(prompt, track_events=False)
     
     def process_user_action(self, user_input: str) -> Tuple[str, str]:
         """
@@ -697,19 +990,22 @@ class AdaptiveStoryEngine:
             Tuple of (status, continuation)
         """
         # Validate user input
-        validation = self._validate_user_input(user_input)
+        with self.metrics.span('validate_input'):
+            validation = self._validate_user_input(user_input)
         
         if validation["status"] == "rejected":
             return "rejected", validation["message"]
         
         # ANALYZE PLAYER PERSONALITY from this action
-        detected_traits = self.player_profile.analyze_action(user_input)
+        with self.metrics.span('analyze_player'):
+            detected_traits = self.player_profile.analyze_action(user_input)
         
         # Add user action to history
         self.user_actions.append(user_input)
         
         # Generate story continuation with enhanced context awareness
-        context = self._build_context_with_story_elements(recent_action=user_input, max_history=2)
+        with self.metrics.span('build_context'):
+            context = self._build_context_with_story_elements(recent_action=user_input, max_history=2)
         current_beat = self.genre_config["beats"][self.genre_beat_index] if self.genre_config else "story_development"
         
         # Build system instruction
@@ -719,12 +1015,13 @@ class AdaptiveStoryEngine:
         system_instruction = self._build_continuation_instruction(severity, player_guidance, current_beat)
         
         # Generate with auto-continuation until user choice
-        adapted_story = self._generate_until_user_choice(
-            f"{context}\n\n[Action: {user_input}]",
-            system_instruction=system_instruction,
-            current_beat=current_beat,
-            recent_action=user_input
-        )
+        with self.metrics.span('generate_until_choice'):
+            adapted_story = self._generate_until_user_choice(
+                f"{context}\n\n[Action: {user_input}]",
+                system_instruction=system_instruction,
+                current_beat=current_beat,
+                recent_action=user_input
+            )
         
         # Update story history
         self.story_history.append(f"[{user_input}]")
@@ -735,6 +1032,51 @@ class AdaptiveStoryEngine:
         
         return validation["status"], adapted_story
     
+    def get_state_version(self) -> Tuple[int, int, int]:
+        """Version of the story state - changes whenever history or actions change"""
+        return (self._summary_epoch, len(self.story_history), len(self.user_actions))
+    
+    def generate_continue_narration(self, track_events: bool = True) -> str:
+        """
+        Generate the next narration segment when the player types 'continue'.
+        
+        Does not add the segment to the story - call commit_continue_narration
+        with the text that is actually shown, so speculative runs can be discarded.
+        
+        Args:
+            track_events: Record key events while generating (off for speculative runs)
+            
+        Returns:
+            Story continuation ending with a user prompt
+        """
+        context = self._build_context_with_story_elements(recent_action="", max_history=2)
+        current_beat = self.genre_config["beats"][self.genre_beat_index] if self.genre_config else "story_development"
+        player_guidance = self.player_profile.get_narrative_guidance()
+        
+        system_instruction = self._build_continuation_instruction("normal", player_guidance, current_beat)
+        
+        return self._generate_until_user_choice(
+            context,
+            system_instruction=system_instruction,
+            current_beat=current_beat,
+            recent_action="",
+            track_events=track_events
+        )
+    
+    def commit_continue_narration(self, continuation: str, track_events: bool = False):
+        """
+        Add a 'continue' narration segment to the story
+        
+        Args:
+            continuation: Narration shown to the player
+            track_events: Record key events now (needed if it was generated speculatively)
+        """
+        self.story_history.append(continuation)
+        if track_events:
+            self._track_key_event(continuation)
+        self._extract_story_elements(continuation)
+        self._extract_genre_elements(continuation)
+    
     def _validate_user_input(self, user_input: str) -> Dict:
         """Validate user input (same as original)"""
         user_lower = user_input.lower().strip()
@@ -868,22 +1210,287 @@ Continue the story:
         prompt: str,
         system_instruction: str = "",
         temperature: float = None,
-        max_length: int = None
+        max_length: int = None,
+        output_format: Optional[ChoiceListFormat] = None
     ) -> str:
         """
         Generate text with OPTIMIZED settings for instruction-tuned models
         
-        Supports both GPT-2 and Llama/Phi/Mistral instruction formats
+        Supports both GPT-2 and Llama/Phi/Mistral instruction formats. With an
+        output_format (see choice_format) decoding is constrained to its shape
+        and the result comes back in canonical form.
         """
-        if temperature is None:
-            temperature = self.temperature
-        if max_length is None:
-            max_length = self.generation_length
+        is_tinyllama, is_llama, is_instruct_model = self._get_model_family()
+        
+        if output_format is not None and max_length is None:
+            max_length = output_format.max_new_tokens
+        full_prompt = self._format_prompt(prompt, system_instruction)
+        generation_kwargs = self._build_generation_kwargs(temperature, max_length)
+        
+        request_key = self._request_key(full_prompt, generation_kwargs, output_format)
+        cache_key = request_key if self.generation_cache is not None else None
+        if cache_key:
+            with self.metrics.span('cache_lookup'):
+                cached = self.generation_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        # Tokenize with attention mask
+        with self.metrics.span('tokenize'):
+            encoded = self.tokenizer(
+                full_prompt,
+                return_tensors='pt',
+                max_length=self.max_context_length,
+                truncation=True,
+                padding=False
+            )
+        inputs = encoded['input_ids']
+        attention_mask = encoded.get('attention_mask', None)
+        
+        # Add attention mask if available
+        if attention_mask is not None:
+            generation_kwargs['attention_mask'] = attention_mask
+        
+        seed = self._sampling_seed(request_key)
+        outputs = self._model_generate(inputs, generation_kwargs, output_format, None if seed is None else [seed])
+        
+        # Decode
+        detokenize_start = time.perf_counter()
+        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        
+        # Extract only new content based on model type
+        if is_tinyllama:
+            # TinyLlama: Extract content after assistant tag
+            if "<|assistant|>" in generated_text:
+                generated_text = generated_text.split("<|assistant|>")[-1].strip()
+            generated_text = self._strip_turn_markers(generated_text)
+        elif is_llama:
+            # LLaMA 3.2: Extract content after assistant header
+            if "<|start_header_id|>assistant<|end_header_id|>" in generated_text:
+                generated_text = generated_text.split("<|start_header_id|>assistant<|end_header_id|>")[-1].strip()
+            generated_text = self._strip_turn_markers(generated_text)
+        elif is_instruct_model:
+            # For other instruct models, extract assistant response
+            if "<|assistant|>" in generated_text:
+                generated_text = generated_text.split("<|assistant|>")[-1].strip()
+                generated_text = generated_text.split("<|end|>")[0].strip()
+            else:
+                # Fallback: remove prompt
+                generated_text = generated_text[len(full_prompt):].strip()
+        else:
+            # For GPT-2: Extract new tokens only
+            prompt_length = len(self.tokenizer.encode(prompt, add_special_tokens=False))
+            new_tokens = outputs[0][prompt_length:]
+            generated_text = self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+        self.metrics.observe('story_stage_seconds', 'detokenize', time.perf_counter() - detokenize_start)
+        
+        with self.metrics.span('filter'):
+            generated_text = self._finish_text(generated_text, output_format)
+        
+        # Rejected output isn't worth keeping - a retry should get a fresh attempt
+        self._record_attempt(request_key, generated_text)
+        if cache_key and generated_text:
+            self.generation_cache.put(cache_key, generated_text)
+        
+        return generated_text
+    
+    def _generate_text_batch(
+        self,
+        prompts: List[str],
+        system_instruction: str = "",
+        temperature: float = None,
+        max_length: int = None,
+        output_format: Optional[ChoiceListFormat] = None
+    ) -> List[str]:
+        """
+        Generate continuations for several prompts in ONE model.generate call
+        
+        Same prompt formatting, sampling settings and output filtering as
+        _generate_text, so each result is interchangeable with a single call.
+        
+        Args:
+            prompts: Independent prompts (e.g. sibling branches of a story)
+            system_instruction: Shared generation instructions
+            temperature: Sampling temperature (default: engine temperature)
+            max_length: Max new tokens per prompt
+            output_format: Constrain every output to this shape (see _generate_text)
+            
+        Returns:
+            Generated text per prompt, in order ("" where output was rejected)
+        """
+        if not prompts:
+            return []
+        if len(prompts) == 1:
+            return [self._generate_text(prompts[0], system_instruction, temperature, max_length, output_format)]
+        
+        if output_format is not None and max_length is None:
+            max_length = output_format.max_new_tokens
+        full_prompts = [self._format_prompt(prompt, system_instruction) for prompt in prompts]
+        generation_kwargs = self._build_generation_kwargs(temperature, max_length)
+        
+        results = [None] * len(prompts)
+        request_keys = [
+            self._request_key(full_prompt, generation_kwargs, output_format)
+            for full_prompt in full_prompts
+        ]
+        cache_keys = request_keys if self.generation_cache is not None else [None] * len(prompts)
+        if self.generation_cache is not None:
+            for i, cache_key in enumerate(cache_keys):
+                results[i] = self.generation_cache.get(cache_key)
+        
+        # Only the prompts the cache couldn't answer go to the model
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        full_prompts = [full_prompts[i] for i in pending]
+        
+        # Decoder-only models continue from the right edge, so pad on the left
+        with _padding_side_lock:
+            padding_side = self.tokenizer.padding_side
+            self.tokenizer.padding_side = 'left'
+            try:
+                with self.metrics.span('tokenize'):
+                    encoded = self.tokenizer(
+                        full_prompts,
+                        return_tensors='pt',
+                        max_length=self.max_context_length,
+                        truncation=True,
+                        padding=True
+                    )
+            finally:
+                self.tokenizer.padding_side = padding_side
+        
+        inputs = encoded['input_ids']
+        generation_kwargs['attention_mask'] = encoded['attention_mask']
+        
+        seeds = [self._sampling_seed(request_keys[i]) for i in pending]
+        outputs = self._model_generate(inputs, generation_kwargs, output_format, None if None in seeds else seeds)
+        
+        # Everything after the (padded) prompt is new content
+        prompt_length = inputs.shape[1]
+        for i, output in zip(pending, outputs):
+            with self.metrics.span('detokenize'):
+                generated_text = self.tokenizer.decode(output[prompt_length:], skip_special_tokens=True)
+            with self.metrics.span('filter'):
+                results[i] = self._finish_text(self._strip_turn_markers(generated_text), output_format)
+            self._record_attempt(request_keys[i], results[i])
+            if cache_keys[i] and results[i]:
+                self.generation_cache.put(cache_keys[i], results[i])
+        
+        return results
+    
+    def _model_generate(self, inputs, generation_kwargs: Dict, output_format: Optional[ChoiceListFormat] = None,
+                        seeds: Optional[List[int]] = None):
+        """
+        Run model.generate, recording prefill and decode time plus tokens in/out
+        
+        Args:
+            inputs: Prompt token ids (batch x length)
+            generation_kwargs: From _build_generation_kwargs (plus attention_mask)
+            output_format: Shape every output is constrained to
+            seeds: Sampling seed per row (see SeededSampler) - None samples from the global RNG
+            
+        Returns:
+            Output token ids, prompt included
+        """
+        processors = []
+        constraints = self._output_constraints()
+        if constraints is not None:
+            # A format decides where its output ends - meta-text there starts the choices instead
+            processors.append(constraints.processor(stop=output_format is None))
+        if output_format is not None:
+            processors.append(output_format.processor())  # After the bans, so its forced tokens win
+        if seeds is not None and generation_kwargs.get('do_sample'):
+            # Samples from what the processors above left - generate itself then just takes that token
+            generation_kwargs = dict(generation_kwargs, do_sample=False)
+            processors.append(SeededSampler(
+                seeds, generation_kwargs.pop('temperature'), generation_kwargs.pop('top_k'), generation_kwargs.pop('top_p')
+            ))
+        
+        step_timer = None
+        if self.metrics.enabled:
+            step_timer = StepTimer()
+            processors.append(step_timer)
+        
+        if processors:
+            generation_kwargs = dict(generation_kwargs)
+            from transformers import LogitsProcessorList
+            generation_kwargs['logits_processor'] = LogitsProcessorList(
+                list(generation_kwargs.get('logits_processor') or []) + processors
+            )
         
-        # Detect if using instruction-tuned model
-        is_tinyllama = 'tinyllama' in self.model_name.lower()
-        is_llama = 'llama' in self.model_name.lower()
-        is_instruct_model = any(x in self.model_name.lower() for x in ['llama', 'phi', 'mistral', 'instruct', 'chat'])
+        global _foreground_generations
+        cancel_event = getattr(_speculation, 'cancel_event', None)
+        if cancel_event is not None:
+            if cancel_event.is_set():
+                raise GenerationCancelled()
+            generation_kwargs = dict(generation_kwargs)
+            from transformers import StoppingCriteriaList
+            generation_kwargs['stopping_criteria'] = StoppingCriteriaList(
+                list(generation_kwargs.get('stopping_criteria') or []) + [CancelCheck(cancel_event)]
+            )
+        else:
+            with _foreground_lock:
+                _foreground_generations += 1
+        
+        start = time.perf_counter()
+        try:
+            with get_torch().no_grad(), self.op_profiler.capture():
+                outputs = self.model.generate(inputs, **generation_kwargs)
+        finally:
+            if cancel_event is None:
+                with _foreground_lock:
+                    _foreground_generations -= 1
+        
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()  # Cut short - the partial output is useless
+        
+        if step_timer is not None:
+            end = time.perf_counter()
+            first_step = step_timer.step_times[0] if step_timer.step_times else end
+            self.metrics.observe('story_stage_seconds', 'prefill', first_step - start)
+            self.metrics.observe('story_stage_seconds', 'decode', end - first_step)
+            self.metrics.record_tokens(
+                inputs.shape[0] * inputs.shape[1],
+                outputs.shape[0] * (outputs.shape[1] - inputs.shape[1])
+            )
+        
+        return outputs
+    
+    def choice_format(
+        self,
+        num_choices: int,
+        narrative_tokens: int = 0,
+        max_choice_tokens: int = 16,
+        min_choice_chars: int = 3
+    ) -> Optional[ChoiceListFormat]:
+        """
+        Structured-output shape for narrative plus numbered choices, compiled for this tokenizer
+        
+        Pass it as output_format to _generate_text/_generate_text_batch; parse the
+        result with its parse(). Returns None where outputs can't be constrained
+        (stand-in engines), and callers then parse free text as before.
+        """
+        return compile_choice_format(self.tokenizer, num_choices, narrative_tokens, max_choice_tokens, min_choice_chars)
+    
+    def _output_constraints(self):
+        """Compiled output rules for the current tokenizer and genre (None when disabled)"""
+        if not self.constrained_decoding:
+            return None
+        forbidden = self.genre_config.get("forbidden_keywords", []) if self.genre_config else []
+        return compile_constraints(self.tokenizer, forbidden)
+    
+    def _get_model_family(self) -> Tuple[bool, bool, bool]:
+        """Detect prompt format family: (is_tinyllama, is_llama, is_instruct_model)"""
+        model_lower = self.model_name.lower()
+        is_tinyllama = 'tinyllama' in model_lower
+        is_llama = 'llama' in model_lower
+        is_instruct_model = any(x in model_lower for x in ['llama', 'phi', 'mistral', 'instruct', 'chat'])
+        return is_tinyllama, is_llama, is_instruct_model
+    
+    def _format_prompt(self, prompt: str, system_instruction: str = "") -> str:
+        """Wrap prompt in the chat format of the loaded model"""
+        is_tinyllama, is_llama, is_instruct_model = self._get_model_family()
         
         # Format prompt based on model type
         if is_tinyllama:
@@ -941,16 +1548,14 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
         else:
             full_prompt = prompt
         
-        # Tokenize with attention mask
-        encoded = self.tokenizer(
-            full_prompt,
-            return_tensors='pt',
-            max_length=self.max_context_length,
-            truncation=True,
-            padding=False
-        )
-        inputs = encoded['input_ids']
-        attention_mask = encoded.get('attention_mask', None)
+        return full_prompt
+    
+    def _build_generation_kwargs(self, temperature: float = None, max_length: int = None) -> Dict:
+        """Build model.generate keyword arguments"""
+        if temperature is None:
+            temperature = self.temperature
+        if max_length is None:
+            max_length = self.generation_length
         
         # ADVANCED generation with techniques from best story models
         generation_kwargs = {
@@ -964,65 +1569,33 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
             'early_stopping': False,
         }
         
-        # Add attention mask if available
-        if attention_mask is not None:
-            generation_kwargs['attention_mask'] = attention_mask
-        
-        # Use appropriate generation method for each model
-        if is_instruct_model:
-            # Modern models: use nucleus sampling with good parameters
-            generation_kwargs.update({
-                'do_sample': True,
-                'temperature': temperature,
-                'top_p': self.top_p,
-                'top_k': self.top_k,
-                'repetition_penalty': self.repetition_penalty,
-            })
-        else:
-            # GPT-2: traditional sampling
-            generation_kwargs.update({
-                'do_sample': True,
-                'temperature': temperature,
-                'top_p': self.top_p,
-                'top_k': self.top_k,
-                'repetition_penalty': self.repetition_penalty,
-            })
-        
-        with torch.no_grad():
-            outputs = self.model.generate(inputs, **generation_kwargs)
-        
-        # Decode
-        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Extract only new content based on model type
-        if is_tinyllama:
-            # TinyLlama: Extract content after assistant tag
-            if "<|assistant|>" in generated_text:
-                generated_text = generated_text.split("<|assistant|>")[-1].strip()
-            # Remove end tokens
-            generated_text = generated_text.split("</s>")[0].strip()
-            generated_text = generated_text.split("<|user|>")[0].strip()
-        elif is_llama:
-            # LLaMA 3.2: Extract content after assistant header
-            if "<|start_header_id|>assistant<|end_header_id|>" in generated_text:
-                generated_text = generated_text.split("<|start_header_id|>assistant<|end_header_id|>")[-1].strip()
-            # Remove end tokens
-            generated_text = generated_text.split("<|eot_id|>")[0].strip()
-            generated_text = generated_text.split("<|end_of_text|>")[0].strip()
-        elif is_instruct_model:
-            # For other instruct models, extract assistant response
-            if "<|assistant|>" in generated_text:
-                generated_text = generated_text.split("<|assistant|>")[-1].strip()
-                generated_text = generated_text.split("<|end|>")[0].strip()
-            else:
-                # Fallback: remove prompt
-                generated_text = generated_text[len(full_prompt):].strip()
-        else:
-            # For GPT-2: Extract new tokens only
-            prompt_length = len(self.tokenizer.encode(prompt, add_special_tokens=False))
-            new_tokens = outputs[0][prompt_length:]
-            generated_text = self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+        # Nucleus sampling (same settings for GPT-2 and instruction models)
+        generation_kwargs.update({
+            'do_sample': True,
+            'temperature': temperature,
+            'top_p': self.top_p,
+            'top_k': self.top_k,
+            'repetition_penalty': self.repetition_penalty,
+        })
         
+        return generation_kwargs
+    
+    def _strip_turn_markers(self, text: str) -> str:
+        """Cut generated text at the first end-of-turn marker"""
+        for marker in ["</s>", "<|user|>", "<|eot_id|>", "<|end_of_text|>", "<|end|>"]:
+            text = text.split(marker)[0]
+        return text.strip()
+    
+    def _finish_text(self, generated_text: str, output_format: Optional[ChoiceListFormat] = None) -> str:
+        """Filter free text; structured output comes back canonical (filtered as free text if it lost its shape)"""
+        if output_format is not None:
+            normalized = output_format.normalize(generated_text)
+            if normalized is not None:
+                return normalized
+        return self._filter_generated_text(generated_text)
+    
+    def _filter_generated_text(self, generated_text: str) -> str:
+        """Clean generated text; returns "" if the model produced code/markup instead of story"""
         # Aggressive filtering of garbage output
         if generated_text:
             # Remove incomplete sentences at the end
@@ -1030,15 +1603,11 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
             if len(sentences) > 1 and not generated_text.endswith(('.', '!', '?', '"')):
                 generated_text = '. '.join(sentences[:-1]) + '.'
             
-            # Filter out code/HTML/gibberish
-            garbage_indicators = [
-                '<div', '<html', '<script', '<!--', 'function(', 'document.', 
-                'var ', 'let ', 'const ', '.getElementById', 'padding:', 'margin:',
-                'class=', 'id=', 'style=', '{', '}', '=>', 'import ', 'export '
-            ]
+            # Filter out code/HTML/gibberish (constrained decoding already avoids these;
+            # cached outputs and unconstrained engines still need the check)
             
             # Check if output contains code
-            has_code = any(indicator in generated_text for indicator in garbage_indicators)
+            has_code = looks_like_code(generated_text)
             
             if has_code:
                 # This is code garbage, not a story - reject it
@@ -1046,14 +1615,14 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
                 return ""
             
             # Remove any meta-text that slipped through
-            meta_markers = ['[edit]', '**[User', '[User response', 'Chapter ', '[Story context']
-            for marker in meta_markers:
+            for marker in META_MARKERS:
                 if marker in generated_text:
                     generated_text = generated_text.split(marker)[0].strip()
             
             # Remove any text after common breaking points
-            if '---' in generated_text:
-                generated_text = generated_text.split('---')[0].strip()
+            for marker in BREAK_MARKERS:
+                if marker in generated_text:
+                    generated_text = generated_text.split(marker)[0].strip()
         
         return generated_text
     
@@ -1084,6 +1653,7 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
     def _calculate_perplexity(self, text: str) -> float:
         """Calculate perplexity to detect garbage or overly generic text"""
         try:
+            torch = get_torch()
             inputs = self.tokenizer.encode(text, return_tensors='pt', truncation=True, max_length=512)
             with torch.no_grad():
                 outputs = self.model(inputs, labels=inputs)
@@ -1118,7 +1688,12 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
         
         return True
     
-    def _generate_until_user_choice(self, prompt: str, system_instruction: str, current_beat: str, recent_action: str = "") -> str:
+    def _timed_quality_check(self, text: str) -> bool:
+        """_is_quality_text inside a 'quality_check' span (perplexity is a full forward pass)"""
+        with self.metrics.span('quality_check'):
+            return self._is_quality_text(text)
+    
+    def _generate_until_user_choice(self, prompt: str, system_instruction: str, current_beat: str, recent_action: str = "", track_events: bool = True) -> str:
         """
         Generate story segments continuously until reaching a point requiring user input.
         Uses story database to inject relevant characters, locations, and events.
@@ -1128,6 +1703,7 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
             system_instruction: Generation instructions
             current_beat: Current narrative beat
             recent_action: Most recent user action (for context relevance)
+            track_events: Record key events as segments are generated (off for speculative runs)
             
         Returns:
             Multi-paragraph story ending with user prompt
@@ -1171,6 +1747,7 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
                 # If first iteration failed, try one more time with shorter length
                 if iteration == 0:
                     print("   Retrying with shorter max_length...")
+                    self.metrics.increment('story_retries_total', 'empty')
                     segment = self._generate_text(
                         current_context,
                         system_instruction="",
@@ -1183,8 +1760,9 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
             
             # Quality check with perplexity (skip for GPT-2, only for instruct models)
             is_instruct = any(x in self.model_name.lower() for x in ['llama', 'phi', 'mistral', 'qwen', 'instruct'])
-            if is_instruct and not self._is_quality_text(segment):
+            if is_instruct and not self._timed_quality_check(segment):
                 print(f"   Retrying due to quality issues...")
+                self.metrics.increment('story_retries_total', 'quality')
                 # Try once more with adjusted temperature
                 segment = self._generate_text(
                     current_context,
@@ -1192,18 +1770,24 @@ You are a creative storytelling AI. Write compelling, coherent narrative prose.
                     max_length=100,
                     temperature=self.base_temperature - 0.1
                 )
-                if not self._is_quality_text(segment):
+                if not self._timed_quality_check(segment):
                     continue  # Skip this iteration
             
             # Validate genre consistency
-            if self.genre_config and not self._validate_genre_consistency(segment):
+            with self.metrics.span('genre_check'):
+                genre_drift = self.genre_config and not self._validate_genre_consistency(segment)
+            if genre_drift:
                 print(f"⚠️  Genre drift detected, regenerating...")
-                segment = self._regenerate_with_stronger_constraints(current_context, current_beat)
+                self.metrics.increment('story_retries_total', 'genre_drift')
+                with self.metrics.span('genre_regenerate'):
+                    segment = self._regenerate_with_stronger_constraints(current_context, current_beat)
             
             full_continuation += "\n\n" + segment if full_continuation else segment
             
             # Track key events for sliding window context
-            self._track_key_event(segment)
+            if track_events:
+                with self.metrics.span('track_events'):
+                    self._track_key_event(segment)
             
             # Check if this is a natural decision point
             # Look for indicators that the character needs to make a choice
@@ -1322,11 +1906,12 @@ Continue the narrative naturally with:
         Build enhanced context with SLIDING WINDOW approach (technique from best models).
         
         Keeps: Opening paragraph + key events + recent paragraphs
+        Once a rolling summary exists: Opening paragraph + summary + recent paragraphs
         This maintains story continuity while staying within context limits.
         
         Args:
             recent_action: The most recent user action or event
-            max_history: Number of recent story segments to include
+            max_history: Number of recent story segments to include (without a summary)
             
         Returns:
             Enhanced context string with story element reminders
@@ -1338,12 +1923,19 @@ Continue the narrative naturally with:
         if self.story_history:
             context_parts.append(self.story_history[0])
         
-        # Add key events (important moments to remember)
-        if self.key_events:
-            context_parts.extend(self.key_events[-3:])  # Last 3 key events
-        
-        # Add recent history
-        recent = self.story_history[-max_history:] if len(self.story_history) > 1 else []
+        summary, summarized_upto = self._summary_state
+        if summary:
+            # Rolling summary replaces key events and older raw history
+            context_parts.append(f"Story so far: {summary}")
+            # Every segment the summary doesn't cover yet, or it would drop out of the story
+            recent = self.story_history[max(summarized_upto, 1):]
+        else:
+            # Add key events (important moments to remember)
+            if self.key_events:
+                context_parts.extend(self.key_events[-3:])  # Last 3 key events
+            
+            # Add recent history
+            recent = self.story_history[-max_history:] if len(self.story_history) > 1 else []
         context = "\n\n".join(context_parts + recent)
         
         # Extract keywords from recent action to find relevant elements
@@ -1378,6 +1970,74 @@ Continue the narrative naturally with:
         # Just return clean context without meta-markers
         return context
     
+    def get_rolling_summary(self) -> str:
+        """Get the condensed summary of older story history (empty until first update)"""
+        return self._summary_state[0]
+    
+    def needs_summary_update(self) -> bool:
+        """True if history older than the recent window hasn't been summarized yet"""
+        _, summarized_upto = self._summary_state
+        return len(self.story_history) - self.summary_keep_recent > summarized_upto
+    
+    def update_rolling_summary(self) -> bool:
+        """
+        Fold history older than the recent window into the rolling summary.
+        
+        Works on a snapshot of the history so it can run on a background
+        thread while the player keeps acting.
+        
+        Returns:
+            True if the summary was updated
+        """
+        epoch = self._summary_epoch
+        history = list(self.story_history)
+        summary, summarized_upto = self._summary_state
+        end = len(history) - self.summary_keep_recent
+        
+        if end <= summarized_upto:
+            return False
+        
+        new_events = "\n\n".join(history[summarized_upto:end])
+        prompt = f"""Summary of the story so far:
+{summary or '(nothing yet)'}
+
+What happened next:
+{new_events}
+
+Rewrite the summary so it also covers what happened next, in at most 5 sentences. Keep character names, locations, clues and unresolved threads."""
+        
+        new_summary = self._generate_text(
+            prompt,
+            system_instruction="You condense stories into short, factual summaries.",
+            max_length=self.summary_length,
+            temperature=0.3
+        )
+        
+        if not new_summary or not new_summary.strip():
+            return False  # Try again after the next action
+        
+        if epoch != self._summary_epoch:
+            return False  # Story restarted while we were summarizing
+        
+        self._summary_state = (new_summary.strip(), end)
+        return True
+    
+    def schedule_summary_update(self, key: Optional[Hashable] = None) -> bool:
+        """
+        Queue a rolling summary update on the background worker
+        
+        Args:
+            key: Task key (defaults to one per engine); pending updates with the same key are merged
+            
+        Returns:
+            True if an update was queued
+        """
+        if not self.needs_summary_update():
+            return False
+        
+        get_background_worker().submit(key or ('summary', id(self)), self.update_rolling_summary)
+        return True
+    
     def _extract_story_elements(self, text: str):
         """Extract characters and locations (same as original)"""
         # Simple extraction
@@ -1460,7 +2120,7 @@ Continue the narrative naturally with:
         # Check for forbidden keywords
         violations = []
         for forbidden in self.genre_config.get("forbidden_keywords", []):
-            if forbidden.lower() in text_lower:
+            if contains_word(text, forbidden):
                 violations.append(f"forbidden keyword: {forbidden}")
                 self.genre_violations.append(forbidden)
         
@@ -0,0 +1,129 @@
+"""
+Background Task Worker - Runs deferred story work off the request path
+A single low-priority thread so speculative work never competes with players
+"""
+
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+
+class BackgroundWorker:
+    """Single low-priority worker thread with keyed, de-duplicated tasks"""
+
+    def __init__(self, name: str = 'story-background', nice_increment: int = 10):
+        """
+        Initialize the worker (thread starts lazily on first submit)
+
+        Args:
+            name: Thread name (shows up in profilers and stack dumps)
+            nice_increment: How much to lower the worker thread's scheduling priority
+        """
+        self.name = name
+        self.nice_increment = nice_increment
+        self._tasks = OrderedDict()  # key -> (fn, args, kwargs)
+        self._condition = threading.Condition()
+        self._running_key = None
+        self._thread = None
+
+        # Stats
+        self.completed = 0
+        self.failed = 0
+        self.replaced = 0
+
+    def submit(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """
+        Queue a task. A pending task with the same key is replaced, so only
+        the most recent request for a piece of work is ever run.
+        """
+        with self._condition:
+            if key in self._tasks:
+                self.replaced += 1
+            self._tasks[key] = (fn, args, kwargs)
+            self._tasks.move_to_end(key)
+            self._ensure_thread()
+            self._condition.notify()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Drop a pending task (a task that is already running finishes normally)"""
+        with self._condition:
+            return self._tasks.pop(key, None) is not None
+
+    def cancel_matching(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every pending task whose key matches predicate"""
+        with self._condition:
+            keys = [key for key in self._tasks if predicate(key)]
+            for key in keys:
+                del self._tasks[key]
+            return len(keys)
+
+    def is_pending(self, key: Hashable) -> bool:
+        """True if the task is queued or currently running"""
+        with self._condition:
+            return key in self._tasks or self._running_key == key
+
+    def is_idle(self) -> bool:
+        """True when nothing is queued or running"""
+        with self._condition:
+            return not self._tasks and self._running_key is None
+
+    def get_stats(self) -> Dict:
+        """Get worker statistics"""
+        with self._condition:
+            return {
+                'pending': len(self._tasks),
+                'running': self._running_key is not None,
+                'completed': self.completed,
+                'failed': self.failed,
+                'replaced': self.replaced
+            }
+
+    def _ensure_thread(self):
+        """Start the worker thread if needed (caller holds the lock)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _lower_priority(self):
+        """Lower this thread's scheduling priority (Linux supports per-thread nice)"""
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice_increment)
+        except (AttributeError, OSError):
+            pass  # Not supported on this platform - run at normal priority
+
+    def _run(self):
+        """Worker loop"""
+        self._lower_priority()
+
+        while True:
+            with self._condition:
+                while not self._tasks:
+                    self._condition.wait()
+                key, (fn, args, kwargs) = self._tasks.popitem(last=False)
+                self._running_key = key
+
+            try:
+                fn(*args, **kwargs)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️  Background task {key} failed: {e}")
+                traceback.print_exc()
+            finally:
+                with self._condition:
+                    self._running_key = None
+
+
+# Singleton instance
+_background_worker = None
+_background_worker_lock = threading.Lock()
+
+def get_background_worker() -> BackgroundWorker:
+    """Get or create global background worker instance"""
+    global _background_worker
+    with _background_worker_lock:
+        if _background_worker is None:
+            _background_worker = BackgroundWorker()
+    return _background_worker
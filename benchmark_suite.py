@@ -0,0 +1,447 @@
+"""
+Benchmark Suite - Offline latency benchmarks on a tiny randomly-initialized model
+Drives the engine, generators and Flask endpoints without any download and
+compares per-operation latency against a JSON baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_BASELINE_FILE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25  # Allowed slowdown of a tracked metric before the run fails
+MIN_REGRESSION_SECONDS = 0.002  # Slowdowns smaller than this are timer noise
+TRACKED_STAT = 'p50'
+BENCH_SEED = 1234
+SUITES = ('engine', 'simple', 'tree', 'server')
+
+# Model names the engine recognises: the llama one gets the TinyLlama chat format of DEFAULT_MODEL
+TINY_MODEL_NAMES = {'llama': 'tinyllama-random', 'gpt2': 'gpt2-random'}
+SPECIAL_TOKENS = ['</s>', '<|system|>', '<|user|>', '<|assistant|>', '<|endoftext|>']
+TOKENIZER_CORPUS = [
+    "The detective studied the letter under the flickering lamp.",
+    "Rain hammered the windows of the old mansion as the door creaked open.",
+    "She drew her sword and stepped into the dark corridor.",
+    "What do you do next? Search the room, follow the stranger, or run?",
+    "A scream echoed from the cellar, and the candles went out.",
+    "He whispered the password and the gate swung open without a sound.",
+    "The captain ordered the soldiers to hold the bridge until dawn.",
+    "Footsteps approached. Someone was waiting for them in the library.",
+    "The ship drifted between the stars, its engines silent and cold.",
+    "1. Open the box 2. Call for help 3. Hide behind the curtain",
+]
+
+
+def build_tiny_model(output_dir: str, arch: str = 'llama', vocab_size: int = 512) -> str:
+    """
+    Build a tiny random-weight causal LM and tokenizer on disk (no network)
+    
+    Weights come from a fixed seed, so every run benchmarks the same model.
+    
+    Args:
+        output_dir: Parent directory for the model
+        arch: 'llama' or 'gpt2'
+        vocab_size: Upper bound for the trained BPE vocabulary
+    
+    Returns:
+        Model path to pass as model_name
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+    
+    model_path = os.path.join(output_dir, TINY_MODEL_NAMES[arch])
+    
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(TOKENIZER_CORPUS * 20, trainer=trainer)
+    
+    fast_tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token='<|endoftext|>',
+        eos_token='</s>',
+        pad_token='</s>'
+    )
+    
+    if arch == 'llama':
+        from transformers import LlamaConfig, LlamaForCausalLM
+        config = LlamaConfig(
+            vocab_size=len(fast_tokenizer),
+            hidden_size=64,
+            intermediate_size=128,
+            num_hidden_layers=2,
+            num_attention_heads=4,
+            num_key_value_heads=2,
+            max_position_embeddings=2048,
+            bos_token_id=fast_tokenizer.bos_token_id,
+            eos_token_id=fast_tokenizer.eos_token_id,
+            pad_token_id=fast_tokenizer.pad_token_id
+        )
+        model_class = LlamaForCausalLM
+    elif arch == 'gpt2':
+        from transformers import GPT2Config, GPT2LMHeadModel
+        config = GPT2Config(
+            vocab_size=len(fast_tokenizer),
+            n_positions=2048,
+            n_embd=64,
+            n_layer=2,
+            n_head=2,
+            bos_token_id=fast_tokenizer.bos_token_id,
+            eos_token_id=fast_tokenizer.eos_token_id
+        )
+        model_class = GPT2LMHeadModel
+    else:
+        raise ValueError(f"Unknown architecture: {arch} (choose from {', '.join(TINY_MODEL_NAMES)})")
+    
+    torch.manual_seed(BENCH_SEED)
+    model = model_class(config)
+    model.save_pretrained(model_path)
+    fast_tokenizer.save_pretrained(model_path)
+    return model_path
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    """Collects latency samples per operation name"""
+    
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+    
+    @contextlib.contextmanager
+    def measure(self, name: str):
+        """Time the enclosed block as one sample of name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - start)
+    
+    def summary(self) -> Dict[str, Dict]:
+        """Latency distribution per operation (seconds)"""
+        result = {}
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            result[name] = {
+                'count': len(ordered),
+                'mean': sum(ordered) / len(ordered),
+                'min': ordered[0],
+                'p50': percentile(ordered, 0.5),
+                'p90': percentile(ordered, 0.9),
+                'p95': percentile(ordered, 0.95),
+                'p99': percentile(ordered, 0.99),
+                'max': ordered[-1]
+            }
+        return result
+
+
+def seed_everything():
+    """Same sampling on every run, so runs generate the same number of tokens"""
+    import torch
+    torch.manual_seed(BENCH_SEED)
+
+
+def wait_for_background(timeout: float = 120.0):
+    """Let after-response work finish so it never overlaps the next measurement"""
+    from background_tasks import get_background_worker
+    deadline = time.time() + timeout
+    while not get_background_worker().is_idle() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def run_engine_suite(model_path: str, recorder: LatencyRecorder, repeat: int, workdir: str):
+    """AdaptiveStoryEngine: opening, player action, 'continue' narration"""
+    from adaptive_story_engine_enhanced import AdaptiveStoryEngine
+    
+    with recorder.measure('engine.load'):
+        engine = AdaptiveStoryEngine(model_name=model_path)
+    
+    for _ in range(repeat):
+        seed_everything()
+        with recorder.measure('engine.start_story'):
+            engine.start_story(genre='mystery')
+        with recorder.measure('engine.process_user_action'):
+            engine.process_user_action("I search the study for hidden letters")
+        with recorder.measure('engine.generate_continue_narration'):
+            engine.commit_continue_narration(engine.generate_continue_narration())
+
+
+def run_simple_suite(model_path: str, recorder: LatencyRecorder, repeat: int, workdir: str):
+    """SimpleStoryGenerator: opening scene and one generated segment"""
+    from simple_story_generator import SimpleStoryGenerator
+    
+    with recorder.measure('simple.load'):
+        generator = SimpleStoryGenerator(model_name=model_path)
+    
+    for _ in range(repeat):
+        seed_everything()
+        with recorder.measure('simple.start_story'):
+            opening = generator.start_story('detective')
+        with recorder.measure('simple.continue_story'):
+            generator.continue_story(opening['choices'][0]['text'])
+
+
+def run_tree_suite(model_path: str, recorder: LatencyRecorder, repeat: int, workdir: str):
+    """StoryTreeGenerator: one small tree per iteration"""
+    from story_tree_generator import StoryTreeGenerator
+    
+    with recorder.measure('tree.load'):
+        generator = StoryTreeGenerator(model_name=model_path)
+    
+    for _ in range(repeat):
+        seed_everything()
+        with recorder.measure('tree.generate_story_tree'):
+            generator.generate_story_tree('detective', num_nodes=6, max_depth=2)
+
+
+def run_server_suite(model_path: str, recorder: LatencyRecorder, repeat: int, workdir: str):
+    """Flask endpoints through the test client (sessions, trees and story files go to workdir)"""
+    os.chdir(workdir)
+    import web_story_server_enhanced as server
+    from story_tree_generator import StoryTreeGenerator
+    from story_tree_store import TREE_STORE_EXTENSION
+    
+    # Measure the request itself - nothing speculative running behind it
+    server.DEFAULT_MODEL = model_path
+    server.ENABLE_SPECULATIVE_CONTINUE = False
+    server.ENABLE_BRANCH_PREFETCH = False
+    server.ENABLE_OPENING_POOL = False
+    server.ENABLE_GENERATION_CACHE = False
+    client = server.app.test_client()
+    
+    tree_file = f"benchmark{TREE_STORE_EXTENSION}"
+    seed_everything()
+    generator = StoryTreeGenerator(model_name=model_path)
+    generator.generate_story_tree('detective', num_nodes=6, max_depth=2)
+    os.makedirs(server.TREES_DIR, exist_ok=True)
+    generator.save_tree(os.path.join(server.TREES_DIR, tree_file))
+    
+    def post(name: str, endpoint: str, payload: Dict) -> Dict:
+        with recorder.measure(name):
+            response = client.post(endpoint, json=payload)
+            data = response.get_json()
+            response.close()  # Runs after-response hooks, as a real server would
+        wait_for_background()
+        if not data.get('success'):
+            raise RuntimeError(f"{endpoint} failed: {data.get('error')}")
+        return data
+    
+    for _ in range(repeat):
+        seed_everything()
+        
+        # Every iteration is a fresh player
+        server.story_engines.clear()
+        server.story_generators.clear()
+        
+        started = post('server.start', '/api/start', {'genre': 'mystery'})
+        post('server.action', '/api/action', {
+            'session_id': started['session_id'],
+            'action': "I search the study for hidden letters"
+        })
+        
+        simple = post('server.start_simple_story', '/api/start-simple-story', {'genre': 'detective'})
+        post('server.continue_story', '/api/continue-story', {
+            'session_id': simple['session_id'],
+            'choice': simple['node']['choices'][0]['text']
+        })
+        
+        loaded = post('server.load_tree', '/api/load-tree', {'tree_file': tree_file})
+        post('server.play_node', '/api/play-node', {
+            'session_id': loaded['session_id'],
+            'choice': loaded['node']['choices'][0]
+        })
+        post('server.play_node_ai', '/api/play-node', {
+            'session_id': loaded['session_id'],
+            'choice': "I climb onto the roof and shout for the moon"
+        })
+
+
+SUITE_RUNNERS: Dict[str, Callable] = {
+    'engine': run_engine_suite,
+    'simple': run_simple_suite,
+    'tree': run_tree_suite,
+    'server': run_server_suite,
+}
+
+
+def get_environment(arch: str, threads: int) -> Dict:
+    """What the numbers were measured on (baselines only compare like with like)"""
+    import torch
+    import transformers
+    return {
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'transformers': transformers.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'threads': threads,
+        'arch': arch
+    }
+
+
+def run_benchmarks(suites: List[str], repeat: int = 5, arch: str = 'llama', threads: int = 1,
+                   verbose: bool = False) -> Dict:
+    """
+    Run the selected suites on a freshly built tiny model
+    
+    Args:
+        suites: Suite names from SUITES
+        repeat: Measured iterations per operation
+        arch: Tiny model architecture ('llama' or 'gpt2')
+        threads: torch intra-op threads (fixed so numbers are comparable)
+        verbose: Show the engine's own output instead of discarding it
+    
+    Returns:
+        {'environment': {...}, 'metrics': {operation: {count, mean, min, p50, p90, p95, p99, max}}}
+    """
+    import torch
+    torch.set_num_threads(threads)
+    
+    recorder = LatencyRecorder()
+    original_cwd = os.getcwd()
+    
+    with tempfile.TemporaryDirectory(prefix='story_bench_') as workdir:
+        model_path = build_tiny_model(workdir, arch=arch)
+        
+        for suite in suites:
+            print(f"⏱️  Running {suite} suite...")
+            output = sys.stdout if verbose else io.StringIO()
+            try:
+                with contextlib.redirect_stdout(output):
+                    SUITE_RUNNERS[suite](model_path, recorder, repeat, workdir)
+            finally:
+                os.chdir(original_cwd)
+    
+    return {
+        'environment': get_environment(arch, threads),
+        'metrics': recorder.summary()
+    }
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Find tracked metrics that got slower than the baseline allows
+    
+    Returns:
+        One message per regression (empty when the run passes)
+    """
+    regressions = []
+    for name, stats in results['metrics'].items():
+        base = baseline.get('metrics', {}).get(name)
+        if not base:
+            continue
+        
+        current, previous = stats[TRACKED_STAT], base[TRACKED_STAT]
+        if current > previous * (1 + threshold) and current - previous > MIN_REGRESSION_SECONDS:
+            regressions.append(
+                f"{name}: {TRACKED_STAT} {previous * 1000:.1f}ms -> {current * 1000:.1f}ms "
+                f"(+{(current / previous - 1) * 100:.0f}%, allowed +{threshold * 100:.0f}%)"
+            )
+    return regressions
+
+
+def print_report(results: Dict, baseline: Optional[Dict] = None):
+    """Print latency per operation, with the baseline's tracked stat alongside"""
+    print(f"\n{'operation':<36} {'n':>3} {'p50':>10} {'p90':>10} {'max':>10} {'baseline':>10}")
+    print("-" * 84)
+    for name, stats in results['metrics'].items():
+        base = (baseline or {}).get('metrics', {}).get(name)
+        base_text = f"{base[TRACKED_STAT] * 1000:.1f}ms" if base else "-"
+        print(f"{name:<36} {stats['count']:>3} {stats['p50'] * 1000:>8.1f}ms "
+              f"{stats['p90'] * 1000:>8.1f}ms {stats['max'] * 1000:>8.1f}ms {base_text:>10}")
+
+
+def load_baseline(filename: str) -> Optional[Dict]:
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def save_baseline(results: Dict, filename: str):
+    """Write results as the new baseline (metrics of suites not run are kept)"""
+    baseline = load_baseline(filename) or {'metrics': {}}
+    baseline['environment'] = results['environment']
+    baseline['metrics'].update(results['metrics'])
+    baseline['metrics'] = dict(sorted(baseline['metrics'].items()))
+    
+    with open(f"{filename}.tmp", 'w') as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(f"{filename}.tmp", filename)
+    print(f"\n💾 Baseline saved to {filename}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency benchmarks on a tiny random model")
+    parser.add_argument('--suites', default=','.join(SUITES),
+                        help=f"Comma-separated suites to run ({', '.join(SUITES)})")
+    parser.add_argument('--repeat', type=int, default=5, help="Measured iterations per operation")
+    parser.add_argument('--arch', choices=sorted(TINY_MODEL_NAMES), default='llama',
+                        help="Tiny model architecture")
+    parser.add_argument('--threads', type=int, default=1, help="torch threads")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE, help="Baseline JSON file")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed {TRACKED_STAT} slowdown as a fraction (0.25 = 25%%)")
+    parser.add_argument('--save-baseline', action='store_true', help="Record this run as the baseline")
+    parser.add_argument('--output', help="Also write this run's results to a JSON file")
+    parser.add_argument('--verbose', action='store_true', help="Show engine output")
+    args = parser.parse_args()
+    
+    suites = [s.strip() for s in args.suites.split(',') if s.strip()]
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        parser.error(f"Unknown suite(s): {', '.join(unknown)}")
+    
+    results = run_benchmarks(suites, repeat=args.repeat, arch=args.arch,
+                             threads=args.threads, verbose=args.verbose)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    
+    if args.save_baseline:
+        print_report(results)
+        save_baseline(results, args.baseline)
+        return 0
+    
+    baseline = load_baseline(args.baseline)
+    print_report(results, baseline)
+    
+    if baseline is None:
+        print(f"\n⚠️  No baseline at {args.baseline} - run with --save-baseline to record one")
+        return 0
+    
+    if baseline.get('environment') != results['environment']:
+        print("\n⚠️  Baseline was recorded in a different environment - comparisons may be unfair")
+    
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s):")
+        for message in regressions:
+            print(f"   {message}")
+        return 1
+    
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Choice Index - Precomputed fuzzy matching of player input to story-tree choices
+Choices are lowercased, split into words and indexed for SequenceMatcher once;
+each input is lowercased once and scored against every candidate
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+
+MATCH_THRESHOLD = 0.5  # Same confidence bar StoryTreePlayer has always used
+
+
+class ChoiceFeatures(NamedTuple):
+    """Pre-tokenized form of a choice (or of a player's input)"""
+    text: str  # Lowercased
+    words: FrozenSet[str]
+    matcher: Optional[SequenceMatcher]  # Text already indexed as seq2 (choices only)
+
+
+def extract_features(text: str) -> ChoiceFeatures:
+    """Lowercased text, its word set and a matcher indexed on it (for a choice)"""
+    lowered = text.lower()
+    return ChoiceFeatures(lowered, frozenset(lowered.split()), SequenceMatcher(None, '', lowered))
+
+
+def query_features(user_input: str) -> ChoiceFeatures:
+    """Lowercased player input and its word set"""
+    lowered = user_input.lower().strip()
+    return ChoiceFeatures(lowered, frozenset(lowered.split()), None)
+
+
+def score_features(query: ChoiceFeatures, candidate: ChoiceFeatures) -> float:
+    """
+    Match confidence of query against candidate (0-1)
+    
+    Max of the fraction of the candidate's words the player used and
+    SequenceMatcher's similarity ratio of the two texts.
+    """
+    word_overlap = len(candidate.words & query.words) / max(len(candidate.words), 1)
+    
+    # A shallow copy shares the choice's prebuilt index, so players can score concurrently
+    matcher = copy.copy(candidate.matcher)
+    matcher.set_seq1(query.text)
+    
+    return max(word_overlap, matcher.ratio())
+
+
+class ChoiceIndex:
+    """Per-node choice features for a story tree, built once and shared by its players"""
+    
+    def __init__(self, tree: Dict, max_lazy_nodes: int = 4096):
+        """
+        Index a tree's choices
+        
+        Args:
+            tree: Story tree dictionary. Plain dict trees are indexed up front;
+                  lazily loaded trees (LazyNodes) are indexed node by node as play reaches them
+            max_lazy_nodes: Indexed nodes kept for lazily loaded trees
+        """
+        self.tree = tree
+        self.max_lazy_nodes = max_lazy_nodes
+        self._entries = OrderedDict()  # node_id -> [(choice, features), ...]
+        self._eager = isinstance(tree['nodes'], dict)
+        self._lock = threading.Lock()  # Guards LRU updates when players share a lazy index
+        
+        if self._eager:
+            for node_id, node in tree['nodes'].items():
+                self._entries[node_id] = self._index_choices(node.get('choices', []))
+    
+    @staticmethod
+    def _index_choices(choices: List[Dict]) -> List[Tuple[Dict, ChoiceFeatures]]:
+        return [(choice, extract_features(choice['text'])) for choice in choices]
+    
+    def get_entries(self, node_id: str) -> List[Tuple[Dict, ChoiceFeatures]]:
+        """Indexed choices of a node (empty for unknown nodes)"""
+        if self._eager:
+            return self._entries.get(node_id, [])
+        
+        with self._lock:
+            entries = self._entries.get(node_id)
+            if entries is not None:
+                self._entries.move_to_end(node_id)
+                return entries
+        
+        node = self.tree['nodes'].get(node_id)
+        if node is None:
+            return []
+        
+        entries = self._index_choices(node.get('choices', []))
+        with self._lock:
+            self._entries[node_id] = entries
+            if len(self._entries) > self.max_lazy_nodes:
+                self._entries.popitem(last=False)
+        return entries
+    
+    def match(self, node_id: str, user_input: str, threshold: float = MATCH_THRESHOLD) -> Optional[Dict]:
+        """Best choice at node_id for user_input, or None below threshold"""
+        result = self.match_nodes([node_id], user_input, threshold)
+        return result[1] if result else None
+    
+    def match_nodes(self, node_ids: Iterable[str], user_input: str,
+                    threshold: float = MATCH_THRESHOLD) -> Optional[Tuple[str, Dict, float]]:
+        """
+        Score user_input against the choices of several nodes in one pass
+        (e.g. the player's history, for "go back to the study" style jumps)
+        
+        Returns:
+            (node_id, choice, score) of the best match, or None below threshold
+        """
+        query = query_features(user_input)
+        candidates = [
+            (node_id, choice, features)
+            for node_id in node_ids
+            for choice, features in self.get_entries(node_id)
+        ]
+        
+        # Direct match
+        for node_id, choice, features in candidates:
+            if features.text == query.text:
+                return node_id, choice, 1.0
+        
+        # Fuzzy match
+        best = None
+        best_score = 0.0
+        
+        for node_id, choice, features in candidates:
+            score = score_features(query, features)
+            if score > best_score:
+                best, best_score = (node_id, choice), score
+                if score == 1.0:
+                    return node_id, choice, score
+        
+        if best is not None and best_score > threshold:
+            return best[0], best[1], best_score
+        return None
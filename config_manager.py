@@ -113,7 +113,8 @@ class ConfigManager:
             "port": 5001,
             "theme": "fallout_green",
             "typing_speed": 30,
-            "enable_sound": False
+            "enable_sound": False,
+            "generation_cache_mb": 256
         }
         
         self.save_config(default_config)
@@ -13,34 +13,72 @@ let flaskProcess;
 const FLASK_PORT = 5000;
 const FLASK_URL = `http://127.0.0.1:${FLASK_PORT}`;
 
+const READY_TIMEOUT_MS = 15 * 60 * 1000; // First run may download the model
+
 /**
- * Check if Flask server is running
+ * GET a JSON endpoint of the Flask server
+ * Resolves to { statusCode, body } or null if the server isn't answering
  */
-function checkFlaskServer() {
+function getJson(urlPath) {
     return new Promise((resolve) => {
-        const req = http.get(FLASK_URL, (res) => {
-            resolve(res.statusCode === 200);
+        const req = http.get(`${FLASK_URL}${urlPath}`, (res) => {
+            let data = '';
+            res.on('data', (chunk) => { data += chunk; });
+            res.on('end', () => {
+                let body = {};
+                try {
+                    body = JSON.parse(data);
+                } catch (error) {
+                    // Not JSON - status code is enough
+                }
+                resolve({ statusCode: res.statusCode, body });
+            });
         });
-        req.on('error', () => resolve(false));
+        req.on('error', () => resolve(null));
         req.setTimeout(1000, () => {
             req.destroy();
-            resolve(false);
+            resolve(null);
         });
     });
 }
 
 /**
- * Wait for Flask server to start
+ * Wait for Flask server to start (/healthz) and its model to be loaded and warm (/readyz)
  */
-async function waitForFlask(maxAttempts = 30) {
-    for (let i = 0; i < maxAttempts; i++) {
-        const isRunning = await checkFlaskServer();
-        if (isRunning) {
-            console.log('✅ Flask server is ready!');
-            return true;
+async function waitForFlask(timeoutMs = READY_TIMEOUT_MS) {
+    const deadline = Date.now() + timeoutMs;
+    let lastStatus = null;
+    
+    while (Date.now() < deadline) {
+        if (flaskProcess && flaskProcess.exitCode !== null) {
+            console.error('❌ Flask server exited before becoming ready');
+            return false;
+        }
+        
+        const health = await getJson('/healthz');
+        if (health && health.statusCode === 200) {
+            const ready = await getJson('/readyz');
+            const status = ready ? ready.body.status : 'unknown';
+            
+            if (ready && ready.statusCode === 200) {
+                console.log('✅ Flask server is ready!');
+                return true;
+            }
+            if (status === 'failed') {
+                // Server works; the first story will retry loading and show the error
+                console.error(`⚠️  Model preload failed: ${ready.body.error}`);
+                return true;
+            }
+            if (status !== lastStatus) {
+                console.log(`⏳ Flask server is up - model ${status}...`);
+                lastStatus = status;
+            }
+        } else if (lastStatus === null) {
+            console.log('⏳ Waiting for Flask server to start...');
+            lastStatus = 'starting';
         }
-        console.log(`⏳ Waiting for Flask server... (${i + 1}/${maxAttempts})`);
-        await new Promise(resolve => setTimeout(resolve, 1000));
+        
+        await new Promise(resolve => setTimeout(resolve, 500));
     }
     return false;
 }
@@ -84,8 +122,8 @@ function startFlaskServer() {
             console.log(`Flask process exited with code ${code}`);
         });
         
-        // Give Flask a moment to start
-        setTimeout(() => resolve(), 2000);
+        // Readiness is polled in waitForFlask - no need to guess a startup delay
+        flaskProcess.on('spawn', () => resolve());
     });
 }
 
@@ -0,0 +1,110 @@
+"""
+Engine Pool - Process-wide, lazily loaded story engines shared between players
+A model is loaded the first time someone actually needs it, then reused by everyone
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+DEFAULT_FALLBACK_MODEL = 'TinyLlama/TinyLlama-1.1B-Chat-v1.0'
+
+
+class EnginePool:
+    """Shares one AdaptiveStoryEngine per model across all callers"""
+    
+    def __init__(self):
+        self._engines = {}  # model_name -> engine
+        self._load_locks = {}  # model_name -> lock held while that model loads
+        self._use_locks = {}  # model_name -> lock serializing generation on that engine
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.leases = 0
+    
+    def get(self, model_name: str = DEFAULT_FALLBACK_MODEL):
+        """
+        Get the shared engine for a model, loading it on first use
+        
+        Concurrent first callers wait for a single load instead of loading twice.
+        """
+        with self._lock:
+            if model_name in self._engines:
+                return self._engines[model_name]
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+        
+        with load_lock:
+            with self._lock:
+                if model_name in self._engines:
+                    return self._engines[model_name]
+            
+            # Imported here so players that never leave the tree never pay for torch
+            from adaptive_story_engine_enhanced import AdaptiveStoryEngine
+            
+            print(f"🤖 Loading shared engine: {model_name}")
+            start = time.time()
+            engine = AdaptiveStoryEngine(model_name=model_name, use_enhanced_prompts=True)
+            elapsed = time.time() - start
+            
+            with self._lock:
+                self._engines[model_name] = engine
+                self._use_locks[model_name] = threading.Lock()
+                self.loads += 1
+                self.load_seconds += elapsed
+            print(f"✅ Shared engine ready in {elapsed:.1f}s")
+            
+            return engine
+    
+    @contextmanager
+    def lease(self, model_name: str = DEFAULT_FALLBACK_MODEL) -> Iterator:
+        """Borrow the shared engine for one generation (one caller at a time per model)"""
+        engine = self.get(model_name)
+        with self._lock:
+            use_lock = self._use_locks.setdefault(model_name, threading.Lock())
+            self.leases += 1
+        
+        with use_lock:
+            yield engine
+    
+    def loaded_engines(self) -> Dict:
+        """Currently loaded engines by model name"""
+        with self._lock:
+            return dict(self._engines)
+    
+    def is_loaded(self, model_name: str = DEFAULT_FALLBACK_MODEL) -> bool:
+        """True if the model is already loaded"""
+        with self._lock:
+            return model_name in self._engines
+    
+    def unload(self, model_name: str) -> bool:
+        """Drop a shared engine (current leases keep their reference until done)"""
+        with self._lock:
+            self._use_locks.pop(model_name, None)
+            return self._engines.pop(model_name, None) is not None
+    
+    def get_stats(self) -> Dict:
+        """Get pool statistics"""
+        with self._lock:
+            return {
+                'loaded_models': list(self._engines),
+                'loads': self.loads,
+                'load_seconds': round(self.load_seconds, 2),
+                'leases': self.leases
+            }
+
+
+# Singleton instance
+_engine_pool = None
+_engine_pool_lock = threading.Lock()
+
+def get_engine_pool() -> EnginePool:
+    """Get or create global engine pool instance"""
+    global _engine_pool
+    with _engine_pool_lock:
+        if _engine_pool is None:
+            _engine_pool = EnginePool()
+    return _engine_pool
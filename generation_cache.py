@@ -0,0 +1,185 @@
+"""
+Generation Cache - Content-addressed disk cache for model outputs
+Keyed by model, full prompt, sampling params and seed; LRU-evicted under a size cap
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def make_cache_key(model_id: str, prompt: str, params: Dict[str, Any], seed: Optional[int]) -> str:
+    """Content address of one generation request"""
+    payload = json.dumps(
+        {'model': model_id, 'prompt': prompt, 'params': params, 'seed': seed},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GenerationCache:
+    """Disk-backed LRU of generated texts with a hot in-memory layer"""
+    
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024, memory_entries: int = 1024):
+        """
+        Open (or create) a generation cache
+        
+        Args:
+            cache_dir: Directory for cached outputs (one file per entry)
+            max_bytes: Disk size cap - least recently used entries go first
+            memory_entries: Recently used texts also kept in memory
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> text
+        self._entries = OrderedDict()  # key -> size on disk, least recently used first
+        self.total_bytes = 0
+        
+        # Stats
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+    
+    def _load_index(self):
+        """Rebuild the LRU order from file mtimes (bumped on every hit)"""
+        found = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+    
+    def get(self, key: str) -> Optional[str]:
+        """Cached text for key, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return self._memory[key]
+            
+            if key not in self._entries:
+                self.misses += 1
+                return None
+        
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)  # Persist recency for the next process
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._remember(key, text)
+            self.hits += 1
+        return text
+    
+    def put(self, key: str, text: str):
+        """Store a generated text (evicting least recently used entries over the cap)"""
+        data = text.encode('utf-8')
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        evicted = []
+        with self._lock:
+            self.total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._remember(key, text)
+            
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._memory.pop(old_key, None)
+                self.total_bytes -= size
+                self.evictions += 1
+                evicted.append(old_key)
+        
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+    
+    def _remember(self, key: str, text: str):
+        """Keep text in the in-memory layer (caller holds the lock)"""
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+    
+    def clear(self):
+        """Delete every cached entry"""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._memory.clear()
+            self.total_bytes = 0
+        
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+    
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+# Singleton instance
+_generation_cache = None
+_generation_cache_lock = threading.Lock()
+
+def get_generation_cache() -> GenerationCache:
+    """Get or create the global generation cache (under ConfigManager.cache_dir)"""
+    global _generation_cache
+    with _generation_cache_lock:
+        if _generation_cache is None:
+            from config_manager import get_config_manager
+            config = get_config_manager()
+            _generation_cache = GenerationCache(
+                os.path.join(config.cache_dir, 'generations'),
+                max_bytes=int(config.get('generation_cache_mb', 256)) * 1024 * 1024
+            )
+    return _generation_cache
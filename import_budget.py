@@ -0,0 +1,127 @@
+"""
+Import Budget - Per-module import cost of the server (python -X importtime)
+Fails when startup imports exceed the time budget or pull in a heavy ML package
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List
+
+DEFAULT_MODULE = 'web_story_server_enhanced'
+DEFAULT_BUDGET_SECONDS = 1.0
+# Deferred until a model is loaded - importing one of these at startup is a regression
+FORBIDDEN_AT_STARTUP = ('torch', 'transformers', 'tokenizers', 'tensorflow', 'accelerate')
+
+
+def measure_imports(module: str) -> List[Dict]:
+    """
+    Import module in a fresh interpreter with -X importtime
+    
+    Runs from a scratch directory (the server reads and writes session files
+    in its working directory) with this repo on the path.
+    
+    Returns:
+        One {'module', 'self_us', 'cumulative_us', 'depth'} per module imported by `module`
+        (itself last, at depth 0) - interpreter startup imports are left out
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [repo_dir, env.get('PYTHONPATH')]))
+    
+    with tempfile.TemporaryDirectory(prefix='import_budget_') as workdir:
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+    
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append({
+            'module': name.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': depth
+        })
+    
+    # -X importtime lists children before their parent: the module's own
+    # subtree is the run of nested entries just before its depth-0 line
+    end = max(i for i, entry in enumerate(entries) if entry['depth'] == 0 and entry['module'] == module)
+    start = end
+    while start > 0 and entries[start - 1]['depth'] > 0:
+        start -= 1
+    return entries[start:end + 1]
+
+
+def summarize(entries: List[Dict]) -> Dict:
+    """Total import time, cost per top-level package and the forbidden packages seen"""
+    packages = defaultdict(int)
+    for entry in entries:
+        packages[entry['module'].split('.')[0]] += entry['self_us']
+    
+    imported = {entry['module'].split('.')[0] for entry in entries}
+    return {
+        'total_seconds': entries[-1]['cumulative_us'] / 1e6,
+        'modules': len(entries),
+        'packages': dict(sorted(packages.items(), key=lambda item: -item[1])),
+        'forbidden': [package for package in FORBIDDEN_AT_STARTUP if package in imported]
+    }
+
+
+def print_report(module: str, entries: List[Dict], summary: Dict, budget: float, top: int):
+    """Print the most expensive packages and direct imports"""
+    print(f"\n📦 import {module}: {summary['total_seconds']:.3f}s across {summary['modules']} modules "
+          f"(budget {budget:.2f}s)")
+    
+    print(f"\n{'package':<32} {'self':>10}")
+    print("-" * 43)
+    for package, self_us in list(summary['packages'].items())[:top]:
+        print(f"{package:<32} {self_us / 1000:>8.1f}ms")
+    
+    # Direct imports of the measured module, by what they cost including their own imports
+    direct = sorted(
+        (entry for entry in entries if entry['depth'] == 1),
+        key=lambda entry: -entry['cumulative_us']
+    )
+    print(f"\n{'imported by ' + module:<32} {'cumulative':>10}")
+    print("-" * 43)
+    for entry in direct[:top]:
+        print(f"{entry['module']:<32} {entry['cumulative_us'] / 1000:>8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-module import cost and startup import budget")
+    parser.add_argument('module', nargs='?', default=DEFAULT_MODULE, help="Module to import")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help="Allowed total import time in seconds")
+    parser.add_argument('--top', type=int, default=15, help="Rows per table")
+    args = parser.parse_args()
+    
+    entries = measure_imports(args.module)
+    summary = summarize(entries)
+    print_report(args.module, entries, summary, args.budget, args.top)
+    
+    failed = False
+    if summary['forbidden']:
+        print(f"\n❌ Imported at startup: {', '.join(summary['forbidden'])} - defer these until a model loads")
+        failed = True
+    if summary['total_seconds'] > args.budget:
+        print(f"\n❌ Over budget: {summary['total_seconds']:.3f}s > {args.budget:.2f}s")
+        failed = True
+    if not failed:
+        print("\n✅ Within import budget")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""
+Load Test - Simulated concurrent players against the story server
+Scripted sessions run through web_story_server_enhanced.app on a stand-in generation
+backend, reporting throughput and p50/p95/p99 latency per endpoint
+"""
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+from adaptive_story_engine_enhanced import AdaptiveStoryEngine
+from benchmark_suite import LatencyRecorder
+
+GENRES = ['mystery', 'horror', 'thriller', 'drama', 'detective']
+SCRIPTED_ACTIONS = [
+    "I examine the letter on the desk",
+    "continue",
+    "I ask the butler where he was last night",
+    "I follow the footprints into the garden",
+    "continue",
+    "I hide behind the curtain and wait",
+    "I confront the stranger about the missing key",
+    "continue",
+]
+STAND_IN_SENTENCES = [
+    "The corridor smelled of rain and old paper.",
+    "Somewhere below, a door closed softly.",
+    "Inspector Hale turned the brass key over in his palm.",
+    "The candle guttered as a cold draft crept under the door.",
+    "Margaret's voice trembled when she spoke of the night before.",
+    "A single set of footprints led away from the greenhouse.",
+    "The clock in the hall struck eleven, then fell silent.",
+    "Nobody had seen the gardener since the storm began.",
+]
+STAND_IN_QUESTIONS = [
+    "What do you do next?",
+    "Do you open the door or wait?",
+    "Which way will you go?",
+]
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (about 1.3 tokens per word) - enough for latency modelling"""
+    return len(text.split()) * 4 // 3
+
+
+class StandInBackend:
+    """Fake model: takes as long as a model would and returns canned story text"""
+    
+    def __init__(self, token_latency: float = 0.02, prefill_latency: float = 0.0005,
+                 devices: int = 1, seed: int = 0):
+        """
+        Args:
+            token_latency: Seconds per generated token
+            prefill_latency: Seconds per prompt token (prompt processing and perplexity checks)
+            devices: Generations that can run at once (1 = one model saturating the box)
+            seed: Seed for the canned text
+        """
+        self.token_latency = token_latency
+        self.prefill_latency = prefill_latency
+        self.devices = devices
+        self._devices = threading.BoundedSemaphore(devices)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.busy_seconds = 0.0
+    
+    def generate(self, prompt: str, max_new_tokens: int) -> str:
+        """Canned continuation of about max_new_tokens tokens, after the modelled delay"""
+        text = self._compose(max_new_tokens)
+        self._run(count_tokens(prompt), count_tokens(text))
+        return text
+    
+    def score(self, text: str):
+        """Model a forward pass over text (perplexity check)"""
+        self._run(count_tokens(text), 0)
+    
+    def _compose(self, max_new_tokens: int) -> str:
+        with self._lock:
+            sentences = []
+            while count_tokens(" ".join(sentences)) < max_new_tokens * 0.75:
+                sentences.append(self._random.choice(STAND_IN_SENTENCES))
+            if self._random.random() < 0.5:
+                sentences.append(self._random.choice(STAND_IN_QUESTIONS))
+        return " ".join(sentences)
+    
+    def _run(self, tokens_in: int, tokens_out: int):
+        delay = tokens_in * self.prefill_latency + tokens_out * self.token_latency
+        with self._devices:
+            time.sleep(delay)
+        with self._lock:
+            self.calls += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+            self.busy_seconds += delay
+    
+    def get_stats(self) -> Dict:
+        """Get backend statistics"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'tokens_in': self.tokens_in,
+                'tokens_out': self.tokens_out,
+                'busy_seconds': round(self.busy_seconds, 2)
+            }
+
+
+class StandInEngine(AdaptiveStoryEngine):
+    """AdaptiveStoryEngine with the model swapped for a StandInBackend - everything else is real"""
+    
+    def __init__(self, model_name: str = 'stand-in', use_enhanced_prompts: bool = True,
+                 backend: Optional[StandInBackend] = None):
+        self.backend = backend or StandInBackend()
+        super().__init__(model_name=model_name, use_enhanced_prompts=use_enhanced_prompts)
+    
+    def _load_model(self, model_name: str):
+        self.tokenizer = None
+        self.model = None
+    
+    def choice_format(self, *args, **kwargs):
+        return None  # Canned text can't be constrained - generators parse it as free text
+    
+    def _generate_text(self, prompt: str, system_instruction: str = "",
+                       temperature: float = None, max_length: int = None, output_format=None) -> str:
+        full_prompt = self._format_prompt(prompt, system_instruction)
+        with self.metrics.span('stand_in_generate'):
+            text = self.backend.generate(full_prompt, max_length or self.generation_length)
+        self.metrics.record_tokens(count_tokens(full_prompt), count_tokens(text))
+        with self.metrics.span('filter'):
+            return self._filter_generated_text(text)
+    
+    def _generate_text_batch(self, prompts: List[str], system_instruction: str = "",
+                             temperature: float = None, max_length: int = None, output_format=None) -> List[str]:
+        return [self._generate_text(prompt, system_instruction, temperature, max_length) for prompt in prompts]
+    
+    def _calculate_perplexity(self, text: str) -> float:
+        self.backend.score(text)
+        return 0.0  # Canned text always passes
+
+
+class TestClientTransport:
+    """Requests straight into the Flask app (one client per player)"""
+    
+    def __init__(self, app):
+        self.client = app.test_client()
+    
+    def request(self, method: str, path: str, payload: Optional[Dict] = None) -> Tuple[int, Dict]:
+        response = self.client.open(path, method=method, json=payload)
+        try:
+            return response.status_code, response.get_json() or {}
+        finally:
+            response.close()  # Runs after-response hooks, as a real server would
+
+
+class HttpTransport:
+    """Real HTTP requests against a running server"""
+    
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+    
+    def request(self, method: str, path: str, payload: Optional[Dict] = None) -> Tuple[int, Dict]:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json'} if data else {}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=600) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+
+
+class PlayerSimulator:
+    """Runs scripted player sessions and records latency per endpoint"""
+    
+    def __init__(self, make_transport, actions: int = 6, poll_every: int = 2,
+                 think_time: float = 1.0, seed: int = 0):
+        """
+        Args:
+            make_transport: Callable returning a fresh transport for each player
+            actions: /api/action calls per session (every few are 'continue')
+            poll_every: Poll /api/database and /api/chapters after every N actions (0 = never)
+            think_time: Mean seconds a player reads before acting (exponentially distributed)
+            seed: Base seed for player behaviour
+        """
+        self.make_transport = make_transport
+        self.actions = actions
+        self.poll_every = poll_every
+        self.think_time = think_time
+        self.seed = seed
+        self.recorder = LatencyRecorder()
+        self._lock = threading.Lock()
+        self.errors: Dict[str, int] = {}
+        self.sessions_completed = 0
+    
+    def _call(self, transport, endpoint: str, method: str, path: str,
+              payload: Optional[Dict] = None) -> Optional[Dict]:
+        try:
+            with self.recorder.measure(endpoint):
+                status, data = transport.request(method, path, payload)
+        except Exception as e:
+            status, data = None, {'error': str(e)}
+        
+        if status != 200 or not data.get('success'):
+            with self._lock:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        return data
+    
+    def run_player(self, player_id: int, start_delay: float = 0.0):
+        """One scripted session: start, actions with 'continue' mixed in, periodic polls"""
+        rng = random.Random(self.seed + player_id)
+        transport = self.make_transport()
+        time.sleep(start_delay)
+        
+        started = self._call(transport, 'start', 'POST', '/api/start', {'genre': rng.choice(GENRES)})
+        if not started:
+            return
+        session_id = started['session_id']
+        
+        for step in range(self.actions):
+            if self.think_time > 0:
+                time.sleep(rng.expovariate(1 / self.think_time))
+            
+            action = SCRIPTED_ACTIONS[(player_id + step) % len(SCRIPTED_ACTIONS)]
+            endpoint = 'action.continue' if action == 'continue' else 'action'
+            self._call(transport, endpoint, 'POST', '/api/action', {'session_id': session_id, 'action': action})
+            
+            if self.poll_every and (step + 1) % self.poll_every == 0:
+                self._call(transport, 'database', 'GET', f'/api/database?session_id={session_id}')
+                self._call(transport, 'chapters', 'GET', f'/api/chapters?session_id={session_id}')
+        
+        with self._lock:
+            self.sessions_completed += 1
+    
+    def run(self, players: int, ramp_up: float = 0.0) -> float:
+        """
+        Run all players concurrently
+        
+        Returns:
+            Wall-clock seconds for the whole run
+        """
+        threads = [
+            threading.Thread(
+                target=self.run_player, args=(player_id, ramp_up * player_id / max(1, players)),
+                name=f'player-{player_id}', daemon=True
+            )
+            for player_id in range(players)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+    
+    def report(self, wall_seconds: float) -> Dict:
+        """Throughput and latency percentiles per endpoint"""
+        endpoints = {}
+        for endpoint, stats in self.recorder.summary().items():
+            endpoints[endpoint] = {
+                'requests': stats['count'],
+                'errors': self.errors.get(endpoint, 0),
+                'throughput_rps': round(stats['count'] / wall_seconds, 3),
+                'p50': stats['p50'],
+                'p95': stats['p95'],
+                'p99': stats['p99'],
+                'max': stats['max']
+            }
+        
+        total_requests = sum(entry['requests'] for entry in endpoints.values())
+        return {
+            'wall_seconds': round(wall_seconds, 2),
+            'sessions_completed': self.sessions_completed,
+            'requests': total_requests,
+            'errors': sum(self.errors.values()),
+            'throughput_rps': round(total_requests / wall_seconds, 3) if wall_seconds else 0.0,
+            'endpoints': endpoints
+        }
+
+
+def print_report(report: Dict, backend: StandInBackend):
+    """Print the load test results"""
+    print(f"\n{'endpoint':<18} {'reqs':>6} {'errs':>5} {'req/s':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    print("-" * 78)
+    for endpoint, entry in report['endpoints'].items():
+        print(f"{endpoint:<18} {entry['requests']:>6} {entry['errors']:>5} {entry['throughput_rps']:>7.2f} "
+              f"{entry['p50']:>8.2f}s {entry['p95']:>8.2f}s {entry['p99']:>8.2f}s {entry['max']:>8.2f}s")
+    
+    stats = backend.get_stats()
+    utilization = stats['busy_seconds'] / (report['wall_seconds'] * backend.devices) if report['wall_seconds'] else 0
+    print(f"\n👥 Sessions completed: {report['sessions_completed']} in {report['wall_seconds']}s")
+    print(f"📈 Throughput: {report['throughput_rps']} req/s ({report['errors']} errors)")
+    print(f"🤖 Backend: {stats['calls']} generations, {stats['tokens_out']} tokens out, "
+          f"{utilization * 100:.0f}% busy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent player load test on a stand-in model")
+    parser.add_argument('--players', type=int, default=8, help="Concurrent players")
+    parser.add_argument('--actions', type=int, default=6, help="Actions per session")
+    parser.add_argument('--poll-every', type=int, default=2, help="Poll database/chapters every N actions")
+    parser.add_argument('--think-time', type=float, default=1.0, help="Mean player think time (seconds)")
+    parser.add_argument('--ramp-up', type=float, default=5.0, help="Seconds over which players join")
+    parser.add_argument('--token-latency', type=float, default=0.02, help="Stand-in seconds per generated token")
+    parser.add_argument('--prefill-latency', type=float, default=0.0005, help="Stand-in seconds per prompt token")
+    parser.add_argument('--devices', type=int, default=1, help="Generations the stand-in runs at once")
+    parser.add_argument('--transport', choices=['test-client', 'http'], default='test-client',
+                        help="Call the app directly or through a threaded HTTP server")
+    parser.add_argument('--no-speculation', action='store_true',
+                        help="Disable speculative 'continue', branch prefetch and summary work")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the report to a JSON file")
+    parser.add_argument('--verbose', action='store_true', help="Show server output")
+    args = parser.parse_args()
+    
+    backend = StandInBackend(args.token_latency, args.prefill_latency, args.devices, args.seed)
+    original_cwd = os.getcwd()
+    
+    print(f"🚦 {args.players} players x {args.actions} actions "
+          f"({args.token_latency * 1000:.0f}ms/token, {args.devices} device(s))")
+    
+    with tempfile.TemporaryDirectory(prefix='story_load_') as workdir:
+        # Session files land in the scratch directory, not the real one
+        os.chdir(workdir)
+        output = sys.stdout if args.verbose else io.StringIO()
+        try:
+            with contextlib.redirect_stdout(output):
+                import web_story_server_enhanced as server
+                server.AdaptiveStoryEngine = functools.partial(StandInEngine, backend=backend)
+                server.ENABLE_OPENING_POOL = False
+                if args.no_speculation:
+                    server.ENABLE_SPECULATIVE_CONTINUE = False
+                    server.ENABLE_BRANCH_PREFETCH = False
+                    server.ENABLE_ROLLING_SUMMARY = False
+                
+                http_server = None
+                if args.transport == 'http':
+                    from werkzeug.serving import make_server
+                    http_server = make_server('127.0.0.1', 0, server.app, threaded=True)
+                    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+                    base_url = f"http://127.0.0.1:{http_server.server_port}"
+                    make_transport = lambda: HttpTransport(base_url)
+                else:
+                    make_transport = lambda: TestClientTransport(server.app)
+                
+                simulator = PlayerSimulator(make_transport, args.actions, args.poll_every,
+                                            args.think_time, args.seed)
+                wall_seconds = simulator.run(args.players, args.ramp_up)
+                
+                if http_server is not None:
+                    http_server.shutdown()
+        finally:
+            os.chdir(original_cwd)
+    
+    report = simulator.report(wall_seconds)
+    report['backend'] = backend.get_stats()
+    print_report(report, backend)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
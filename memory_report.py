@@ -0,0 +1,261 @@
+"""
+Memory Report - Approximate memory per session, shared model memory and process RSS
+Plus on-demand tracemalloc snapshots diffed against a baseline, for finding leaks in production
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+# Try to import psutil, fall back to /proc
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+# Objects from these packages are model weights/tokenizers - shared, reported separately
+SHARED_PACKAGES = {'torch', 'transformers', 'tokenizers'}
+
+# Engine attributes that grow with the story (everything else is config or shared)
+ENGINE_STATE_FIELDS = {
+    'story_history': ('story_history', 'user_actions'),
+    'key_events': ('key_events',),
+    'story_elements': ('characters', 'locations', 'genre_elements', 'genre_violations'),
+    'summary': ('_summary_state',),
+    'profile': ('player_profile',),
+}
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """
+    Approximate bytes reachable from obj (containers and plain objects)
+    
+    Shared objects - models, tokenizers, modules, classes, functions, locks - are
+    not followed. Pass the same `seen` set to several calls to avoid counting
+    an object twice.
+    """
+    if seen is None:
+        seen = set()
+    
+    total = 0
+    pending = deque([obj])
+    while pending:
+        item = pending.pop()
+        if item is None or id(item) in seen:
+            continue
+        seen.add(id(item))
+        
+        item_type = type(item)
+        if item_type.__module__.split('.')[0] in SHARED_PACKAGES or callable(item) or isinstance(item, type):
+            continue
+        if hasattr(item, 'acquire') or item_type.__module__ == 'threading':
+            continue
+        
+        total += sys.getsizeof(item, 0)
+        
+        if isinstance(item, (str, bytes, bytearray, int, float, bool)):
+            continue
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            pending.extend(item)
+        else:
+            if hasattr(item, '__dict__'):
+                pending.append(vars(item))
+            for slot in getattr(item_type, '__slots__', ()):
+                if hasattr(item, slot):
+                    pending.append(getattr(item, slot))
+    
+    return total
+
+
+def model_bytes(model) -> int:
+    """Bytes held by a model's parameters and buffers"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process (None if it can't be determined)"""
+    if HAS_PSUTIL:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def engine_state_sizes(engine, seen: set) -> Dict[str, int]:
+    """Bytes of the story state an engine accumulates, by part"""
+    sizes = {}
+    for part, fields in ENGINE_STATE_FIELDS.items():
+        sizes[part] = sum(deep_sizeof(getattr(engine, field, None), seen) for field in fields)
+    return sizes
+
+
+def session_report(kind: str, session_data: Dict) -> Dict:
+    """
+    Approximate memory of one session
+    
+    Args:
+        kind: 'adaptive', 'simple' or 'tree'
+        session_data: The session's entry in the server's session dict
+    
+    Returns:
+        {'kind', 'parts': {part: bytes}, 'total_bytes', 'model'}
+    """
+    seen = set()
+    parts = {}
+    engine = None
+    
+    if kind == 'adaptive':
+        engine = session_data['engine']
+        parts.update(engine_state_sizes(engine, seen))
+        parts['chapters'] = deep_sizeof(session_data.get('chapters'), seen)
+        parts['database'] = deep_sizeof(session_data.get('database'), seen)
+        parts['speculative_continue'] = deep_sizeof(session_data.get('speculative_continue'), seen)
+    elif kind == 'simple':
+        generator = session_data['generator']
+        engine = generator.engine
+        parts.update(engine_state_sizes(engine, seen))
+        parts['transcript'] = deep_sizeof(generator.transcript, seen)
+        parts['story_path'] = deep_sizeof(generator.story_path, seen)
+        parts['choices'] = deep_sizeof(session_data.get('choices'), seen)
+    elif kind == 'tree':
+        parts['history'] = deep_sizeof(session_data.get('history'), seen)
+    else:
+        raise ValueError(f"Unknown session kind: {kind}")
+    
+    return {
+        'kind': kind,
+        'parts': parts,
+        'total_bytes': sum(parts.values()),
+        'model': getattr(engine, 'model_name', None)
+    }
+
+
+def models_report(engines: Iterable) -> List[Dict]:
+    """Memory per distinct loaded model, with how many engines share it"""
+    models = {}
+    for engine in engines:
+        model = getattr(engine, 'model', None)
+        if model is None:
+            continue
+        entry = models.get(id(model))
+        if entry is None:
+            entry = models[id(model)] = {
+                'model': engine.model_name,
+                'bytes': model_bytes(model),
+                'engines': 0
+            }
+        entry['engines'] += 1
+    return sorted(models.values(), key=lambda entry: -entry['bytes'])
+
+
+class HeapSnapshots:
+    """tracemalloc control: start tracing, record a baseline, diff the current heap against it"""
+    
+    def __init__(self, frames: int = 10):
+        """
+        Args:
+            frames: Stack frames kept per allocation (more = better attribution, more overhead)
+        """
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._baseline = None
+        self._baseline_time = None
+    
+    def start(self) -> Dict:
+        """Start tracing allocations (only allocations made from now on are seen)"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            return self.status()
+    
+    def stop(self) -> Dict:
+        """Stop tracing and drop the baseline (tracing slows every allocation)"""
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = None
+            self._baseline_time = None
+            return self.status()
+    
+    def take_baseline(self) -> Dict:
+        """Snapshot the heap as the reference point for later diffs"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self._baseline = self._snapshot()
+            self._baseline_time = time.time()
+            return self.status()
+    
+    def diff(self, limit: int = 25, group_by: str = 'lineno') -> Dict:
+        """
+        Largest growth since the baseline
+        
+        Args:
+            limit: Number of allocation sites returned
+            group_by: 'lineno', 'filename' or 'traceback'
+        
+        Returns:
+            {'since_seconds', 'total_diff_bytes', 'top': [{'location', 'size_diff', 'count_diff', 'size'}]}
+        """
+        with self._lock:
+            if self._baseline is None:
+                raise RuntimeError("No baseline - take one first")
+            current = self._snapshot()
+            stats = current.compare_to(self._baseline, group_by)
+            since = time.time() - self._baseline_time
+        
+        top = []
+        for stat in stats[:limit]:
+            top.append({
+                'location': stat.traceback.format() if group_by == 'traceback' else str(stat.traceback[0]),
+                'size_diff': stat.size_diff,
+                'count_diff': stat.count_diff,
+                'size': stat.size
+            })
+        
+        return {
+            'since_seconds': round(since, 1),
+            'total_diff_bytes': sum(stat.size_diff for stat in stats),
+            'top': top
+        }
+    
+    def _snapshot(self):
+        """Heap snapshot without tracemalloc's own bookkeeping"""
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+    
+    def status(self) -> Dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            'tracing': tracing,
+            'frames': self.frames,
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'has_baseline': self._baseline is not None
+        }
+
+
+# Singleton instance
+_heap_snapshots = None
+_heap_snapshots_lock = threading.Lock()
+
+def get_heap_snapshots() -> HeapSnapshots:
+    """Get or create the global heap snapshot controller"""
+    global _heap_snapshots
+    with _heap_snapshots_lock:
+        if _heap_snapshots is None:
+            _heap_snapshots = HeapSnapshots()
+    return _heap_snapshots
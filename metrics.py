@@ -0,0 +1,195 @@
+"""
+Metrics - Lightweight timing spans, counters and histograms
+Aggregated in-process and rendered in Prometheus text format for /api/metrics
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, Tuple
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+# name -> (type, help, label name, buckets)
+METRIC_DEFINITIONS = {
+    'story_stage_seconds': (
+        'histogram', 'Time spent in each generation stage', 'stage', SECONDS_BUCKETS),
+    'story_http_request_seconds': (
+        'histogram', 'Request latency per endpoint', 'endpoint', SECONDS_BUCKETS),
+    'story_generation_tokens': (
+        'histogram', 'Tokens per model call (in = prompt, out = generated)', 'direction', TOKEN_BUCKETS),
+    'story_tokens_total': (
+        'counter', 'Tokens processed (in = prompt, out = generated)', 'direction', None),
+    'story_retries_total': (
+        'counter', 'Regenerations by reason', 'reason', None),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)"""
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NullSpan:
+    """Shared do-nothing span handed out while metrics are disabled"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Times the enclosed block into story_stage_seconds{stage=...}"""
+    
+    __slots__ = ('registry', 'stage', 'start')
+    
+    def __init__(self, registry: 'MetricsRegistry', stage: str):
+        self.registry = registry
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.registry.observe('story_stage_seconds', self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled histograms and counters"""
+    
+    def __init__(self, enabled: bool = False):
+        """
+        Args:
+            enabled: Record metrics (disabled spans and counters cost one attribute check)
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+    
+    def span(self, stage: str):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+    
+    def observe(self, name: str, label: str, value: float):
+        """Add one observation to a histogram"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((name, label))
+            if histogram is None:
+                histogram = Histogram(METRIC_DEFINITIONS[name][3])
+                self._histograms[(name, label)] = histogram
+            histogram.observe(value)
+    
+    def increment(self, name: str, label: str, amount: float = 1):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(name, label)] = self._counters.get((name, label), 0) + amount
+    
+    def record_tokens(self, tokens_in: int, tokens_out: int):
+        """Token counts of one model call"""
+        if not self.enabled:
+            return
+        self.observe('story_generation_tokens', 'in', tokens_in)
+        self.observe('story_generation_tokens', 'out', tokens_out)
+        self.increment('story_tokens_total', 'in', tokens_in)
+        self.increment('story_tokens_total', 'out', tokens_out)
+    
+    def reset(self):
+        """Drop everything recorded so far"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+    
+    def get_stats(self) -> Dict:
+        """Count, total and mean per histogram series plus every counter (JSON friendly)"""
+        with self._lock:
+            return {
+                'histograms': {
+                    f"{name}{{{METRIC_DEFINITIONS[name][2]}={label}}}": {
+                        'count': histogram.count,
+                        'sum': round(histogram.sum, 6),
+                        'mean': round(histogram.sum / histogram.count, 6) if histogram.count else 0.0
+                    }
+                    for (name, label), histogram in sorted(self._histograms.items())
+                },
+                'counters': {
+                    f"{name}{{{METRIC_DEFINITIONS[name][2]}={label}}}": value
+                    for (name, label), value in sorted(self._counters.items())
+                }
+            }
+    
+    def render_prometheus(self) -> str:
+        """Everything recorded, in Prometheus text exposition format"""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        
+        lines = []
+        for name, (metric_type, help_text, label_name, buckets) in METRIC_DEFINITIONS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            
+            if metric_type == 'counter':
+                for (series, label), value in sorted(counters.items()):
+                    if series == name:
+                        lines.append(f'{name}{{{label_name}="{_escape(label)}"}} {_number(value)}')
+                continue
+            
+            for (series, label), (counts, total, count) in sorted(histograms.items()):
+                if series != name:
+                    continue
+                label_text = f'{label_name}="{_escape(label)}"'
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{label_text},le="{_number(bound)}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{{label_text}}} {_number(total)}')
+                lines.append(f'{name}_count{{{label_text}}} {count}')
+        
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Singleton instance
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics() -> MetricsRegistry:
+    """Get or create the global metrics registry (disabled until enabled by the caller)"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+    return _metrics
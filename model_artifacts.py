@@ -0,0 +1,283 @@
+"""
+Model Artifacts - Pre-converted local copies of models under ConfigManager.cache_dir
+Tokenizer plus half-precision safetensors weights, with a manifest of file checksums.
+Loading one is an mmap of weights already in their final dtype instead of a full
+deserialize-and-convert from the Hugging Face cache.
+
+Usage:
+    python model_artifacts.py prepare gpt2-large --dtype bfloat16
+    python model_artifacts.py list
+    python model_artifacts.py verify gpt2-large
+    python model_artifacts.py remove gpt2-large
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+# bfloat16 keeps float32's range and runs on CPU; float16 is the usual choice on GPU
+DTYPES = ('bfloat16', 'float16', 'float32')
+DEFAULT_DTYPE = 'bfloat16'
+
+
+def artifacts_root() -> str:
+    """Directory holding every prepared model"""
+    from config_manager import get_config_manager
+    return os.path.join(get_config_manager().cache_dir, 'models')
+
+
+def artifact_path(model_name: str) -> str:
+    """Where the artifact for a model name lives (whether or not it exists)"""
+    return os.path.join(artifacts_root(), model_name.replace('/', '--'))
+
+
+def file_sha256(path: str, chunk_size: int = 8 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _artifact_checksum(files: Dict[str, Dict]) -> str:
+    """One checksum over every file's name and digest"""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}\0{files[name]['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    """Manifest of the artifact at path (None if there is no readable one)"""
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return None
+    return manifest
+
+
+def verify_artifact(path: str, full: bool = False) -> List[str]:
+    """
+    Check an artifact against its manifest
+    
+    Args:
+        path: Artifact directory
+        full: Also re-hash every file (reads all the weights - the
+              default only checks that each file is there with its size)
+    
+    Returns:
+        Problems found (empty when the artifact is intact)
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        return [f"no {MANIFEST_NAME} (format {MANIFEST_FORMAT})"]
+    
+    problems = []
+    files = manifest.get('files', {})
+    if _artifact_checksum(files) != manifest.get('checksum'):
+        problems.append("manifest checksum mismatch")
+    
+    for name, expected in files.items():
+        file_path = os.path.join(path, name)
+        if not os.path.isfile(file_path):
+            problems.append(f"{name}: missing")
+        elif os.path.getsize(file_path) != expected['bytes']:
+            problems.append(f"{name}: {os.path.getsize(file_path)} bytes, expected {expected['bytes']}")
+        elif full and file_sha256(file_path) != expected['sha256']:
+            problems.append(f"{name}: sha256 mismatch")
+    return problems
+
+
+def find_artifact(model_name: str) -> Optional[str]:
+    """
+    Path of an intact prepared artifact for model_name, if there is one
+    
+    Local model directories are already loaded from disk and are never looked up.
+    """
+    if os.path.isdir(model_name):
+        return None
+    
+    path = artifact_path(model_name)
+    if not os.path.isdir(path):
+        return None
+    
+    problems = verify_artifact(path)
+    if problems:
+        print(f"⚠️  Ignoring damaged model artifact {path}: {'; '.join(problems)}")
+        return None
+    return path
+
+
+def _loading_kwargs(dtype) -> Dict:
+    """from_pretrained arguments that keep the stored dtype and skip random initialization"""
+    kwargs = {'torch_dtype': dtype}
+    if importlib.util.find_spec('accelerate') is not None:
+        kwargs['low_cpu_mem_usage'] = True
+    return kwargs
+
+
+def load_artifact(path: str, tokenizer_class, model_class) -> Tuple:
+    """
+    Load tokenizer and model from a prepared artifact
+    
+    Weights are memory-mapped from safetensors in the dtype they were saved in.
+    
+    Returns:
+        (tokenizer, model)
+    """
+    import torch
+    
+    manifest = read_manifest(path)
+    start = time.time()
+    tokenizer = tokenizer_class.from_pretrained(path)
+    model = model_class.from_pretrained(path, **_loading_kwargs(getattr(torch, manifest['dtype'])))
+    print(f"📦 Loaded {manifest['model']} ({manifest['dtype']}) from {path} in {time.time() - start:.1f}s")
+    return tokenizer, model
+
+
+def prepare_model(model_name: str, dtype: str = DEFAULT_DTYPE, force: bool = False) -> str:
+    """
+    Convert a model once into a local artifact the engine loads from
+    
+    Args:
+        model_name: Hugging Face model name (as passed to the engine)
+        dtype: One of DTYPES - weights are stored already converted
+        force: Replace an existing artifact
+    
+    Returns:
+        Artifact directory
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+    
+    import torch
+    import transformers
+    from adaptive_story_engine_enhanced import pretrained_classes
+    
+    path = artifact_path(model_name)
+    if os.path.isdir(path) and not force:
+        manifest = read_manifest(path)
+        if manifest is not None and manifest['dtype'] == dtype and not verify_artifact(path):
+            print(f"✓ {model_name} is already prepared ({dtype}) at {path}")
+            return path
+    
+    tokenizer_class, model_class = pretrained_classes(model_name)
+    print(f"🔄 Loading {model_name} from the Hugging Face cache...")
+    tokenizer = tokenizer_class.from_pretrained(model_name)
+    model = model_class.from_pretrained(model_name, **_loading_kwargs(getattr(torch, dtype)))
+    
+    # Build next to the final location, then swap it in with one rename
+    os.makedirs(artifacts_root(), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    
+    try:
+        print(f"💾 Writing {dtype} safetensors...")
+        model.save_pretrained(tmp_path, safe_serialization=True)
+        tokenizer.save_pretrained(tmp_path)
+        
+        files = {}
+        for directory, _, names in os.walk(tmp_path):
+            for name in names:
+                file_path = os.path.join(directory, name)
+                relative = os.path.relpath(file_path, tmp_path).replace(os.sep, '/')
+                files[relative] = {'bytes': os.path.getsize(file_path), 'sha256': file_sha256(file_path)}
+        
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'model': model_name,
+            'dtype': dtype,
+            'parameters': sum(parameter.numel() for parameter in model.parameters()),
+            'model_class': type(model).__name__,
+            'tokenizer_class': type(tokenizer).__name__,
+            'torch': torch.__version__,
+            'transformers': transformers.__version__,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'files': files,
+            'checksum': _artifact_checksum(files)
+        }
+        with open(os.path.join(tmp_path, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    
+    total_mb = sum(entry['bytes'] for entry in files.values()) / 1024 / 1024
+    print(f"✅ Prepared {model_name} ({dtype}, {total_mb:.0f} MB) at {path}")
+    return path
+
+
+def list_artifacts() -> List[Dict]:
+    """Manifest of every prepared model, with its directory"""
+    root = artifacts_root()
+    if not os.path.isdir(root):
+        return []
+    
+    artifacts = []
+    for entry in sorted(os.scandir(root), key=lambda entry: entry.name):
+        manifest = read_manifest(entry.path) if entry.is_dir() else None
+        if manifest is not None:
+            artifacts.append(dict(manifest, path=entry.path))
+    return artifacts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-converted local model artifacts")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    prepare = commands.add_parser('prepare', help="Convert a model into a local artifact")
+    prepare.add_argument('model')
+    prepare.add_argument('--dtype', choices=DTYPES, default=DEFAULT_DTYPE)
+    prepare.add_argument('--force', action='store_true', help="Rebuild even if already prepared")
+    
+    commands.add_parser('list', help="Show prepared models")
+    
+    verify = commands.add_parser('verify', help="Re-hash an artifact's files against its manifest")
+    verify.add_argument('model')
+    
+    remove = commands.add_parser('remove', help="Delete an artifact (the engine falls back to the hub)")
+    remove.add_argument('model')
+    
+    args = parser.parse_args()
+    
+    if args.command == 'prepare':
+        prepare_model(args.model, args.dtype, args.force)
+    elif args.command == 'list':
+        artifacts = list_artifacts()
+        if not artifacts:
+            print(f"No prepared models in {artifacts_root()}")
+        for manifest in artifacts:
+            total_mb = sum(entry['bytes'] for entry in manifest['files'].values()) / 1024 / 1024
+            print(f"📦 {manifest['model']:<32} {manifest['dtype']:<9} {total_mb:>8.0f} MB  {manifest['created']}")
+    elif args.command == 'verify':
+        problems = verify_artifact(artifact_path(args.model), full=True)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            return 1
+        print(f"✅ {args.model} matches its manifest")
+    else:
+        path = artifact_path(args.model)
+        if not os.path.isdir(path):
+            print(f"No artifact for {args.model}")
+            return 1
+        shutil.rmtree(path)
+        print(f"🗑️  Removed {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Opening Pool - Ready-made story openings per genre, generated while the server is idle
+A new story takes one instantly instead of waiting on the model; the pool survives restarts
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from background_tasks import get_background_worker
+
+
+class OpeningPool:
+    """Persisted pool of opening continuations, keyed by model and genre"""
+    
+    def __init__(self, pool_file: str, genres: List[str], size_per_genre: int = 3):
+        """
+        Load (or create) a pool
+        
+        Args:
+            pool_file: JSON file the pool is persisted to
+            genres: Genres kept stocked
+            size_per_genre: Openings kept ready per genre
+        """
+        self.pool_file = pool_file
+        self.genres = genres
+        self.size_per_genre = size_per_genre
+        self._lock = threading.Lock()
+        self._pool = self._load()  # model -> genre -> [continuation, ...]
+        self._engines = {}  # model -> engine used for nothing but openings
+        self._engine_lock = threading.Lock()
+        
+        # Stats
+        self.served = 0
+        self.empty = 0
+        self.generated = 0
+    
+    def _load(self) -> Dict[str, Dict[str, List[str]]]:
+        if not os.path.exists(self.pool_file):
+            return {}
+        try:
+            with open(self.pool_file, 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  Could not load opening pool ({e}) - starting empty")
+            return {}
+    
+    def _save(self):
+        """Persist the pool (caller holds the lock)"""
+        with open(f"{self.pool_file}.tmp", 'w') as f:
+            json.dump(self._pool, f, indent=2)
+        os.replace(f"{self.pool_file}.tmp", self.pool_file)
+    
+    def take(self, model_name: str, genre: str) -> Optional[str]:
+        """Pop a ready opening continuation (None if the pool is empty for that genre)"""
+        with self._lock:
+            openings = self._pool.get(model_name, {}).get(genre)
+            if not openings:
+                self.empty += 1
+                return None
+            continuation = openings.pop(0)
+            self._save()
+            self.served += 1
+            return continuation
+    
+    def add(self, model_name: str, genre: str, continuation: str):
+        """Stock one opening continuation"""
+        with self._lock:
+            self._pool.setdefault(model_name, {}).setdefault(genre, []).append(continuation)
+            self._save()
+            self.generated += 1
+    
+    def next_genre_to_fill(self, model_name: str) -> Optional[str]:
+        """Genre with the fewest ready openings, or None when every genre is full"""
+        with self._lock:
+            stocked = self._pool.get(model_name, {})
+            counts = [(len(stocked.get(genre, [])), genre) for genre in self.genres]
+        count, genre = min(counts)
+        return genre if count < self.size_per_genre else None
+    
+    def _engine(self, model_name: str):
+        """
+        This pool's own engine for a model
+        
+        generate_opening resets an engine's genre, which would change the bans
+        of whoever else decodes on it - so openings never use the shared engine
+        pool. The weights are still loaded once per process and shared.
+        """
+        with self._engine_lock:
+            engine = self._engines.get(model_name)
+            if engine is None:
+                from adaptive_story_engine_enhanced import AdaptiveStoryEngine
+                engine = AdaptiveStoryEngine(model_name=model_name, use_enhanced_prompts=True)
+                self._engines[model_name] = engine
+            return engine
+    
+    def fill_one(self, model_name: str, genre: str):
+        """Generate one opening with the pool's own engine and add it to the pool (background worker only)"""
+        start = time.time()
+        continuation = self._engine(model_name).generate_opening(genre)
+        
+        if continuation and continuation.strip():
+            self.add(model_name, genre, continuation)
+            print(f"🔥 Opening pool: +1 {genre} in {time.time() - start:.1f}s")
+    
+    def schedule_refill(self, model_name: str) -> bool:
+        """
+        Queue one opening on the background worker if the pool needs it and
+        the worker has nothing else to do (openings never delay player work)
+        
+        Returns:
+            True if a refill task was queued
+        """
+        worker = get_background_worker()
+        if not worker.is_idle():
+            return False
+        
+        genre = self.next_genre_to_fill(model_name)
+        if genre is None:
+            return False
+        
+        worker.submit(('openings', model_name), self.fill_one, model_name, genre)
+        return True
+    
+    def get_stats(self) -> Dict:
+        """Get pool statistics"""
+        with self._lock:
+            return {
+                'ready': {
+                    model_name: {genre: len(openings) for genre, openings in genres.items()}
+                    for model_name, genres in self._pool.items()
+                },
+                'served': self.served,
+                'empty': self.empty,
+                'generated': self.generated
+            }
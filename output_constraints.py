@@ -0,0 +1,617 @@
+"""
+Output Constraints - The engine's post-hoc output filters compiled into logits processors
+Strings that get an output rejected are banned while decoding, and strings the output
+is cut at end the generation, so no tokens are spent on text that would be thrown away.
+ChoiceListFormat goes further and constrains the whole shape of an output: narrative,
+then exactly N short numbered choices, then the end.
+"""
+
+import bisect
+import hashlib
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Output containing any of these is code/markup, not story - banned while decoding
+CODE_MARKERS = [
+    '<div', '<html', '<script', '<!--', 'function(', '.getElementById',
+    'padding:', 'margin:', 'class=', 'id=', 'style=', '{', '}', '=>'
+]
+# Code keywords that are also plain English ("She let go") only count in code-like
+# context, so they are left to _filter_generated_text instead of banned outright
+CODE_PATTERN = re.compile(
+    r"\b(?:var|let|const)\s+[A-Za-z_$][\w$]*\s*=(?!=)"
+    r"|^\s*import\s+[\w.]+\s*;?\s*$"
+    r"|^\s*import\s.*\bfrom\s+['\"]"
+    r"|^\s*export\s+(?:default|const|function|class)\b"
+    r"|\bdocument\.[A-Za-z]",
+    re.MULTILINE
+)
+
+# Output is cut at the first of these - meta-text and breaking points, never story
+META_MARKERS = ['[edit]', '**[User', '[User response', 'Chapter ', '[Story context']
+BREAK_MARKERS = ['---']
+
+CHOICES_HEADER = 'Choices:'
+SENTENCE_ENDS = ('.', '!', '?', '"', '\u201d')
+NARRATIVE_OVERRUN = 40  # Tokens past the narrative budget allowed for finishing a sentence
+
+
+def looks_like_code(text: str) -> bool:
+    """Whether an output is code/markup rather than story"""
+    return any(marker in text for marker in CODE_MARKERS) or CODE_PATTERN.search(text) is not None
+
+
+def contains_word(text: str, word: str) -> bool:
+    """Whether text has word as a whole word, in any case ("glove" doesn't have "love")"""
+    return re.search(rf"(?<!\w){re.escape(word.lower())}(?!\w)", text.lower()) is not None
+
+
+def _is_word_char(char: str) -> bool:
+    """Same letters as \\w in contains_word"""
+    return char.isalnum() or char == '_'
+
+
+# Index tensors of the id lists the processors mask, converted once per list
+_tensors: Dict[int, Tuple[List[int], object]] = {}  # id(ids) -> (ids, LongTensor)
+
+def _as_tensor(ids: List[int], device):
+    entry = _tensors.get(id(ids))
+    if entry is None or entry[0] is not ids:
+        import torch
+        entry = (ids, torch.tensor(ids, dtype=torch.long))
+        _tensors[id(ids)] = entry
+    return entry[1].to(device)
+
+
+class VocabTable:
+    """Decoded text of every token id, searchable by prefix"""
+    
+    def __init__(self, tokenizer):
+        self.texts = self._token_texts(tokenizer)
+        self._sorted = {}  # ignore_case -> (sorted texts, ids in the same order)
+        self._prefix_ids = {}  # (prefix, ignore_case) -> ids whose text starts with prefix
+        self._word_end_ids = {}  # remainder -> ids whose text ends a word with it
+        self._nonword_start_ids = None
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _token_texts(tokenizer) -> List[str]:
+        """
+        Text each token adds when it follows other text
+        
+        Tokens are decoded after an anchor token, so SentencePiece word-start
+        tokens keep the leading space a lone decode would drop.
+        """
+        anchor = tokenizer.encode('a', add_special_tokens=False)[-1:]
+        anchor_text = tokenizer.decode(anchor, clean_up_tokenization_spaces=False)
+        decoded = tokenizer.batch_decode(
+            [anchor + [token_id] for token_id in range(len(tokenizer))],
+            clean_up_tokenization_spaces=False
+        )
+        return [text[len(anchor_text):] if text.startswith(anchor_text) else text for text in decoded]
+    
+    def ids_containing(self, strings: Sequence[str]) -> List[int]:
+        """Tokens whose text contains any of strings"""
+        if not strings:
+            return []
+        return [token_id for token_id, text in enumerate(self.texts) if any(string in text for string in strings)]
+    
+    def ids_containing_word(self, words: Sequence[str]) -> List[int]:
+        """Tokens whose text has any of words (lowercase) as a whole word, with the word's edges inside the token"""
+        if not words:
+            return []
+        return [
+            token_id for token_id, text in enumerate(self.texts)
+            if any(self._bounded_inside(text.lower(), word) for word in words)
+        ]
+    
+    @staticmethod
+    def _bounded_inside(text: str, word: str) -> bool:
+        start = text.find(word)
+        while start != -1:
+            end = start + len(word)
+            if 0 < start and end < len(text) and not _is_word_char(text[start - 1]) and not _is_word_char(text[end]):
+                return True
+            start = text.find(word, start + 1)
+        return False
+    
+    def ids_starting_with(self, prefix: str, ignore_case: bool = False) -> List[int]:
+        """Tokens whose text starts with prefix (memoized)"""
+        key = (prefix, ignore_case)
+        ids = self._prefix_ids.get(key)
+        if ids is None:
+            texts, order = self._sorted_texts(ignore_case)
+            start = bisect.bisect_left(texts, prefix)
+            end = bisect.bisect_left(texts, prefix + '\U0010ffff')
+            ids = order[start:end]
+            with self._lock:
+                self._prefix_ids[key] = ids
+        return ids
+    
+    def ids_ending_word(self, remainder: str) -> List[int]:
+        """Tokens whose text starts with remainder (lowercase) and then leaves the word (memoized)"""
+        ids = self._word_end_ids.get(remainder)
+        if ids is None:
+            ids = [
+                token_id for token_id in self.ids_starting_with(remainder, ignore_case=True)
+                if len(self.texts[token_id]) > len(remainder) and not _is_word_char(self.texts[token_id][len(remainder)])
+            ]
+            with self._lock:
+                self._word_end_ids[remainder] = ids
+        return ids
+    
+    def nonword_start_ids(self) -> List[int]:
+        """Tokens whose text starts outside a word - space, punctuation, newline (memoized)"""
+        if self._nonword_start_ids is None:
+            self._nonword_start_ids = [
+                token_id for token_id, text in enumerate(self.texts) if text and not _is_word_char(text[0])
+            ]
+        return self._nonword_start_ids
+    
+    def _sorted_texts(self, ignore_case: bool) -> Tuple[List[str], List[int]]:
+        with self._lock:
+            if ignore_case not in self._sorted:
+                texts = [text.lower() for text in self.texts] if ignore_case else self.texts
+                order = sorted(range(len(texts)), key=texts.__getitem__)
+                self._sorted[ignore_case] = ([texts[token_id] for token_id in order], order)
+            return self._sorted[ignore_case]
+
+
+class OutputConstraints:
+    """
+    Compiled rules for one tokenizer
+    
+    Banned strings never appear in the output: tokens containing one are masked
+    at every step, and while the text so far ends in the start of a banned
+    string, tokens that would complete it are masked too. Banned words are the
+    same but only as whole words, so banning "love" leaves "glove" and "loves"
+    alone. Once the output contains a stop string, the generation ends.
+    """
+    
+    def __init__(
+        self,
+        vocab: VocabTable,
+        eos_token_id: int,
+        banned: Sequence[str] = (),
+        banned_words: Sequence[str] = (),
+        stop_strings: Sequence[str] = ()
+    ):
+        """
+        Args:
+            vocab: Token texts of the tokenizer
+            eos_token_id: Token that ends a generation
+            banned: Case-sensitive banned strings, wherever they appear
+            banned_words: Banned in any letter case, as whole words (as contains_word matches them)
+            stop_strings: The output is cut at these, so generation can stop there
+        """
+        self.vocab = vocab
+        self.eos_token_id = eos_token_id
+        self.stop_strings = list(stop_strings)
+        self.banned_words = [word.lower() for word in banned_words]
+        
+        static = set(vocab.ids_containing(list(banned)))
+        static.update(vocab.ids_containing_word(self.banned_words))
+        static.discard(eos_token_id)
+        self.static_ids = sorted(static)
+        
+        # (partial match the text may end in, tokens that must not follow it)
+        self.partials = [
+            (string[:k], [token_id for token_id in vocab.ids_starting_with(string[k:]) if token_id != eos_token_id])
+            for string in banned
+            for k in range(1, len(string))
+        ]
+        
+        # Enough trailing text to hold any partial match or stop string, plus the
+        # character before a banned word
+        lengths = [len(string) for string in list(banned) + self.stop_strings]
+        lengths += [len(word) + 1 for word in self.banned_words]
+        self.tail_chars = max(lengths or [1])
+        
+        rules = repr((sorted(banned), sorted(self.banned_words), sorted(self.stop_strings)))
+        self.signature = hashlib.sha1(rules.encode('utf-8')).hexdigest()[:12]
+    
+    def processor(self, stop: bool = True) -> 'ConstraintProcessor':
+        """
+        Fresh logits processor for one model.generate call
+        
+        Args:
+            stop: End the generation at stop strings (off when a ChoiceListFormat
+                  decides where the output ends)
+        """
+        return ConstraintProcessor(self, stop)
+    
+    def masks(self, tail: str) -> Tuple[List[List[int]], bool]:
+        """
+        Tokens that must not come next
+        
+        Args:
+            tail: End of the generated text (all of it when shorter than tail_chars)
+        
+        Returns:
+            (token id lists to mask, whether ending the output here is banned too)
+        """
+        masks = [ids for partial, ids in self.partials if tail.endswith(partial)]
+        ban_eos = False
+        
+        tail_lower = tail.lower()
+        for word in self.banned_words:
+            for k in range(len(word) + 1):
+                # The text ends in the first k letters of the word, at the start of a word
+                if not tail_lower.endswith(word[:k]):
+                    continue
+                if len(tail_lower) > k and _is_word_char(tail_lower[-k - 1]):
+                    continue
+                if k < len(word):
+                    masks.append(self.vocab.ids_ending_word(word[k:]))
+                else:
+                    # The whole word is there - it may only run on into a longer word
+                    masks.append(self.vocab.nonword_start_ids())
+                    ban_eos = True
+        
+        return masks, ban_eos
+
+
+class ConstraintProcessor:
+    """
+    Logits processor applying OutputConstraints to every sequence in a batch
+    (duck-typed, like StepTimer - defining it needs no transformers import)
+    """
+    
+    def __init__(self, constraints: OutputConstraints, stop: bool = True):
+        self.constraints = constraints
+        self.stop_strings = constraints.stop_strings if stop else []
+        self.tails = None  # Recent generated text per sequence
+        self.stopped = None
+    
+    def __call__(self, input_ids, scores):
+        constraints = self.constraints
+        
+        if self.tails is None:
+            self.start(input_ids.shape[0])
+        else:
+            for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                self.advance(row, token_id)
+        
+        scores[:, _as_tensor(constraints.static_ids, scores.device)] = float('-inf')
+        
+        for row in range(input_ids.shape[0]):
+            if self.stopped[row]:
+                # The output will be cut here - end it instead of generating past it
+                scores[row] = float('-inf')
+                scores[row, constraints.eos_token_id] = 0.0
+                continue
+            
+            masks, ban_eos = constraints.masks(self.tails[row])
+            if not masks:
+                continue
+            eos_score = scores[row, constraints.eos_token_id].clone()
+            for ids in masks:
+                scores[row, _as_tensor(ids, scores.device)] = float('-inf')
+            if not ban_eos:
+                scores[row, constraints.eos_token_id] = eos_score
+        
+        return scores
+    
+    def start(self, batch_size: int):
+        """Begin a generation of batch_size sequences"""
+        self.tails = [''] * batch_size
+        self.stopped = [False] * batch_size
+    
+    def advance(self, row: int, token_id: int):
+        """Account for the token one sequence just generated"""
+        texts = self.constraints.vocab.texts
+        tail = self.tails[row] + (texts[token_id] if token_id < len(texts) else '')
+        if any(stop in tail for stop in self.stop_strings):
+            self.stopped[row] = True
+        self.tails[row] = tail[-self.constraints.tail_chars:]
+
+
+class ChoiceListFormat:
+    """
+    Output shape for story segments and choice lists, enforced while decoding
+    
+    Free narrative (skipped when narrative_tokens is 0), then "Choices:" and
+    exactly num_choices numbered one-line choices, then the end of the output.
+    The header and numbers are forced tokens; each choice is sampled but can't
+    span lines, is at least min_choice_chars long and is cut at
+    max_choice_tokens. parse() never has to guess.
+    """
+    
+    def __init__(
+        self,
+        tokenizer,
+        vocab: VocabTable,
+        num_choices: int,
+        narrative_tokens: int = 0,
+        max_choice_tokens: int = 16,
+        min_choice_chars: int = 3
+    ):
+        """
+        Args:
+            tokenizer: Tokenizer of the model generating (for the forced literals)
+            vocab: Its token texts
+            num_choices: Exact number of choices
+            narrative_tokens: Narrative budget before the choices (0 = choices only)
+            max_choice_tokens: Longest choice
+            min_choice_chars: Shortest choice
+        """
+        self.vocab = vocab
+        self.eos_token_id = tokenizer.eos_token_id
+        self.num_choices = num_choices
+        self.narrative_tokens = narrative_tokens
+        self.max_choice_tokens = max_choice_tokens
+        self.min_choice_chars = min_choice_chars
+        self.stop_strings = META_MARKERS + BREAK_MARKERS
+        
+        # A choice ends on a newline-only token; anything else with a newline in it is banned
+        self.newline_ids = [token_id for token_id, text in enumerate(vocab.texts) if text and not text.strip('\r\n')]
+        multiline = set(vocab.ids_containing(['\n'])) - set(self.newline_ids)
+        multiline.discard(self.eos_token_id)
+        self.multiline_ids = sorted(multiline)
+        # A choice opens with a word - not more numbering, punctuation or bare whitespace
+        self.opening_ids = [
+            token_id for token_id, text in enumerate(vocab.texts)
+            if token_id != self.eos_token_id and (not text.strip() or text.lstrip()[0] in '0123456789.):-')
+        ]
+        
+        self.newline = self._literal_ids(tokenizer, '\n')[:1]
+        self.header = self._literal_ids(tokenizer, f"\n\n{CHOICES_HEADER}\n1.")
+        self.after_header = self._literal_ids(tokenizer, "\n1.")  # The model wrote the header itself
+        # No space after the number: the choice's first word brings its own
+        self.numbers = {i: self._literal_ids(tokenizer, f"{i}.") for i in range(1, num_choices + 1)}
+        
+        shape = repr((num_choices, narrative_tokens, max_choice_tokens, min_choice_chars))
+        self.signature = hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+    
+    @staticmethod
+    def _literal_ids(tokenizer, text: str) -> List[int]:
+        """Token ids of text as it is tokenized following other text"""
+        anchor = tokenizer.encode('a', add_special_tokens=False)
+        ids = tokenizer.encode('a' + text, add_special_tokens=False)
+        if ids[:len(anchor)] == anchor:
+            return ids[len(anchor):]
+        return tokenizer.encode(text, add_special_tokens=False)
+    
+    @property
+    def max_new_tokens(self) -> int:
+        """Token budget that always fits the whole shape"""
+        narrative = self.narrative_tokens + NARRATIVE_OVERRUN + len(self.header) if self.narrative_tokens else 0
+        per_choice = max(len(ids) for ids in self.numbers.values()) + self.max_choice_tokens + len(self.newline)
+        return narrative + self.num_choices * per_choice + 1
+    
+    def processor(self) -> 'ChoiceListProcessor':
+        """Fresh logits processor for one model.generate call"""
+        return ChoiceListProcessor(self)
+    
+    def parse(self, text: str) -> Tuple[str, List[str]]:
+        """
+        Split an output into its narrative and numbered choices
+        
+        Returns:
+            (narrative, choices) - choices numbered 1, 2, 3... in order, at most num_choices
+        """
+        header = re.search(r'(?i)\b(?:choices|options):', text)
+        if header:
+            narrative, listing = text[:header.start()], text[header.end():]
+        else:
+            first = re.search(r'(?m)^\s*1\.', text)
+            narrative, listing = (text[:first.start()], text[first.start():]) if first else (text, '')
+        
+        choices = []
+        for line in listing.split('\n'):
+            match = re.match(r'\s*(\d+)\.\s*(.+)', line)
+            if match and int(match.group(1)) == len(choices) + 1:
+                choice = match.group(2).strip().strip('[]').rstrip(',;:').strip()
+                if choice:
+                    choices.append(choice)
+        
+        for marker in self.stop_strings:
+            narrative = narrative.split(marker)[0]
+        return narrative.strip(), choices[:self.num_choices]
+    
+    def normalize(self, text: str) -> Optional[str]:
+        """Output rewritten in the canonical shape (None if it doesn't have all the choices)"""
+        narrative, choices = self.parse(text)
+        if len(choices) < self.num_choices:
+            return None
+        
+        listing = "\n".join(f"{i}. {choice}" for i, choice in enumerate(choices, 1))
+        if not self.narrative_tokens:
+            return listing
+        return f"{narrative}\n\n{CHOICES_HEADER}\n{listing}" if narrative else f"{CHOICES_HEADER}\n{listing}"
+
+
+class _ChoiceListState:
+    """Where one sequence of a batch is in the ChoiceListFormat"""
+    
+    __slots__ = ('phase', 'forced', 'last_forced', 'tail', 'narrative_tokens', 'choice', 'choice_tokens', 'choice_text')
+    
+    def __init__(self, phase: str):
+        self.phase = phase  # 'narrative', 'choice' or 'done'
+        self.forced = []  # Token ids to emit next, regardless of the model
+        self.last_forced = False
+        self.tail = ''
+        self.narrative_tokens = 0
+        self.choice = 0
+        self.choice_tokens = 0
+        self.choice_text = ''
+    
+    def start_choice(self, number: int, forced: List[int]):
+        self.phase = 'choice'
+        self.forced.extend(forced)
+        self.choice = number
+        self.choice_tokens = 0
+        self.choice_text = ''
+
+
+class ChoiceListProcessor:
+    """
+    Logits processor walking each sequence through a ChoiceListFormat
+    (duck-typed, like StepTimer - defining it needs no transformers import)
+    """
+    
+    def __init__(self, choice_format: ChoiceListFormat):
+        self.format = choice_format
+        self.states = None
+    
+    def __call__(self, input_ids, scores):
+        if self.states is None:
+            self.start(input_ids.shape[0])
+        else:
+            for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                self.advance(row, token_id)
+        
+        for row in range(len(self.states)):
+            forced, masks, ban_eos = self.step(row)
+            if forced is not None:
+                self._force(scores, row, forced)
+                continue
+            for ids in masks:
+                scores[row, _as_tensor(ids, scores.device)] = float('-inf')
+            if ban_eos:
+                scores[row, self.format.eos_token_id] = float('-inf')
+        
+        return scores
+    
+    def start(self, batch_size: int):
+        """Begin a generation of batch_size sequences"""
+        self.states = []
+        for _ in range(batch_size):
+            if self.format.narrative_tokens:
+                state = _ChoiceListState('narrative')
+            else:
+                state = _ChoiceListState('choice')
+                state.start_choice(1, self.format.numbers[1])
+            self.states.append(state)
+    
+    def advance(self, row: int, token_id: int):
+        """Account for the token one sequence just generated"""
+        state = self.states[row]
+        if state.last_forced:
+            return
+        texts = self.format.vocab.texts
+        text = texts[token_id] if token_id < len(texts) else ''
+        if state.phase == 'narrative':
+            self._advance_narrative(state, text)
+        elif state.phase == 'choice':
+            self._advance_choice(state, text)
+    
+    def step(self, row: int) -> Tuple[Optional[int], List[List[int]], bool]:
+        """
+        What one sequence may generate next (once per decoding step)
+        
+        Returns:
+            (token it must generate or None, token id lists to mask, whether ending is banned)
+        """
+        choice_format = self.format
+        state = self.states[row]
+        state.last_forced = bool(state.forced) or state.phase == 'done'
+        if state.forced:
+            return state.forced.pop(0), [], False
+        if state.phase == 'done':
+            return choice_format.eos_token_id, [], False
+        if state.phase == 'narrative':
+            return None, [], True  # The choices are still to come
+        
+        masks = [choice_format.multiline_ids]
+        if not state.choice_text:
+            masks.append(choice_format.opening_ids)
+        if len(state.choice_text.strip()) < choice_format.min_choice_chars:
+            masks.append(choice_format.newline_ids)
+            return None, masks, True
+        return None, masks, state.choice < choice_format.num_choices
+    
+    @staticmethod
+    def _force(scores, row: int, token_id: int):
+        scores[row] = float('-inf')
+        scores[row, token_id] = 0.0
+    
+    def _advance_narrative(self, state: _ChoiceListState, text: str):
+        """Account for one narrative token and start the choices when it's time"""
+        choice_format = self.format
+        state.narrative_tokens += 1
+        state.tail = (state.tail + text)[-64:]
+        tail_lower = state.tail.lower()
+        
+        if 'choices:' in tail_lower or 'options:' in tail_lower:
+            state.start_choice(1, choice_format.after_header)
+        elif re.search(r'\n\s*1\.$', state.tail):
+            state.start_choice(1, [])  # The model started the list itself
+        elif any(marker in state.tail for marker in choice_format.stop_strings):
+            state.start_choice(1, choice_format.header)  # Meta-text - the narrative is over
+        elif state.narrative_tokens >= choice_format.narrative_tokens + NARRATIVE_OVERRUN:
+            state.start_choice(1, choice_format.header)
+        elif state.narrative_tokens >= choice_format.narrative_tokens and state.tail.rstrip().endswith(SENTENCE_ENDS):
+            state.start_choice(1, choice_format.header)
+    
+    def _advance_choice(self, state: _ChoiceListState, text: str):
+        """Account for one choice token; a newline (or the length cap) moves to the next choice"""
+        choice_format = self.format
+        ended = bool(text) and not text.strip('\r\n')
+        if not ended:
+            state.choice_text += text
+            state.choice_tokens += 1
+            if state.choice_tokens < choice_format.max_choice_tokens:
+                return
+        
+        if state.choice >= choice_format.num_choices:
+            state.phase = 'done'
+        else:
+            state.start_choice(state.choice + 1, ([] if ended else choice_format.newline) + choice_format.numbers[state.choice + 1])
+
+
+# Compiled per tokenizer - building a vocab table decodes the whole vocabulary once
+_vocab_tables: Dict[int, Tuple[object, VocabTable]] = {}  # id(tokenizer) -> (tokenizer, table)
+_compiled: Dict[Tuple, object] = {}
+_compile_lock = threading.Lock()
+
+def get_vocab_table(tokenizer) -> VocabTable:
+    """Get or build the vocab table of a tokenizer"""
+    with _compile_lock:
+        entry = _vocab_tables.get(id(tokenizer))
+        if entry is None or entry[0] is not tokenizer:
+            entry = (tokenizer, VocabTable(tokenizer))
+            _vocab_tables[id(tokenizer)] = entry
+    return entry[1]
+
+def compile_constraints(tokenizer, forbidden_keywords: Sequence[str] = ()) -> OutputConstraints:
+    """
+    Output rules of the engine's filters for one tokenizer (cached)
+    
+    Args:
+        tokenizer: Tokenizer of the model generating
+        forbidden_keywords: Genre words that fail _validate_genre_consistency (whole words, any case)
+    """
+    key = (id(tokenizer), tuple(forbidden_keywords))
+    constraints = _compiled.get(key)
+    if constraints is None or constraints.vocab is not get_vocab_table(tokenizer):
+        constraints = OutputConstraints(
+            get_vocab_table(tokenizer),
+            tokenizer.eos_token_id,
+            banned=CODE_MARKERS,
+            banned_words=forbidden_keywords,
+            stop_strings=META_MARKERS + BREAK_MARKERS
+        )
+        with _compile_lock:
+            _compiled[key] = constraints
+    return constraints
+
+def compile_choice_format(
+    tokenizer,
+    num_choices: int,
+    narrative_tokens: int = 0,
+    max_choice_tokens: int = 16,
+    min_choice_chars: int = 3
+) -> ChoiceListFormat:
+    """ChoiceListFormat for one tokenizer (cached) - see ChoiceListFormat for the arguments"""
+    key = (id(tokenizer), 'choices', num_choices, narrative_tokens, max_choice_tokens, min_choice_chars)
+    choice_format = _compiled.get(key)
+    if choice_format is None or choice_format.vocab is not get_vocab_table(tokenizer):
+        choice_format = ChoiceListFormat(
+            tokenizer, get_vocab_table(tokenizer), num_choices,
+            narrative_tokens, max_choice_tokens, min_choice_chars
+        )
+        with _compile_lock:
+            _compiled[key] = choice_format
+    return choice_format
@@ -0,0 +1,235 @@
+"""
+Sampling Profiler - Profile a live server for N seconds without restarting it
+Python stacks of every thread as collapsed-stack text (flamegraph.pl / speedscope input),
+plus an optional torch-profiler window with op-level breakdowns of model.generate
+"""
+
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+MAX_PROFILE_SECONDS = 60
+
+# A thread whose innermost frame is in one of these is waiting, not working
+IDLE_MODULES = ('threading.py', 'selectors.py', 'socketserver.py', 'queue.py', 'socket.py', 'ssl.py')
+
+# torch op name fragments -> category (first match wins)
+OP_CATEGORIES = (
+    ('matmul', ('mm', 'matmul', 'linear', 'bmm', 'baddbmm', 'addmm', 'scaled_dot_product', 'einsum')),
+    ('sampling', ('topk', 'sort', 'softmax', 'multinomial', 'cumsum', 'scatter', 'gather',
+                  'masked_fill', 'where', 'argmax', 'isin')),
+)
+
+
+class SamplingProfiler:
+    """Samples the Python stack of every thread at a fixed interval"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()  # One profile at a time
+        self._frame_names = {}  # code object -> "function (file:line)"
+    
+    def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> Dict:
+        """
+        Sample all threads (except the caller) for a while
+        
+        Args:
+            seconds: How long to sample (capped at MAX_PROFILE_SECONDS)
+            interval: Seconds between samples
+            include_idle: Keep stacks of threads blocked in waits, selects and queues
+        
+        Returns:
+            {'seconds', 'interval', 'samples', 'stacks': Counter of collapsed stack -> count}
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        
+        try:
+            seconds = min(seconds, MAX_PROFILE_SECONDS)
+            own_thread = threading.get_ident()
+            stacks = Counter()
+            samples = 0
+            thread_names = {}
+            
+            start = time.perf_counter()
+            deadline = start + seconds
+            while time.perf_counter() < deadline:
+                frames = sys._current_frames()
+                if frames.keys() - thread_names.keys():
+                    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+                
+                for ident, frame in frames.items():
+                    if ident == own_thread:
+                        continue
+                    if not include_idle and frame.f_code.co_filename.endswith(IDLE_MODULES):
+                        continue
+                    
+                    names = []
+                    while frame is not None:
+                        names.append(self._frame_name(frame.f_code))
+                        frame = frame.f_back
+                    names.append(thread_names.get(ident, f'thread-{ident}'))
+                    stacks[';'.join(reversed(names))] += 1
+                
+                samples += 1
+                del frames
+                time.sleep(interval)
+            
+            return {
+                'seconds': round(time.perf_counter() - start, 2),
+                'interval': interval,
+                'samples': samples,
+                'stacks': stacks
+            }
+        finally:
+            self._lock.release()
+    
+    def _frame_name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._frame_names[code] = name
+        return name
+
+
+def to_collapsed(stacks: Counter) -> str:
+    """Collapsed-stack text: one 'frame;frame;frame count' line per distinct stack"""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+class TorchOpProfiler:
+    """
+    Opens a window during which every model.generate call runs under torch.profiler
+    
+    The engine wraps generate() in capture(); outside a window that is a no-op.
+    """
+    
+    def __init__(self):
+        self._run_lock = threading.Lock()  # One window at a time
+        self._capture_lock = threading.Lock()  # torch.profiler can't nest across threads
+        self._stats_lock = threading.Lock()
+        self._active_until = 0.0
+        self._reset()
+    
+    def _reset(self):
+        self._ops = {}  # op name -> [calls, self cpu us, total cpu us]
+        self.generate_calls = 0
+        self.generate_seconds = 0.0
+        self.skipped_calls = 0
+    
+    def capture(self):
+        """Context manager around one model.generate call"""
+        if time.time() >= self._active_until:
+            return contextlib.nullcontext()
+        if not self._capture_lock.acquire(blocking=False):
+            with self._stats_lock:
+                self.skipped_calls += 1  # Another thread's generate is being profiled
+            return contextlib.nullcontext()
+        return self._capture()
+    
+    @contextlib.contextmanager
+    def _capture(self):
+        import torch
+        try:
+            start = time.perf_counter()
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU]) as prof:
+                yield
+            elapsed = time.perf_counter() - start
+            
+            with self._stats_lock:
+                self.generate_calls += 1
+                self.generate_seconds += elapsed
+                for event in prof.key_averages():
+                    op = self._ops.setdefault(event.key, [0, 0.0, 0.0])
+                    op[0] += event.count
+                    op[1] += event.self_cpu_time_total
+                    op[2] += event.cpu_time_total
+        finally:
+            self._capture_lock.release()
+    
+    def run(self, seconds: float, top: int = 30) -> Dict:
+        """
+        Profile every generate() call that starts in the next `seconds`
+        
+        Returns:
+            Time per op category, Python/other overhead and the top ops by self CPU time
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        
+        try:
+            seconds = min(seconds, MAX_PROFILE_SECONDS)
+            with self._stats_lock:
+                self._reset()
+            self._active_until = time.time() + seconds
+            time.sleep(seconds)
+            self._active_until = 0.0
+            
+            # Let a generate() that is still being profiled finish
+            with self._capture_lock:
+                pass
+            
+            with self._stats_lock:
+                ops = sorted(self._ops.items(), key=lambda item: -item[1][1])
+                categories = {name: 0.0 for name, _ in OP_CATEGORIES}
+                categories['other_ops'] = 0.0
+                for op_name, (_, self_us, _) in ops:
+                    categories[categorize_op(op_name)] += self_us / 1e6
+                op_seconds = sum(categories.values())
+                
+                return {
+                    'seconds': seconds,
+                    'generate_calls': self.generate_calls,
+                    'skipped_calls': self.skipped_calls,
+                    'generate_seconds': round(self.generate_seconds, 4),
+                    'op_seconds': round(op_seconds, 4),
+                    # Logits processors, stopping criteria, cache bookkeeping - Python between the ops
+                    'python_overhead_seconds': round(max(0.0, self.generate_seconds - op_seconds), 4),
+                    'categories': {name: round(value, 4) for name, value in categories.items()},
+                    'top_ops': [
+                        {
+                            'op': op_name,
+                            'calls': calls,
+                            'self_cpu_ms': round(self_us / 1000, 3),
+                            'cpu_ms': round(total_us / 1000, 3),
+                            'category': categorize_op(op_name)
+                        }
+                        for op_name, (calls, self_us, total_us) in ops[:top]
+                    ]
+                }
+        finally:
+            self._run_lock.release()
+
+
+def categorize_op(op_name: str) -> str:
+    """matmul, sampling or other_ops"""
+    name = op_name.lower()
+    for category, fragments in OP_CATEGORIES:
+        if any(fragment in name for fragment in fragments):
+            return category
+    return 'other_ops'
+
+
+# Singleton instances
+_sampling_profiler = None
+_torch_op_profiler = None
+_profiler_lock = threading.Lock()
+
+def get_sampling_profiler() -> SamplingProfiler:
+    """Get or create the global sampling profiler"""
+    global _sampling_profiler
+    with _profiler_lock:
+        if _sampling_profiler is None:
+            _sampling_profiler = SamplingProfiler()
+    return _sampling_profiler
+
+def get_torch_op_profiler() -> TorchOpProfiler:
+    """Get or create the global torch op profiler"""
+    global _torch_op_profiler
+    with _profiler_lock:
+        if _torch_op_profiler is None:
+            _torch_op_profiler = TorchOpProfiler()
+    return _torch_op_profiler
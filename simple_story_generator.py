@@ -4,8 +4,86 @@ Much faster than pre-generating entire tree
 """
 
 import json
-from typing import Dict, List
-from adaptive_story_engine_enhanced import AdaptiveStoryEngine
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from adaptive_story_engine_enhanced import AdaptiveStoryEngine, GenerationCancelled
+
+
+class BranchPrefetchCache:
+    """
+    Bounded LRU cache of pre-generated next segments
+    Keyed by (session, node_id, choice) so a click on an offered choice is instant
+    """
+    
+    def __init__(self, max_entries: int = 48, max_chars: int = 150000):
+        """
+        Args:
+            max_entries: Max cached branches across all sessions
+            max_chars: Max total segment text held in memory
+        """
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries = OrderedDict()  # (session, node_id, choice) -> segment
+        self._chars = 0
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def _key(session_id: str, node_id: str, choice_text: str):
+        return (session_id, node_id, choice_text.strip().lower())
+    
+    def put(self, session_id: str, node_id: str, choice_text: str, segment: Dict):
+        """Cache the segment that follows choice_text at node_id"""
+        key = self._key(session_id, node_id, choice_text)
+        with self._lock:
+            if key in self._entries:
+                self._chars -= len(self._entries.pop(key)['text'])
+            self._entries[key] = segment
+            self._chars += len(segment['text'])
+            
+            # Enforce memory budget - oldest branches go first
+            while self._entries and (len(self._entries) > self.max_entries or self._chars > self.max_chars):
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted['text'])
+                self.evictions += 1
+    
+    def take(self, session_id: str, node_id: str, choice_text: str) -> Optional[Dict]:
+        """Remove and return a cached segment (None on miss)"""
+        key = self._key(session_id, node_id, choice_text)
+        with self._lock:
+            segment = self._entries.pop(key, None)
+            if segment is None:
+                self.misses += 1
+                return None
+            self._chars -= len(segment['text'])
+            self.hits += 1
+            return segment
+    
+    def discard(self, session_id: str) -> int:
+        """Drop every cached branch for a session (e.g. the unchosen siblings)"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == session_id]
+            for key in keys:
+                self._chars -= len(self._entries.pop(key)['text'])
+            return len(keys)
+    
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'chars': self._chars,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
 
 
 class SimpleStoryGenerator:
@@ -15,7 +93,19 @@ class SimpleStoryGenerator:
         print("📖 Initializing Simple Story Generator...")
         self.engine = AdaptiveStoryEngine(model_name=model_name, use_enhanced_prompts=True)
         self.story_path = []  # Track user's path through story
+        self.transcript = []  # Full story: [{'choice', 'text', 'tokens'}] - never sent to the model whole
         self.genre = None
+        self.choices_before_ending = 8  # Story ends after this many choices
+        
+        # Bounded prompt window so segment latency stays flat as the story grows
+        self.context_max_tokens = 600  # Recap + recent segments
+        self.recap_max_tokens = 120  # Compact recap of everything older
+        
+        # Structured output: decoding is constrained to narrative + exactly 3 numbered
+        # choices, so choices always parse and generation stops after the last one
+        self.structured_choices = True
+        self.num_choices = 3
+        self.narrative_tokens = 200
         
     def start_story(self, genre: str) -> Dict:
         """
@@ -113,6 +203,9 @@ You've studied the temple layout. Three entrances are visible:
         
         opening = openings.get(genre, openings['adventure'])
         
+        self.transcript = []
+        self._add_to_transcript(None, opening['text'])
+        
         return {
             'text': opening['text'],
             'choices': [{'text': c} for c in opening['choices']],  # Format as objects
@@ -120,44 +213,178 @@ You've studied the temple layout. Three entrances are visible:
             'node_id': 'start'
         }
     
-    def continue_story(self, choice_text: str, previous_context: str) -> Dict:
+    def continue_story(self, choice_text: str, previous_context: Optional[str] = None) -> Dict:
         """
         Generate the next story segment based on user's choice
         
         Args:
             choice_text: The choice the user made
-            previous_context: Previous story text for context
+            previous_context: Previous story text for context (default: bounded window of the transcript)
             
         Returns:
             Next story segment with new choices
         """
+        if previous_context is None:
+            previous_context = self.get_context_window()
+        
         # Add choice to story path
         self.story_path.append(choice_text)
+        path_length = len(self.story_path)
         
-        # Build context for AI - keep it SHORT so AI has tokens for output
-        context = f"""{previous_context}
-
-Player's choice: {choice_text}
-
-Continue the story (2-3 paragraphs). Then write "Choices:" and list 3 options numbered 1, 2, 3."""
-        
-        # Generate continuation
         print(f"🎬 Generating story continuation...")
         print(f"📝 User choice: {choice_text}")
-        story_text = self._generate_segment(context)
-        print(f"📖 Generated text: {story_text[:200]}...")  # Show first 200 chars
-        
-        # Extract choices from generated text (or create default ones)
-        print(f"📄 Full generated text:\n{story_text}\n")
-        choices = self._extract_or_create_choices(story_text)
-        print(f"🎯 Final choices: {choices}")
         
         # Check if this should be an ending (after 8+ choices)
-        is_ending = len(self.story_path) >= 8
+        is_ending = path_length >= self.choices_before_ending
         
         if is_ending:
             # Generate an ending instead
-            ending_context = f"""Genre: {self.genre}
+            story_text = self._generate_segment(self._build_ending_context(choice_text, previous_context))
+        else:
+            story_text = self._generate_segment(
+                self._build_continue_context(choice_text, previous_context),
+                output_format=self._segment_format()
+            )
+            print(f"📖 Generated text: {story_text[:200]}...")  # Show first 200 chars
+            print(f"📄 Full generated text:\n{story_text}\n")
+        
+        self._add_to_transcript(choice_text, story_text)
+        
+        return self._build_segment(story_text, is_ending, path_length)
+    
+    def prefetch_branches(self, choice_texts: List[str], previous_context: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Pre-generate the next segment for every offered choice in one batched call
+        
+        Does not change the story path - use accept_prefetched when the player
+        actually picks one of the choices.
+        
+        Args:
+            choice_texts: The choices currently offered to the player
+            previous_context: Previous story text for context (default: bounded window of the transcript)
+            
+        Returns:
+            Dict of choice text -> next segment (choices that failed to generate are left out)
+        """
+        if previous_context is None:
+            previous_context = self.get_context_window()
+        
+        path_length = len(self.story_path) + 1
+        is_ending = path_length >= self.choices_before_ending
+        
+        if is_ending:
+            contexts = [self._build_ending_context(choice, previous_context) for choice in choice_texts]
+            output_format = None
+        else:
+            contexts = [self._build_continue_context(choice, previous_context) for choice in choice_texts]
+            output_format = self._segment_format()
+        
+        print(f"🔮 Prefetching {len(choice_texts)} branches in one batch...")
+        texts = self._generate_segment_batch(contexts, output_format)
+        
+        return {
+            choice: self._build_segment(text, is_ending, path_length)
+            for choice, text in zip(choice_texts, texts)
+            if text
+        }
+    
+    def accept_prefetched(self, choice_text: str, segment: Dict) -> Dict:
+        """Record the user's choice and return its pre-generated segment"""
+        self.story_path.append(choice_text)
+        self._add_to_transcript(choice_text, segment['text'])
+        return segment
+    
+    def get_transcript(self) -> str:
+        """Full story text including every choice made"""
+        return "\n\n".join(self._format_entry(entry) for entry in self.transcript)
+    
+    def get_context_window(self) -> str:
+        """
+        Build a bounded prompt context from the transcript
+        
+        Keeps as many recent segments as fit in context_max_tokens and
+        replaces everything older with a compact recap, so prompt size
+        (and therefore segment latency) stays flat however long the story runs.
+        """
+        budget = self.context_max_tokens - self.recap_max_tokens
+        used = 0
+        start = len(self.transcript)
+        
+        # Walk back from the newest segment while it fits
+        while start > 0:
+            tokens = self.transcript[start - 1]['tokens']
+            if used + tokens > budget and start < len(self.transcript):
+                break
+            used += tokens
+            start -= 1
+        
+        recent = [self._format_entry(entry) for entry in self.transcript[start:]]
+        
+        if used > budget:
+            # A single huge segment - keep only its tail
+            recent = [self._truncate_tokens(recent[-1], budget, keep='end')]
+        
+        if start > 0:
+            recent.insert(0, self._build_recap(self.transcript[:start]))
+        
+        return "\n\n".join(recent)
+    
+    def _add_to_transcript(self, choice_text: Optional[str], text: str):
+        """Append a segment to the full transcript (token count computed once)"""
+        entry = {'choice': choice_text, 'text': text}
+        entry['tokens'] = self._count_tokens(self._format_entry(entry))
+        self.transcript.append(entry)
+    
+    @staticmethod
+    def _format_entry(entry: Dict) -> str:
+        """Transcript entry as prompt text"""
+        if entry['choice'] is None:
+            return entry['text']
+        return entry['choice'] + "\n\n" + entry['text']
+    
+    def _build_recap(self, older: List[Dict]) -> str:
+        """Compact recap of older segments: the premise plus the choices made"""
+        # First couple of sentences of the opening set the premise
+        premise = older[0]['text'].strip().split('\n')[0].strip()
+        premise = '. '.join(premise.split('. ')[:2])
+        
+        choices = [entry['choice'] for entry in older if entry['choice']]
+        
+        # Drop the oldest choices until the recap fits its budget
+        while True:
+            recap = f"Story so far: {premise}"
+            if choices:
+                recap += f" Earlier choices: {'; '.join(choices)}."
+            if not choices or self._count_tokens(recap) <= self.recap_max_tokens:
+                break
+            choices.pop(0)
+        
+        return self._truncate_tokens(recap, self.recap_max_tokens, keep='start')
+    
+    def _count_tokens(self, text: str) -> int:
+        """Count tokens with the model's tokenizer"""
+        return len(self.engine.tokenizer.encode(text, add_special_tokens=False))
+    
+    def _truncate_tokens(self, text: str, max_tokens: int, keep: str = 'end') -> str:
+        """Trim text to max_tokens, keeping the start or the end"""
+        tokens = self.engine.tokenizer.encode(text, add_special_tokens=False)
+        if len(tokens) <= max_tokens:
+            return text
+        tokens = tokens[-max_tokens:] if keep == 'end' else tokens[:max_tokens]
+        return self.engine.tokenizer.decode(tokens, skip_special_tokens=True)
+    
+    def _build_continue_context(self, choice_text: str, previous_context: str) -> str:
+        """Build prompt for a regular story segment"""
+        # Build context for AI - keep it SHORT so AI has tokens for output
+        return f"""{previous_context}
+
+Player's choice: {choice_text}
+
+Continue the story (2-3 paragraphs). Then write "Choices:" and list 3 options numbered 1, 2, 3."""
+    
+    def _build_ending_context(self, choice_text: str, previous_context: str) -> str:
+        """Build prompt for the story's ending"""
+        return f"""Genre: {self.genre}
 
 Story so far:
 {previous_context}
@@ -165,18 +392,43 @@ Story so far:
 User chose: {choice_text}
 
 Write a satisfying ENDING to this story in 2-3 paragraphs. Wrap up the plot."""
-            
-            story_text = self._generate_segment(ending_context)
+    
+    def _build_segment(self, story_text: str, is_ending: bool, path_length: int) -> Dict:
+        """Package generated text as a story node with choices"""
+        if is_ending:
             choices = [{'text': '🔄 Start New Story', 'action': 'restart'}]
+        else:
+            # Structured output parses exactly; free text falls back to extraction (or default choices)
+            choice_format = self._segment_format()
+            choice_texts = choice_format.parse(story_text)[1] if choice_format else []
+            if len(choice_texts) < self.num_choices:
+                choice_texts = self._extract_or_create_choices(story_text)
+            choices = [{'text': c} for c in choice_texts]
+            print(f"🎯 Final choices: {choices}")
         
         return {
             'text': story_text,
-            'choices': [{'text': c} for c in choices] if isinstance(choices[0], str) else choices,
+            'choices': choices,
             'is_ending': is_ending,
-            'node_id': f'node_{len(self.story_path)}'
+            'node_id': f'node_{path_length}'
         }
     
-    def _generate_segment(self, context: str, max_retries: int = 2) -> str:
+    def _segment_instruction(self) -> str:
+        """System instruction for story segments"""
+        return f"Write a {self.genre} story continuation. End with 'Choices:' followed by exactly 3 numbered options (1. 2. 3.)."
+    
+    def _segment_format(self):
+        """Output shape of a regular segment (None = free text)"""
+        if not self.structured_choices:
+            return None
+        return self.engine.choice_format(
+            self.num_choices,
+            narrative_tokens=self.narrative_tokens,
+            max_choice_tokens=20,
+            min_choice_chars=10  # _extract_or_create_choices' minimum
+        )
+    
+    def _generate_segment(self, context: str, max_retries: int = 2, output_format=None) -> str:
         """Generate a single story segment with retry logic"""
         
         for attempt in range(max_retries):
@@ -184,9 +436,11 @@ Write a satisfying ENDING to this story in 2-3 paragraphs. Wrap up the plot."""
                 # Use the engine's internal generation method with correct parameters
                 text = self.engine._generate_text(
                     prompt=context,
-                    system_instruction=f"Write a {self.genre} story continuation. End with 'Choices:' followed by exactly 3 numbered options (1. 2. 3.).",
-                    max_length=300,  # Increased from 150 to give AI enough space
-                    temperature=0.8
+                    system_instruction=self._segment_instruction(),
+                    # A format spends only what its shape needs; free text gets room for choices
+                    max_length=output_format.max_new_tokens if output_format else 300,
+                    temperature=0.8,
+                    output_format=output_format
                 )
                 
                 # Clean up the text
@@ -204,6 +458,29 @@ Write a satisfying ENDING to this story in 2-3 paragraphs. Wrap up the plot."""
         
         return "The story continues..."
     
+    def _generate_segment_batch(self, contexts: List[str], output_format=None) -> List[Optional[str]]:
+        """
+        Generate several independent segments in one batched model call
+        
+        No retries - a branch that fails here is simply generated on demand
+        if the player picks it, so prefetch never spends more than one pass.
+        """
+        try:
+            texts = self.engine._generate_text_batch(
+                contexts,
+                system_instruction=self._segment_instruction(),
+                max_length=output_format.max_new_tokens if output_format else 300,
+                temperature=0.8,
+                output_format=output_format
+            )
+        except GenerationCancelled:
+            raise  # Prefetch was called off - nothing to fall back to
+        except Exception as e:
+            print(f"⚠️  Batched generation failed: {e}")
+            return [None] * len(contexts)
+        
+        return [text.strip() if len(text.strip()) > 20 else None for text in texts]
+    
     def _extract_or_create_choices(self, text: str) -> List[str]:
         """Extract choices from generated text or create default ones"""
         
@@ -4,9 +4,10 @@ Uses TinyLlama to generate a complete story tree once, then plays instantly
 """
 
 import json
-from typing import Dict, List, Optional
+import os
+from typing import Dict, List, Optional, Tuple
 from adaptive_story_engine_enhanced import AdaptiveStoryEngine
-import time
+from story_tree_store import TREE_STORE_EXTENSION, is_tree_store, open_tree_store, write_tree_store
 
 
 class StoryNode:
@@ -25,6 +26,20 @@ class StoryNode:
         }
 
 
+def build_parent_index(tree: Dict) -> Dict[str, Tuple[str, str]]:
+    """
+    Map every node id to (parent_id, choice text that leads to it)
+    
+    Works for trees saved before nodes carried their own parent links.
+    """
+    index = {}
+    for node_id, node in tree['nodes'].items():
+        for choice in node.get('choices', []):
+            if 'leads_to' in choice:
+                index[choice['leads_to']] = (node_id, choice['text'])
+    return index
+
+
 class StoryTreeGenerator:
     """Generates complete branching story trees using AI"""
     
@@ -32,9 +47,16 @@ class StoryTreeGenerator:
         print("🌳 Initializing Story Tree Generator...")
         self.engine = AdaptiveStoryEngine(model_name=model_name, use_enhanced_prompts=True)
         self.tree = {}
+        self.parent_index = {}  # node_id -> (parent_id, choice that leads to it)
         self.genre = None
-        
-    def generate_story_tree(self, genre: str, num_nodes: int = 25, max_depth: int = 5) -> Dict:
+        self.max_batch_size = 8  # Sibling nodes generated together
+        self.checkpoint_batch_size = 1  # While checkpointing (1 = a crash loses at most one node)
+        self._checkpoint_file = None
+        # Decode choice lists straight into "1. ...\n2. ..." so they always parse
+        self.structured_choices = True
+    
+    def generate_story_tree(self, genre: str, num_nodes: int = 25, max_depth: int = 5,
+                            checkpoint_file: Optional[str] = None) -> Dict:
         """
         Generate a complete story tree for the specified genre
         
@@ -42,6 +64,8 @@ class StoryTreeGenerator:
             genre: Story genre (detective, war, adventure, etc.)
             num_nodes: Target number of story nodes
             max_depth: Maximum depth of branching
+            checkpoint_file: Append each finished node here so an interrupted
+                             run can be continued with resume_story_tree
         
         Returns:
             Complete story tree dictionary
@@ -55,10 +79,11 @@ class StoryTreeGenerator:
             'locations': [],
             'start_node': 'start'
         }
+        self.parent_index = {}
         
         print(f"\n🎬 Generating {genre.upper()} story tree...")
         print(f"   Target: {num_nodes} nodes, max depth: {max_depth}")
-        print(f"   This will take 3-5 minutes...\n")
+        print(f"   Generating one depth level per batch...\n")
         
         # Generate opening
         print("📝 Generating story opening...")
@@ -69,69 +94,137 @@ class StoryTreeGenerator:
         self.tree['characters'] = self._extract_characters(opening)
         self.tree['locations'] = self._extract_locations(opening)
         
+        if checkpoint_file:
+            self._start_checkpoint(checkpoint_file, num_nodes, max_depth)
+        
         # Create start node with initial choices
         start_choices = self._generate_initial_choices(opening, genre)
-        self.tree['nodes']['start'] = {
+        self._store_node({
             'node_id': 'start',
             'text': opening,
             'choices': start_choices,
             'depth': 0
-        }
+        })
+        
+        frontier = [choice['leads_to'] for choice in start_choices]
+        return self._expand_tree(frontier, num_nodes, max_depth)
+    
+    def resume_story_tree(self, checkpoint_file: str) -> Dict:
+        """
+        Continue an interrupted generate_story_tree run from its checkpoint
         
-        # Generate branching paths
-        nodes_to_generate = [choice['leads_to'] for choice in start_choices]
-        generated_count = 1  # Start node counts
+        Reloads every finished node, rebuilds the pending frontier from
+        choices whose target was never generated, and keeps appending to
+        the same checkpoint (after cutting off a record torn by the crash).
         
-        while nodes_to_generate and generated_count < num_nodes:
-            current_node_id = nodes_to_generate.pop(0)
+        Args:
+            checkpoint_file: Checkpoint written by generate_story_tree
+        
+        Returns:
+            Complete story tree dictionary
+        """
+        self.tree, params = self.load_checkpoint(checkpoint_file, repair=True)
+        self.genre = self.tree['genre']
+        self.parent_index = build_parent_index(self.tree)
+        
+        if 'start' not in self.tree['nodes']:
+            # Died before the first node - nothing worth keeping
+            print("⚠️  Checkpoint has no start node - starting over")
+            return self.generate_story_tree(self.genre, params['num_nodes'], params['max_depth'], checkpoint_file)
+        
+        # Pending nodes: chosen targets that were never generated (BFS order)
+        frontier = [
+            choice['leads_to']
+            for node in self.tree['nodes'].values()
+            for choice in node.get('choices', [])
+            if choice['leads_to'] not in self.tree['nodes']
+        ]
+        frontier.sort(key=self._pending_depth)
+        
+        print(f"\n♻️  Resuming {self.genre.upper()} story tree from {checkpoint_file}")
+        print(f"   {len(self.tree['nodes'])} nodes done, {len(frontier)} pending\n")
+        
+        self._checkpoint_file = checkpoint_file
+        return self._expand_tree(frontier, params['num_nodes'], params['max_depth'])
+    
+    def _expand_tree(self, frontier: List[str], num_nodes: int, max_depth: int) -> Dict:
+        """
+        Generate branching paths one depth level at a time - siblings are
+        independent, so every max_batch_size of them cost two batched model calls
+        
+        Nodes are checkpointed once their batch has choices, so a checkpointed
+        run uses checkpoint_batch_size instead (one node per batch by default).
+        """
+        genre = self.genre
+        generated_count = len(self.tree['nodes'])  # Start node counts
+        batch_size = self.checkpoint_batch_size if self._checkpoint_file else self.max_batch_size
+        
+        while frontier and generated_count < num_nodes:
+            # Shallowest pending nodes first (a resumed run may hold two levels)
+            depth = min(self._pending_depth(node_id) for node_id in frontier)
+            current = [node_id for node_id in frontier if self._pending_depth(node_id) == depth]
+            frontier = [node_id for node_id in frontier if self._pending_depth(node_id) != depth]
             
-            # Get parent context
-            parent_context = self._get_path_to_node(current_node_id)
-            depth = len(parent_context.split(' → '))
+            # Only generate as many nodes as the budget allows
+            level = current[:num_nodes - generated_count]
+            contexts = [self._get_path_to_node(node_id) for node_id in level]
             
             if depth > max_depth:
-                # Create ending node
-                self._create_ending_node(current_node_id, parent_context)
-                generated_count += 1
-                continue
-            
-            # Generate node content
-            print(f"📝 Generating node {generated_count}/{num_nodes}: {current_node_id} (depth {depth})")
-            node_text = self._generate_node_content(current_node_id, parent_context, genre)
+                # Create ending nodes
+                for node_id, parent_context in zip(level, contexts):
+                    self._create_ending_node(node_id, parent_context, depth)
+                generated_count += len(level)
+                break
             
-            # Check if this should be an ending
-            is_ending = (
-                depth >= max_depth - 1 or 
-                generated_count >= num_nodes - 3 or
-                self._is_natural_ending(node_text)
-            )
-            
-            if is_ending:
-                # Create ending node
-                self.tree['nodes'][current_node_id] = {
-                    'node_id': current_node_id,
-                    'text': node_text,
-                    'choices': [],
-                    'is_ending': True,
-                    'depth': depth
-                }
-            else:
-                # Generate choices for this node
-                choices = self._generate_choices(current_node_id, node_text, genre, depth)
-                self.tree['nodes'][current_node_id] = {
-                    'node_id': current_node_id,
-                    'text': node_text,
-                    'choices': choices,
-                    'depth': depth
-                }
+            # Generate the level a batch at a time; each batch's nodes are stored as soon
+            # as they have their choices, so a crash loses at most one batch
+            print(f"📝 Generating nodes {generated_count}-{generated_count + len(level) - 1}/{num_nodes} (depth {depth}, {len(level)} nodes)")
+            for start in range(0, len(level), batch_size):
+                batch = level[start:start + batch_size]
+                node_texts = self._generate_node_contents(batch, contexts[start:start + batch_size], genre)
                 
-                # Add new branches to queue
-                for choice in choices:
-                    if choice['leads_to'] not in self.tree['nodes']:
-                        nodes_to_generate.append(choice['leads_to'])
-            
-            generated_count += 1
-            time.sleep(0.5)  # Brief pause to prevent overwhelming the model
+                needs_choices = []
+                for node_id, node_text in zip(batch, node_texts):
+                    # Check if this should be an ending
+                    is_ending = (
+                        depth >= max_depth - 1 or 
+                        generated_count >= num_nodes - 3 or
+                        self._is_natural_ending(node_text)
+                    )
+                    
+                    if is_ending:
+                        # Create ending node
+                        self._store_node({
+                            'node_id': node_id,
+                            'text': node_text,
+                            'choices': [],
+                            'is_ending': True,
+                            'depth': depth,
+                            **self._parent_fields(node_id)
+                        })
+                    else:
+                        needs_choices.append((node_id, node_text))
+                    
+                    generated_count += 1
+                
+                # Generate choices for every non-ending node of the batch
+                choice_lists = self._generate_choices_batch(needs_choices, genre, depth)
+                
+                for (node_id, node_text), choices in zip(needs_choices, choice_lists):
+                    self._store_node({
+                        'node_id': node_id,
+                        'text': node_text,
+                        'choices': choices,
+                        'depth': depth,
+                        **self._parent_fields(node_id)
+                    })
+                    
+                    # Add new branches to next level
+                    for choice in choices:
+                        if choice['leads_to'] not in self.tree['nodes']:
+                            frontier.append(choice['leads_to'])
+        
+        self._checkpoint_file = None
         
         print(f"\n✅ Story tree generated: {generated_count} nodes")
         print(f"   Title: {self.tree['title']}")
@@ -139,6 +232,81 @@ class StoryTreeGenerator:
         
         return self.tree
     
+    def _pending_depth(self, node_id: str) -> int:
+        """Depth of a not-yet-generated node (one below its parent)"""
+        parent_id = self.parent_index[node_id][0]
+        return (self.tree['nodes'][parent_id].get('depth') or 0) + 1
+    
+    def _store_node(self, node: Dict):
+        """Add a finished node to the tree and append it to the checkpoint"""
+        self.tree['nodes'][node['node_id']] = node
+        self._register_choices(node['node_id'], node.get('choices', []))
+        
+        if self._checkpoint_file:
+            with open(self._checkpoint_file, 'a') as f:
+                f.write(json.dumps({'type': 'node', 'node': node}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def _start_checkpoint(self, checkpoint_file: str, num_nodes: int, max_depth: int):
+        """Create a fresh checkpoint with the tree metadata as its header line"""
+        header = {key: value for key, value in self.tree.items() if key != 'nodes'}
+        header.update({'type': 'header', 'num_nodes': num_nodes, 'max_depth': max_depth})
+        
+        with open(checkpoint_file, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+        
+        self._checkpoint_file = checkpoint_file
+        print(f"💾 Checkpointing nodes to {checkpoint_file}")
+    
+    @staticmethod
+    def load_checkpoint(checkpoint_file: str, repair: bool = False) -> Tuple[Dict, Dict]:
+        """
+        Load a generation checkpoint
+        
+        Args:
+            checkpoint_file: Checkpoint written by generate_story_tree
+            repair: Cut a torn last line off the file, so nodes appended after
+                    it by a resumed run stay readable
+        
+        Returns:
+            Tuple of (tree with every finished node, generation params)
+        """
+        tree = None
+        params = {}
+        good_bytes = 0  # End of the last complete record
+        
+        with open(checkpoint_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Torn last line from the crash - that node is lost
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                
+                if record['type'] == 'header':
+                    params = {'num_nodes': record.pop('num_nodes'), 'max_depth': record.pop('max_depth')}
+                    del record['type']
+                    tree = dict(record, nodes={})
+                elif record['type'] == 'node':
+                    if tree is None:
+                        raise ValueError(f"{checkpoint_file} has a node record before its header")
+                    tree['nodes'][record['node']['node_id']] = record['node']
+                good_bytes += len(line)
+        
+        if tree is None:
+            raise ValueError(f"{checkpoint_file} is not a story tree checkpoint")
+        
+        if repair and os.path.getsize(checkpoint_file) > good_bytes:
+            print(f"⚠️  Dropping a torn record from the end of {checkpoint_file}")
+            with open(checkpoint_file, 'r+b') as f:
+                f.truncate(good_bytes)
+                f.flush()
+                os.fsync(f.fileno())
+        
+        return tree, params
+    
     def _generate_opening(self, genre: str) -> str:
         """Generate compelling story opening"""
         # Use existing genre openings from adaptive_story_engine
@@ -170,13 +338,18 @@ List 3 choices in this exact format:
 3. [Social/Communication choice]
 
 Keep each choice to 4-6 words."""
-
+        
         system_prompt = "You are generating player choices for an interactive story. Be concise and action-oriented."
         
-        response = self.engine._generate_text(prompt, system_prompt, max_length=80)
+        choice_format = self._choice_format(3)
+        response = self.engine._generate_text(
+            prompt, system_prompt,
+            max_length=choice_format.max_new_tokens if choice_format else 80,
+            output_format=choice_format
+        )
         
         # Parse choices (fallback to defaults if parsing fails)
-        choices = self._parse_choices(response, genre)
+        choices = self._choices_from_response(response, genre, 3, choice_format)
         
         # Create choice objects
         choice_objects = []
@@ -189,6 +362,20 @@ Keep each choice to 4-6 words."""
         
         return choice_objects
     
+    def _choice_format(self, num_choices: int):
+        """Output shape of a list of num_choices short choices (None = free text)"""
+        if not self.structured_choices:
+            return None
+        return self.engine.choice_format(num_choices, max_choice_tokens=12)
+    
+    def _choices_from_response(self, response: str, genre: str, num_choices: int, choice_format=None) -> List[str]:
+        """Choices of a structured response, or parsed from free text (with genre defaults)"""
+        if choice_format is not None:
+            choices = choice_format.parse(response)[1]
+            if len(choices) == num_choices:
+                return choices
+        return self._parse_choices(response, genre)[:num_choices]
+    
     def _parse_choices(self, response: str, genre: str) -> List[str]:
         """Parse AI response into choice list"""
         lines = [line.strip() for line in response.split('\n') if line.strip()]
@@ -214,35 +401,55 @@ Keep each choice to 4-6 words."""
         
         return choices[:3]
     
-    def _generate_node_content(self, node_id: str, parent_context: str, genre: str) -> str:
-        """Generate content for a story node"""
-        # Extract the choice that led here
-        choice_made = self._extract_choice_from_id(node_id)
+    def _generate_node_contents(self, node_ids: List[str], parent_contexts: List[str], genre: str,
+                                choices_made: Optional[List[str]] = None) -> List[str]:
+        """
+        Generate content for sibling story nodes in batched model calls
         
-        prompt = f"""Continue this {genre} story based on the character's action.
+        choices_made overrides the choice looked up from parent links
+        (for callers that track the tree elsewhere, like the generation farm).
+        """
+        prompts = []
+        for i, (node_id, parent_context) in enumerate(zip(node_ids, parent_contexts)):
+            # Extract the choice that led here
+            choice_made = choices_made[i] if choices_made else self._extract_choice_from_id(node_id)
+            
+            prompts.append(f"""Continue this {genre} story based on the character's action.
 
 Story so far:
 {parent_context}
 
 Character's action: {choice_made}
 
-Write 2-3 short paragraphs showing what happens as a direct result of this action. Keep the same characters and setting. Focus on immediate consequences and new developments."""
-
+Write 2-3 short paragraphs showing what happens as a direct result of this action. Keep the same characters and setting. Focus on immediate consequences and new developments.""")
+        
         system_prompt = f"""You are continuing a {genre} story. 
 - Stay with the same characters
 - Keep the same setting
 - Show direct results of the action
 - Create tension or reveal new information
 - Write 2-3 paragraphs maximum"""
-
-        return self.engine._generate_text(prompt, system_prompt, max_length=120)
+        
+        return self._generate_batched(prompts, system_prompt, max_length=120)
     
-    def _generate_choices(self, node_id: str, node_text: str, genre: str, depth: int) -> List[Dict]:
-        """Generate 2-3 choices for a node"""
+    def _generate_choices_batch(self, nodes: List[tuple], genre: str, depth: int) -> List[List[Dict]]:
+        """
+        Generate 2-3 choices for each node of a level in batched model calls
+        
+        Args:
+            nodes: (node_id, node_text) pairs at the same depth
+            genre: Story genre
+            depth: Depth of the nodes
+        
+        Returns:
+            Choice list per node, in order
+        """
         # Fewer choices at deeper levels
         num_choices = 3 if depth < 3 else 2
         
-        prompt = f"""Based on this story segment, generate {num_choices} distinct choices for what to do next.
+        prompts = []
+        for node_id, node_text in nodes:
+            prompts.append(f"""Based on this story segment, generate {num_choices} distinct choices for what to do next.
 
 Current situation:
 {node_text[-300:]}  
@@ -252,54 +459,70 @@ List {num_choices} choices in format:
 2. [Choice 2]
 {"3. [Choice 3]" if num_choices == 3 else ""}
 
-Each choice should be 4-6 words and action-oriented."""
-
-        response = self.engine._generate_text(prompt, "", max_length=60)
-        choice_texts = self._parse_choices(response, genre)[:num_choices]
-        
-        choices = []
-        for i, text in enumerate(choice_texts):
-            choices.append({
-                'text': text,
-                'leads_to': f'{node_id}_{i+1}',
-                'type': 'action'
-            })
+Each choice should be 4-6 words and action-oriented.""")
+        
+        choice_format = self._choice_format(num_choices)
+        responses = self._generate_batched(
+            prompts, "",
+            max_length=choice_format.max_new_tokens if choice_format else 60,
+            output_format=choice_format
+        )
+        
+        choice_lists = []
+        for (node_id, node_text), response in zip(nodes, responses):
+            choice_texts = self._choices_from_response(response, genre, num_choices, choice_format)
+            choice_lists.append([
+                {
+                    'text': text,
+                    'leads_to': f'{node_id}_{i+1}',
+                    'type': 'action'
+                }
+                for i, text in enumerate(choice_texts)
+            ])
         
-        return choices
+        return choice_lists
+    
+    def _generate_batched(self, prompts: List[str], system_prompt: str, max_length: int,
+                          output_format=None) -> List[str]:
+        """Run prompts through the engine in chunks of max_batch_size"""
+        results = []
+        for i in range(0, len(prompts), self.max_batch_size):
+            chunk = prompts[i:i + self.max_batch_size]
+            results.extend(self.engine._generate_text_batch(
+                chunk, system_prompt, max_length=max_length, output_format=output_format
+            ))
+        return results
+    
+    def _register_choices(self, parent_id: str, choices: List[Dict]):
+        """Record parent links for the nodes a node's choices lead to"""
+        for choice in choices:
+            self.parent_index[choice['leads_to']] = (parent_id, choice['text'])
+    
+    def _parent_fields(self, node_id: str) -> Dict:
+        """Parent link fields stored on each node (kept in saved trees)"""
+        if node_id not in self.parent_index:
+            return {}
+        parent_id, choice_made = self.parent_index[node_id]
+        return {'parent_id': parent_id, 'choice_made': choice_made}
     
-    def _get_path_to_node(self, node_id: str) -> str:
-        """Get the story path leading to this node"""
-        # Simple implementation: return last 2 nodes
+    def _get_path_to_node(self, node_id: str, max_nodes: int = 2) -> str:
+        """Get the story path leading to this node (text of its last max_nodes ancestors)"""
         if node_id == 'start':
             return ""
         
-        # Build path by traversing tree
-        path_nodes = []
-        visited = set()
+        # Walk up parent links - only as far as the context needs
+        ancestors = []
+        current_id = node_id
+        while current_id in self.parent_index and len(ancestors) < max_nodes:
+            current_id = self.parent_index[current_id][0]
+            ancestors.append(current_id)
         
-        def find_path(current_id, target_id, path):
-            if current_id == target_id:
-                return path
-            if current_id in visited or current_id not in self.tree['nodes']:
-                return None
-            
-            visited.add(current_id)
-            node = self.tree['nodes'][current_id]
-            
-            for choice in node.get('choices', []):
-                result = find_path(choice['leads_to'], target_id, path + [current_id])
-                if result:
-                    return result
-            return None
-        
-        path = find_path('start', node_id, [])
-        
-        if not path:
+        if not ancestors:
             return self.tree['nodes'].get('start', {}).get('text', '')
         
-        # Get last 2 nodes for context
+        # Get last 2 nodes for context (oldest first)
         context_parts = []
-        for nid in path[-2:]:
+        for nid in reversed(ancestors):
             if nid in self.tree['nodes']:
                 context_parts.append(self.tree['nodes'][nid]['text'])
         
@@ -307,18 +530,8 @@ Each choice should be 4-6 words and action-oriented."""
     
     def _extract_choice_from_id(self, node_id: str) -> str:
         """Extract what choice led to this node"""
-        # Parse node_id to find parent choice
-        parts = node_id.split('_')
-        if len(parts) < 2:
-            return "continue"
-        
-        # Find parent node
-        parent_id = '_'.join(parts[:-1])
-        if parent_id in self.tree['nodes']:
-            parent = self.tree['nodes'][parent_id]
-            choice_index = int(parts[-1]) - 1
-            if 0 <= choice_index < len(parent.get('choices', [])):
-                return parent['choices'][choice_index]['text']
+        if node_id in self.parent_index:
+            return self.parent_index[node_id][1]
         
         return "continue the investigation"
     
@@ -332,14 +545,16 @@ Each choice should be 4-6 words and action-oriented."""
         text_lower = text.lower()
         return any(phrase in text_lower for phrase in ending_phrases)
     
-    def _create_ending_node(self, node_id: str, context: str):
+    def _create_ending_node(self, node_id: str, context: str, depth: Optional[int] = None):
         """Create an ending node"""
-        self.tree['nodes'][node_id] = {
+        self._store_node({
             'node_id': node_id,
             'text': f"{context}\n\n**THE END**\n\nThank you for playing!",
             'choices': [],
-            'is_ending': True
-        }
+            'is_ending': True,
+            'depth': depth,
+            **self._parent_fields(node_id)
+        })
     
     def _extract_title(self, opening: str) -> str:
         """Extract or generate story title"""
@@ -370,25 +585,43 @@ Each choice should be 4-6 words and action-oriented."""
         return locations[:3]
     
     def save_tree(self, filename: str):
-        """Save story tree to JSON file"""
-        with open(filename, 'w') as f:
-            json.dump(self.tree, f, indent=2)
+        """Save story tree to JSON file (or indexed binary if filename ends in .stree)"""
+        if filename.endswith(TREE_STORE_EXTENSION):
+            write_tree_store(self.tree, filename)
+        else:
+            # Swap in atomically so a server reading the tree never sees a half-written file
+            with open(f"{filename}.tmp", 'w') as f:
+                json.dump(self.tree, f, indent=2)
+            os.replace(f"{filename}.tmp", filename)
         print(f"💾 Story tree saved to {filename}")
     
     @staticmethod
     def load_tree(filename: str) -> Dict:
-        """Load story tree from JSON file"""
-        with open(filename, 'r') as f:
-            tree = json.load(f)
+        """
+        Load story tree from file
+        
+        Binary tree stores open lazily - nodes are read from disk on demand.
+        """
+        if is_tree_store(filename):
+            tree = open_tree_store(filename)
+        else:
+            with open(filename, 'r') as f:
+                tree = json.load(f)
         print(f"📂 Story tree loaded from {filename}")
         return tree
 
 
 if __name__ == "__main__":
-    # Test generation
+    # Test generation (re-run after an interruption to resume from the checkpoint)
+    checkpoint = 'detective_story.checkpoint.jsonl'
     generator = StoryTreeGenerator()
-    tree = generator.generate_story_tree(genre='detective', num_nodes=15, max_depth=4)
+    if os.path.exists(checkpoint):
+        tree = generator.resume_story_tree(checkpoint)
+    else:
+        tree = generator.generate_story_tree(genre='detective', num_nodes=15, max_depth=4,
+                                             checkpoint_file=checkpoint)
     generator.save_tree('detective_story.json')
+    os.remove(checkpoint)
     
     print("\n📊 Story Tree Stats:")
     print(f"   Nodes: {len(tree['nodes'])}")
@@ -4,34 +4,39 @@ Hybrid approach: uses tree for main path, AI for creative inputs
 """
 
 import json
-from typing import Dict, List, Optional
-from difflib import SequenceMatcher
-from adaptive_story_engine_enhanced import AdaptiveStoryEngine
+from typing import Dict, Optional
+from choice_index import ChoiceIndex
+from engine_pool import DEFAULT_FALLBACK_MODEL, get_engine_pool
 
 
 class StoryTreePlayer:
     """Plays pre-generated story trees with instant responses"""
     
-    def __init__(self, tree: Dict, use_ai_fallback: bool = True):
+    def __init__(self, tree: Dict, use_ai_fallback: bool = True, model_name: str = DEFAULT_FALLBACK_MODEL,
+                 choice_index: Optional[ChoiceIndex] = None):
         """
         Initialize player with a story tree
         
         Args:
             tree: Story tree dictionary
             use_ai_fallback: Use AI for creative/unexpected inputs
+            model_name: Fallback model (loaded on the first creative input and
+                        shared with every other player through the engine pool)
+            choice_index: Prebuilt index for this tree (lets players of one tree share it)
         """
         self.tree = tree
+        self.choice_index = choice_index or ChoiceIndex(tree)
         self.current_node_id = tree.get('start_node', 'start')
         self.history = []
         self.use_ai_fallback = use_ai_fallback
-        self.ai_engine = None
-        
-        if use_ai_fallback:
-            print("🤖 AI fallback enabled for creative inputs")
-            self.ai_engine = AdaptiveStoryEngine(
-                model_name='TinyLlama/TinyLlama-1.1B-Chat-v1.0',
-                use_enhanced_prompts=True
-            )
+        self.model_name = model_name
+    
+    @property
+    def ai_engine(self):
+        """Shared fallback engine (loads the model if this is the first use in the process)"""
+        if not self.use_ai_fallback:
+            return None
+        return get_engine_pool().get(self.model_name)
     
     def start(self) -> Dict:
         """Start the story, return opening node"""
@@ -68,7 +73,7 @@ class StoryTreePlayer:
             }
         
         # Try to match user input to available choices
-        best_match = self._match_to_choice(user_input, current_node['choices'])
+        best_match = self.choice_index.match(self.current_node_id, user_input)
         
         if best_match:
             # Follow tree path
@@ -96,7 +101,7 @@ class StoryTreePlayer:
                 }
         
         # No match found - use AI fallback for creative input
-        if self.use_ai_fallback and self.ai_engine:
+        if self.use_ai_fallback:
             return self._handle_creative_input(user_input, current_node)
         else:
             # No AI fallback, show available choices
@@ -108,47 +113,6 @@ class StoryTreePlayer:
                 'type': 'clarification'
             }
     
-    def _match_to_choice(self, user_input: str, choices: List[Dict]) -> Optional[Dict]:
-        """
-        Match user input to closest choice using fuzzy matching
-        
-        Returns the choice if match confidence > 0.5, otherwise None
-        """
-        user_lower = user_input.lower().strip()
-        
-        # Direct match
-        for choice in choices:
-            if choice['text'].lower() == user_lower:
-                return choice
-        
-        # Fuzzy match
-        best_ratio = 0
-        best_choice = None
-        
-        for choice in choices:
-            choice_lower = choice['text'].lower()
-            
-            # Check if user input contains key words from choice
-            choice_words = set(choice_lower.split())
-            user_words = set(user_lower.split())
-            word_overlap = len(choice_words & user_words) / max(len(choice_words), 1)
-            
-            # Also check sequence similarity
-            seq_ratio = SequenceMatcher(None, user_lower, choice_lower).ratio()
-            
-            # Combined score
-            score = max(word_overlap, seq_ratio)
-            
-            if score > best_ratio:
-                best_ratio = score
-                best_choice = choice
-        
-        # Return if confidence is high enough
-        if best_ratio > 0.5:
-            return best_choice
-        
-        return None
-    
     def _handle_creative_input(self, user_input: str, current_node: Dict) -> Dict:
         """
         Handle creative/unexpected user input with AI
@@ -184,7 +148,8 @@ Write 2-3 short paragraphs showing what happens. Then present the same choices t
 - Return to the main story path
 - Stay consistent with established characters and setting"""
 
-        ai_response = self.ai_engine._generate_text(prompt, system_prompt, max_length=120)
+        with get_engine_pool().lease(self.model_name) as engine:
+            ai_response = engine._generate_text(prompt, system_prompt, max_length=120)
         
         # Return AI response but keep same choices (returns to main path)
         return {
@@ -0,0 +1,460 @@
+"""
+Story Tree Store - Indexed binary story-tree format with lazy node loading
+Opening a tree reads only a small header; nodes are fetched on demand via mmap
+
+File layout (little-endian):
+    header      magic, version, flags, node count, metadata length, index offset,
+                dictionary length, string count, string index offset
+    metadata    JSON tree fields except 'nodes' (genre, title, start_node, ...)
+    dictionary  zlib preset dictionary trained on the tree's own text
+    strings     per unique paragraph: u32 length + UTF-8 text (compressed if flagged)
+    string idx  string count x u64 record offset (a string's id is its position)
+    records     per node: u32 length + node JSON, 'text' replaced by 'text_refs' (compressed if flagged)
+    index       node count x (u64 id hash, u64 record offset, u32 record length), sorted by hash
+"""
+
+import copy
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+TREE_STORE_EXTENSION = '.stree'
+
+MAGIC = b'STRE'
+VERSION = 2
+FLAG_ZLIB = 0x1
+FLAG_STRING_TABLE = 0x2  # Node text stored as references into the string table
+FLAG_ZDICT = 0x4  # Records compressed against the preset dictionary
+
+# magic, version, flags, node_count, meta_len, index_offset, dict_len, string_count, string_index_offset
+HEADER = struct.Struct('<4sHHIIQIIQ')
+INDEX_ENTRY = struct.Struct('<QQI')  # id hash, record offset, record length
+RECORD_LENGTH = struct.Struct('<I')
+STRING_OFFSET = struct.Struct('<Q')
+
+MAX_DICTIONARY_SIZE = 16384  # Bigger dictionaries barely shrink files but slow every decompress
+PARAGRAPH_SEPARATOR = '\n\n'
+
+
+def _hash_node_id(node_id: str) -> int:
+    """Stable 64-bit hash of a node id"""
+    return int.from_bytes(hashlib.blake2b(node_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def is_tree_store(filename: str) -> bool:
+    """True if filename is in the binary tree-store format"""
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def train_dictionary(texts: List[str], max_size: int = MAX_DICTIONARY_SIZE, max_samples: int = 2000) -> bytes:
+    """
+    Build a zlib preset dictionary from phrases that repeat across a tree
+    
+    Args:
+        texts: Text that will be compressed (sampled evenly if large)
+        max_size: Dictionary size cap in bytes
+        max_samples: Texts used for phrase counting
+    
+    Returns:
+        Dictionary bytes, most valuable phrases last (zlib finds those at the shortest distance)
+    """
+    step = max(1, len(texts) // max_samples)
+    phrase_counts = Counter()
+    
+    for text in texts[::step]:
+        words = text.split()
+        for n in (6, 3):
+            for i in range(len(words) - n + 1):
+                phrase_counts[' '.join(words[i:i + n])] += 1
+    
+    # Score by bytes saved - a phrase seen once is never worth dictionary space
+    scored = sorted(
+        ((count * len(phrase), phrase) for phrase, count in phrase_counts.items() if count > 1),
+        reverse=True
+    )
+    
+    chosen = []
+    size = 0
+    for _, phrase in scored:
+        encoded = phrase.encode('utf-8') + b' '
+        if size + len(encoded) > max_size:
+            continue  # A shorter phrase further down may still fit
+        chosen.append(encoded)
+        size += len(encoded)
+    
+    return b''.join(reversed(chosen))
+
+
+def _make_codec(flags: int, zdict: bytes) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """Get (compress, decompress) functions for a store's flags"""
+    if not flags & FLAG_ZLIB:
+        return (lambda data: data), (lambda data: data)
+    
+    if not flags & FLAG_ZDICT:
+        return (lambda data: zlib.compress(data, 9)), zlib.decompress
+    
+    def compress(data: bytes) -> bytes:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+        return compressor.compress(data) + compressor.flush()
+    
+    def decompress(data: bytes) -> bytes:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS, zdict)
+        return decompressor.decompress(data) + decompressor.flush()
+    
+    return compress, decompress
+
+
+def write_tree_store(tree: Dict, filename: str, compress: bool = True, dedupe: bool = True):
+    """
+    Write a story tree in the indexed binary format
+    
+    Args:
+        tree: Story tree dictionary (as built by StoryTreeGenerator)
+        filename: Output path
+        compress: zlib-compress strings and node records
+        dedupe: Store each distinct paragraph once and reference it from nodes
+            (endings repeat their parent's text, siblings share preambles)
+    """
+    metadata = {key: value for key, value in tree.items() if key != 'nodes'}
+    meta_bytes = json.dumps(metadata).encode('utf-8')
+    
+    # Split node text into paragraphs and intern them
+    strings = []
+    string_ids = {}
+    records = {}
+    for node_id, node in tree['nodes'].items():
+        if dedupe:
+            node = dict(node)
+            refs = []
+            for paragraph in node.pop('text', '').split(PARAGRAPH_SEPARATOR):
+                if paragraph not in string_ids:
+                    string_ids[paragraph] = len(strings)
+                    strings.append(paragraph)
+                refs.append(string_ids[paragraph])
+            node['text_refs'] = refs
+        records[node_id] = json.dumps(node, separators=(',', ':')).encode('utf-8')
+    
+    flags = 0
+    zdict = b''
+    if dedupe:
+        flags |= FLAG_STRING_TABLE
+    if compress:
+        flags |= FLAG_ZLIB
+        if dedupe:
+            # A few node records teach the dictionary the JSON field names too
+            samples = strings + [payload.decode('utf-8') for payload in list(records.values())[:50]]
+            zdict = train_dictionary(samples)
+            if zdict:
+                flags |= FLAG_ZDICT
+    
+    compress_payload, _ = _make_codec(flags, zdict)
+    
+    # Write beside the target and swap in atomically - readers may have the old file mapped
+    tmp_filename = f"{filename}.tmp"
+    index = []
+    with open(tmp_filename, 'wb') as f:
+        f.write(b'\0' * HEADER.size)  # Filled in once the offsets are known
+        f.write(meta_bytes)
+        f.write(zdict)
+        
+        string_offsets = []
+        for text in strings:
+            payload = compress_payload(text.encode('utf-8'))
+            string_offsets.append(f.tell())
+            f.write(RECORD_LENGTH.pack(len(payload)))
+            f.write(payload)
+        
+        string_index_offset = f.tell()
+        for offset in string_offsets:
+            f.write(STRING_OFFSET.pack(offset))
+        
+        for node_id, record in records.items():
+            payload = compress_payload(record)
+            offset = f.tell()
+            f.write(RECORD_LENGTH.pack(len(payload)))
+            f.write(payload)
+            index.append((_hash_node_id(node_id), offset, RECORD_LENGTH.size + len(payload)))
+        
+        index.sort()
+        index_offset = f.tell()
+        for entry in index:
+            f.write(INDEX_ENTRY.pack(*entry))
+        
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, flags, len(index), len(meta_bytes), index_offset,
+                            len(zdict), len(strings), string_index_offset))
+    
+    os.replace(tmp_filename, filename)
+
+
+class TreeStore:
+    """Read-only, memory-mapped view of a binary story tree"""
+    
+    def __init__(self, filename: str, cache_size: int = 64, string_cache_size: int = 256):
+        """
+        Open a tree store (reads only the header and metadata)
+        
+        Args:
+            filename: Path to a file written by write_tree_store
+            cache_size: Decoded nodes kept in memory
+            string_cache_size: Decoded paragraphs kept in memory (shared by siblings and endings)
+        """
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version = struct.unpack_from('<4sH', self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{filename} is not a story tree store")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{filename} uses tree store version {version} (supported: {VERSION})")
+        
+        (_, _, self.flags, self.node_count, meta_len, self._index_offset,
+         dict_len, self.string_count, self._string_index_offset) = HEADER.unpack_from(self._mm, 0)
+        header_size = HEADER.size
+        
+        self.metadata = json.loads(self._mm[header_size:header_size + meta_len])
+        
+        dict_offset = header_size + meta_len
+        _, self._decompress = _make_codec(self.flags, self._mm[dict_offset:dict_offset + dict_len])
+        
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.string_cache_size = string_cache_size
+        self._string_cache = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_node(self, node_id: str) -> Optional[Dict]:
+        """Fetch a node by id (None if the tree has no such node) - a copy, so callers may modify it"""
+        with self._lock:
+            if node_id in self._cache:
+                self._cache.move_to_end(node_id)
+                return copy.deepcopy(self._cache[node_id])
+        
+        node = self._find(node_id)
+        
+        if node is not None and self.cache_size > 0:
+            with self._lock:
+                self._cache[node_id] = copy.deepcopy(node)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        return node
+    
+    def get_string(self, string_id: int) -> str:
+        """Fetch a paragraph from the string table"""
+        with self._lock:
+            if string_id in self._string_cache:
+                self._string_cache.move_to_end(string_id)
+                return self._string_cache[string_id]
+        
+        (offset,) = STRING_OFFSET.unpack_from(self._mm, self._string_index_offset + string_id * STRING_OFFSET.size)
+        text = self._read_payload(offset).decode('utf-8')
+        
+        if self.string_cache_size > 0:
+            with self._lock:
+                self._string_cache[string_id] = text
+                if len(self._string_cache) > self.string_cache_size:
+                    self._string_cache.popitem(last=False)
+        
+        return text
+    
+    def _find(self, node_id: str) -> Optional[Dict]:
+        """Binary search the on-disk index for node_id"""
+        target = _hash_node_id(node_id)
+        lo, hi = 0, self.node_count
+        
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._index_entry(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        
+        # Equal hashes are adjacent - check each candidate's real id
+        while lo < self.node_count:
+            id_hash, offset, _ = self._index_entry(lo)
+            if id_hash != target:
+                break
+            node = self._read_record(offset)
+            if node.get('node_id') == node_id:
+                return node
+            lo += 1
+        
+        return None
+    
+    def _index_entry(self, position: int) -> Tuple[int, int, int]:
+        return INDEX_ENTRY.unpack_from(self._mm, self._index_offset + position * INDEX_ENTRY.size)
+    
+    def _read_payload(self, offset: int) -> bytes:
+        (length,) = RECORD_LENGTH.unpack_from(self._mm, offset)
+        start = offset + RECORD_LENGTH.size
+        return self._decompress(self._mm[start:start + length])
+    
+    def _read_record(self, offset: int) -> Dict:
+        node = json.loads(self._read_payload(offset))
+        
+        # Rebuild text from the string table so callers always see plain nodes
+        if 'text_refs' in node:
+            node['text'] = PARAGRAPH_SEPARATOR.join(self.get_string(ref) for ref in node.pop('text_refs'))
+        
+        return node
+    
+    def iter_nodes(self) -> Iterator[Dict]:
+        """Iterate every node (reads the whole file - for conversion and tooling)"""
+        for position in range(self.node_count):
+            yield self._read_record(self._index_entry(position)[1])
+    
+    def close(self):
+        """Release the memory map"""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LazyNodes(Mapping):
+    """Dict-like view of a TreeStore's nodes - lets StoryTreePlayer use tree['nodes'][id] unchanged"""
+    
+    def __init__(self, store: TreeStore):
+        self.store = store
+    
+    def __getitem__(self, node_id: str) -> Dict:
+        node = self.store.get_node(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        return node
+    
+    def __contains__(self, node_id) -> bool:
+        return isinstance(node_id, str) and self.store.get_node(node_id) is not None
+    
+    def __iter__(self) -> Iterator[str]:
+        for node in self.store.iter_nodes():
+            yield node['node_id']
+    
+    def __len__(self) -> int:
+        return self.store.node_count
+
+
+def open_tree_store(filename: str, cache_size: int = 64) -> Dict:
+    """
+    Open a binary tree as a tree dictionary whose nodes load on demand
+    
+    Returns:
+        Tree dict with the stored metadata and a lazy 'nodes' mapping
+    """
+    store = TreeStore(filename, cache_size=cache_size)
+    tree = dict(store.metadata)
+    tree['nodes'] = LazyNodes(store)
+    return tree
+
+
+def convert_json_to_store(json_filename: str, store_filename: str, compress: bool = True) -> Dict:
+    """
+    Convert a JSON story tree (StoryTreeGenerator.save_tree output) to the binary format
+    
+    Returns:
+        Size statistics
+    """
+    with open(json_filename, 'r') as f:
+        tree = json.load(f)
+    
+    write_tree_store(tree, store_filename, compress=compress)
+    
+    stats = {
+        'nodes': len(tree['nodes']),
+        'json_bytes': os.path.getsize(json_filename),
+        'store_bytes': os.path.getsize(store_filename)
+    }
+    print(f"💾 Converted {json_filename} → {store_filename}")
+    print(f"   {stats['nodes']} nodes, {stats['json_bytes']:,} → {stats['store_bytes']:,} bytes")
+    return stats
+
+
+def benchmark_tree_store(tree: Dict, lookups: int = 2000) -> List[Dict]:
+    """
+    Compare file size and node decode time across storage variants
+    
+    Args:
+        tree: Story tree dictionary (e.g. a generated tree loaded from JSON)
+        lookups: Random node fetches timed per binary variant (node cache disabled)
+    
+    Returns:
+        One result dict per variant
+    """
+    node_ids = list(tree['nodes'])
+    sample = [random.choice(node_ids) for _ in range(lookups)]
+    variants = [
+        ('json', None),
+        ('binary', {'compress': False, 'dedupe': False}),
+        ('binary+zlib', {'compress': True, 'dedupe': False}),
+        ('binary+dedupe', {'compress': False, 'dedupe': True}),
+        ('binary+dedupe+zdict', {'compress': True, 'dedupe': True}),
+    ]
+    
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, options in variants:
+            path = os.path.join(tmp_dir, name)
+            
+            if options is None:
+                with open(path, 'w') as f:
+                    json.dump(tree, f, indent=2)
+                start = time.perf_counter()
+                with open(path, 'r') as f:
+                    json.load(f)
+                decode_us = (time.perf_counter() - start) * 1e6  # JSON must be parsed whole
+            else:
+                write_tree_store(tree, path, **options)
+                with TreeStore(path, cache_size=0) as store:
+                    start = time.perf_counter()
+                    for node_id in sample:
+                        store.get_node(node_id)
+                    decode_us = (time.perf_counter() - start) * 1e6 / len(sample)
+            
+            results.append({'variant': name, 'bytes': os.path.getsize(path), 'decode_us': decode_us})
+    
+    json_bytes = results[0]['bytes']
+    print(f"\n📊 Tree storage benchmark ({len(node_ids)} nodes)")
+    for result in results:
+        scope = 'full load' if result['variant'] == 'json' else 'per node'
+        print(f"   {result['variant']:<22}{result['bytes']:>14,} bytes  "
+              f"{json_bytes / result['bytes']:>5.1f}x  {result['decode_us']:>10.1f} µs ({scope})")
+    
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == 'bench':
+        with open(sys.argv[2], 'r') as f:
+            benchmark_tree_store(json.load(f))
+    elif len(sys.argv) == 3:
+        convert_json_to_store(sys.argv[1], sys.argv[2])
+    else:
+        print(f"Usage: python story_tree_store.py <tree.json> <tree{TREE_STORE_EXTENSION}>")
+        print("       python story_tree_store.py bench <tree.json>")
+        sys.exit(1)
@@ -0,0 +1,201 @@
+"""
+Test of the decoding-time output constraints (no model or torch needed)
+A tiny greedy tokenizer stands in for the real one; the processors' per-step
+decisions are checked directly.
+"""
+
+import string
+
+from output_constraints import (
+    CHOICES_HEADER, OutputConstraints, compile_choice_format, compile_constraints, contains_word,
+    looks_like_code
+)
+
+
+class FakeTokenizer:
+    """Greedy longest-match tokenizer over a small vocabulary"""
+    
+    def __init__(self, pieces):
+        self.pieces = list(pieces) + ['<eos>']
+        self.eos_token_id = len(self.pieces) - 1
+    
+    def __len__(self):
+        return len(self.pieces)
+    
+    def token_id(self, piece: str) -> int:
+        return self.pieces.index(piece)
+    
+    def encode(self, text, add_special_tokens=False):
+        ids = []
+        i = 0
+        while i < len(text):
+            piece = max((piece for piece in self.pieces[:-1] if text.startswith(piece, i)), key=len)
+            ids.append(self.pieces.index(piece))
+            i += len(piece)
+        return ids
+    
+    def decode(self, ids, clean_up_tokenization_spaces=False):
+        return ''.join(self.pieces[token_id] for token_id in ids)
+    
+    def batch_decode(self, batch, clean_up_tokenization_spaces=False):
+        return [self.decode(ids) for ids in batch]
+
+
+WORDS = [
+    ' She', ' let', ' go', ' bul', 'let', ' now', ' skill', ' sk', 'ill', 'ill.', ' k', ' kill',
+    ' love', ' love,', ' glove', ' Love', 'craft', 'ly', ' up', 'date', ' date', ' the', ' dark',
+    '\n', '\n\n', 'Choices', '1.', '2.', '3.', ' Run', ' away', ' Hide', ' Fight', ' back', '<div', 'div', '---'
+]
+TOKENIZER = FakeTokenizer(list(string.printable) + WORDS)
+
+
+def allowed(constraints: OutputConstraints, text: str, piece: str) -> bool:
+    """Whether piece may come after the generated text (tokenized greedily)"""
+    processor = constraints.processor()
+    processor.start(1)
+    for token_id in TOKENIZER.encode(text):
+        processor.advance(0, token_id)
+    
+    token_id = TOKENIZER.token_id(piece)
+    if token_id in constraints.static_ids:
+        return False
+    masks, ban_eos = constraints.masks(processor.tails[0])
+    if token_id == TOKENIZER.eos_token_id:
+        return not ban_eos
+    return not any(token_id in ids for ids in masks)
+
+
+def decode(processor, wanted):
+    """Text a scripted model writes under a ChoiceListProcessor (asserts each wanted token is allowed)"""
+    wanted = [TOKENIZER.token_id(piece) for piece in wanted]
+    processor.start(1)
+    ids = []
+    while True:
+        forced, masks, ban_eos = processor.step(0)
+        if forced is None:
+            if not wanted:
+                assert not ban_eos, f"ending banned after {TOKENIZER.decode(ids)!r}"
+                break
+            forced = wanted.pop(0)
+            assert not any(forced in ids_ for ids_ in masks), f"{TOKENIZER.pieces[forced]!r} masked"
+        if forced == TOKENIZER.eos_token_id:
+            break
+        ids.append(forced)
+        processor.advance(0, forced)
+    return TOKENIZER.decode(ids)
+
+
+def test_word_matching():
+    """Forbidden words match whole words only; code keywords only count in code"""
+    print("\n🔤 Word and code matching...")
+    assert contains_word("I love you", "love")
+    assert contains_word("Love, actually", "love")
+    assert not contains_word("a leather glove", "love")
+    assert not contains_word("Lovecraft wrote", "love")
+    assert not contains_word("an update came", "date")
+    assert not contains_word("with great skill", "kill")
+    assert contains_word("a magic spell!", "magic spell")
+    
+    assert not looks_like_code("She let go of the rope.")
+    assert not looks_like_code("The bullet now lay still. Import duties were due.")
+    assert looks_like_code("let x = 5;")
+    assert looks_like_code("<div class='a'>")
+    assert looks_like_code("import os")
+    print("   ✓ contains_word / looks_like_code")
+
+
+def test_code_markers():
+    """Code markers are banned anywhere; code keywords in prose are left alone"""
+    print("\n🚫 Code markers...")
+    constraints = compile_constraints(TOKENIZER)
+    assert not allowed(constraints, " She", '<div')
+    assert not allowed(constraints, " She <", 'div')
+    assert not allowed(constraints, " She", '{')
+    assert allowed(constraints, " She", ' let')
+    assert allowed(constraints, " She let", ' go')
+    assert allowed(constraints, " the bul", 'let')
+    assert allowed(constraints, " the bullet", ' now')
+    print("   ✓ 'She let go' and 'bullet now' decode unchanged")
+
+
+def test_forbidden_words():
+    """Genre words are banned as whole words and nothing else"""
+    print("\n📕 Forbidden words...")
+    romance = compile_constraints(TOKENIZER, ['kill'])
+    assert allowed(romance, " with great", ' skill')
+    assert allowed(romance, " great sk", 'ill.')
+    assert not allowed(romance, " go k", 'ill.')
+    assert allowed(romance, " go k", 'ill')
+    assert not allowed(romance, " go kill", ' ')
+    assert not allowed(romance, " go kill", '<eos>')
+    assert allowed(romance, " go kill", 's')
+    
+    horror = compile_constraints(TOKENIZER, ['date', 'love', 'laugh'])
+    assert horror.static_ids == sorted(set(horror.static_ids))
+    assert not allowed(horror, " the", ' love,')
+    assert allowed(horror, " the", ' glove')
+    assert allowed(horror, " the", ' love')
+    assert not allowed(horror, " the love", '.')
+    assert allowed(horror, " the love", 'ly')
+    assert allowed(horror, " H.P.", ' Love')
+    assert allowed(horror, " H.P. Love", 'craft')
+    assert allowed(horror, " an up", 'date')
+    assert allowed(horror, " an update", ' now')
+    assert not allowed(horror, " a date", ' ')
+    assert allowed(horror, "", 'date')
+    assert not allowed(horror, "date", '.')
+    print("   ✓ 'skill', 'glove', 'update', 'Lovecraft' allowed; 'kill', 'love', 'date' not")
+
+
+def test_stop_strings():
+    """A stop string ends the generation"""
+    print("\n🛑 Stop strings...")
+    processor = compile_constraints(TOKENIZER).processor()
+    processor.start(2)
+    for token_id in TOKENIZER.encode(" the dark"):
+        processor.advance(0, token_id)
+        processor.advance(1, token_id)
+    processor.advance(0, TOKENIZER.token_id('---'))
+    assert processor.stopped == [True, False]
+    
+    unstoppable = compile_constraints(TOKENIZER).processor(stop=False)
+    unstoppable.start(1)
+    unstoppable.advance(0, TOKENIZER.token_id('---'))
+    assert unstoppable.stopped == [False]
+    print("   ✓ stopped at '---'")
+
+
+def test_choice_list():
+    """Choices-only and narrative-plus-choices shapes"""
+    print("\n📋 Choice lists...")
+    choices = compile_choice_format(TOKENIZER, 3)
+    text = decode(choices.processor(), [' Run', ' away', '\n', ' Hide', '\n', ' Fight', ' back'])
+    assert text == "1. Run away\n2. Hide\n3. Fight back", text
+    assert choices.parse(text) == ('', ['Run away', 'Hide', 'Fight back'])
+    
+    # A choice can't open with a number or end before min_choice_chars
+    processor = choices.processor()
+    processor.start(1)
+    for token_id in TOKENIZER.encode("1."):
+        assert processor.step(0)[0] == token_id
+        processor.advance(0, token_id)
+    forced, masks, ban_eos = processor.step(0)
+    assert forced is None and ban_eos
+    assert any(TOKENIZER.token_id('2') in ids for ids in masks)
+    assert any(TOKENIZER.token_id('\n') in ids for ids in masks)
+    
+    segment = compile_choice_format(TOKENIZER, 2, narrative_tokens=3)
+    text = decode(segment.processor(), [' She', ' let', ' go', '.', ' Run', '\n', ' Hide'])
+    assert text == f" She let go.\n\n{CHOICES_HEADER}\n1. Run\n2. Hide", text
+    assert segment.parse(text) == ('She let go.', ['Run', 'Hide'])
+    assert segment.normalize(text) == f"She let go.\n\n{CHOICES_HEADER}\n1. Run\n2. Hide"
+    print("   ✓ header, numbering and the end are forced")
+
+
+if __name__ == '__main__':
+    test_word_matching()
+    test_code_markers()
+    test_forbidden_words()
+    test_stop_strings()
+    test_choice_list()
+    print("\n✅ ALL OUTPUT CONSTRAINT TESTS PASSED")
@@ -0,0 +1,123 @@
+"""
+Round-trip test of the binary story tree format (no model needed)
+Every compress/dedupe combination must read back exactly the tree that was written.
+"""
+
+import os
+import tempfile
+
+from story_tree_store import (
+    FLAG_STRING_TABLE, FLAG_ZDICT, FLAG_ZLIB, TreeStore, is_tree_store, open_tree_store, write_tree_store
+)
+
+
+def make_tree(max_depth: int = 3, branches: int = 3) -> dict:
+    """Small branching tree with repeated paragraphs, endings and non-ASCII text"""
+    preamble = "Rain hammered the windows of the old precinct while the lights flickered overhead."
+    nodes = {
+        'start': {
+            'node_id': 'start',
+            'text': f"{preamble}\n\nDetective Chen read the note twice — 'The past always collects its debts.'",
+            'choices': [],
+            'depth': 0
+        }
+    }
+    
+    frontier = ['start']
+    for depth in range(1, max_depth + 1):
+        next_frontier = []
+        for parent_id in frontier:
+            for i in range(1, branches + 1):
+                node_id = f"{parent_id}_{i}" if parent_id != 'start' else f"node_{i}"
+                nodes[parent_id]['choices'].append({'text': f"Option {i} from {parent_id}", 'leads_to': node_id})
+                is_ending = depth == max_depth
+                nodes[node_id] = {
+                    'node_id': node_id,
+                    'text': f"{preamble}\n\nChoice {i} at depth {depth} leads somewhere new for {node_id}.",
+                    'choices': [],
+                    'depth': depth,
+                    'parent_id': parent_id,
+                    **({'is_ending': True} if is_ending else {})
+                }
+                next_frontier.append(node_id)
+        frontier = next_frontier
+    
+    return {
+        'genre': 'detective',
+        'title': 'The Debt Collector',
+        'nodes': nodes,
+        'characters': ['Detective Chen'],
+        'locations': ['precinct'],
+        'start_node': 'start'
+    }
+
+
+def test_round_trip():
+    """Every compress/dedupe combination reads back the original nodes and metadata"""
+    print("\n💾 Tree store round trip...")
+    tree = make_tree()
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        for compress in (False, True):
+            for dedupe in (False, True):
+                filename = os.path.join(workdir, f"tree_{compress}_{dedupe}.stree")
+                write_tree_store(tree, filename, compress=compress, dedupe=dedupe)
+                assert is_tree_store(filename)
+                
+                with TreeStore(filename, cache_size=4) as store:
+                    assert bool(store.flags & FLAG_ZLIB) == compress
+                    assert bool(store.flags & FLAG_STRING_TABLE) == dedupe
+                    assert bool(store.flags & FLAG_ZDICT) == (compress and dedupe)
+                    assert store.node_count == len(tree['nodes'])
+                    assert store.metadata == {key: value for key, value in tree.items() if key != 'nodes'}
+                    
+                    for node_id, node in tree['nodes'].items():
+                        assert store.get_node(node_id) == node, node_id
+                        assert store.get_node(node_id) == node, f"{node_id} (cached)"
+                    assert sorted(node['node_id'] for node in store.iter_nodes()) == sorted(tree['nodes'])
+                    
+                    # Callers get their own copy - changing it never changes the store
+                    store.get_node('start')['choices'].clear()
+                    assert store.get_node('start') == tree['nodes']['start']
+                    
+                    if dedupe:
+                        # The shared preamble is stored once
+                        assert store.string_count < 2 * len(tree['nodes'])
+                
+                print(f"   ✓ compress={compress}, dedupe={dedupe}: {os.path.getsize(filename):,} bytes")
+
+
+def test_missing_node():
+    """Unknown ids come back as None / KeyError, never as another node"""
+    print("\n🔍 Missing node lookups...")
+    tree = make_tree(max_depth=2)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        filename = os.path.join(workdir, "tree.stree")
+        write_tree_store(tree, filename)
+        
+        opened = open_tree_store(filename)
+        try:
+            nodes = opened['nodes']
+            assert opened['title'] == tree['title']
+            assert len(nodes) == len(tree['nodes'])
+            assert 'node_1_1' in nodes
+            assert 'node_9' not in nodes
+            assert 42 not in nodes
+            assert nodes.store.get_node('node_9') is None
+            assert nodes.store.get_node('') is None
+            try:
+                nodes['node_9']
+                assert False, "missing node should raise KeyError"
+            except KeyError:
+                pass
+            assert nodes['node_2']['choices'] == tree['nodes']['node_2']['choices']
+        finally:
+            opened['nodes'].store.close()
+    print("   ✓ missing ids are reported as missing")
+
+
+if __name__ == '__main__':
+    test_round_trip()
+    test_missing_node()
+    print("\n✅ ALL TREE STORE TESTS PASSED")
@@ -0,0 +1,179 @@
+"""
+Tree Cache - Process-wide cache of loaded story trees
+Every player of a tree shares one read-only copy (and one choice index)
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, NamedTuple, Optional
+
+from choice_index import ChoiceIndex
+from story_tree_store import LazyNodes, is_tree_store, open_tree_store
+
+
+class LoadedTree(NamedTuple):
+    """A loaded tree plus everything players derive from it. Never mutate."""
+    filename: str
+    mtime_ns: int
+    tree: Dict
+    choice_index: ChoiceIndex
+
+
+class TreeCache:
+    """
+    Loaded trees keyed by (file, mtime) - editing a tree file makes the next request reload it
+    
+    Players lease a tree for the length of a request. A tree that is evicted,
+    reloaded or invalidated is closed (releasing a binary store's mmap and
+    file descriptor) as soon as its last lease ends.
+    """
+    
+    def __init__(self, max_trees: int = 16):
+        """
+        Initialize cache
+        
+        Args:
+            max_trees: Trees kept loaded (least recently used is dropped first)
+        """
+        self.max_trees = max_trees
+        self._trees = OrderedDict()  # abs path -> LoadedTree
+        self._load_locks = {}  # abs path -> lock held while that file loads
+        self._leases = {}  # id(LoadedTree) -> leases currently held
+        self._retired = {}  # id(LoadedTree) -> tree dropped from the cache, closed on its last release
+        self._lock = threading.Lock()
+        
+        # Stats
+        self.hits = 0
+        self.loads = 0
+    
+    def acquire(self, filename: str) -> LoadedTree:
+        """
+        Lease a loaded tree, loading it if it is new or its file changed
+        (pair every call with release)
+        
+        Raises:
+            FileNotFoundError: If the tree file does not exist
+        """
+        path = os.path.abspath(filename)
+        mtime_ns = os.stat(path).st_mtime_ns
+        
+        cached = self._lookup(path, mtime_ns)
+        if cached is not None:
+            return cached
+        
+        with self._lock:
+            load_lock = self._load_locks.setdefault(path, threading.Lock())
+        
+        # One load per file even if many players arrive at once
+        with load_lock:
+            cached = self._lookup(path, mtime_ns)
+            if cached is not None:
+                return cached
+            
+            tree = self._load(path)
+            loaded = LoadedTree(path, mtime_ns, tree, ChoiceIndex(tree))
+            
+            with self._lock:
+                dropped = [self._trees.pop(path)] if path in self._trees else []
+                self._trees[path] = loaded
+                self._leases[id(loaded)] = 1
+                self.loads += 1
+                while len(self._trees) > self.max_trees:
+                    dropped.append(self._trees.popitem(last=False)[1])
+                dropped = [old for old in dropped if self._retire(old)]
+            
+            for old in dropped:
+                self._close(old)
+            
+            print(f"📂 Story tree cached: {path} ({len(tree['nodes'])} nodes)")
+            return loaded
+    
+    def release(self, loaded: LoadedTree):
+        """End a lease from acquire (closes the tree if it was dropped meanwhile)"""
+        with self._lock:
+            remaining = self._leases.pop(id(loaded)) - 1
+            if remaining:
+                self._leases[id(loaded)] = remaining
+                return
+            if self._retired.pop(id(loaded), None) is None:
+                return  # Still cached
+        self._close(loaded)
+    
+    @contextmanager
+    def lease(self, filename: str) -> Iterator[LoadedTree]:
+        """Use a loaded tree for one request (see acquire)"""
+        loaded = self.acquire(filename)
+        try:
+            yield loaded
+        finally:
+            self.release(loaded)
+    
+    def _lookup(self, path: str, mtime_ns: int) -> Optional[LoadedTree]:
+        with self._lock:
+            cached = self._trees.get(path)
+            if cached is not None and cached.mtime_ns == mtime_ns:
+                self._trees.move_to_end(path)
+                self._leases[id(cached)] = self._leases.get(id(cached), 0) + 1
+                self.hits += 1
+                return cached
+        return None
+    
+    def _retire(self, loaded: LoadedTree) -> bool:
+        """Handle a tree leaving the cache - True if it can be closed now (caller holds the lock)"""
+        if id(loaded) in self._leases:
+            self._retired[id(loaded)] = loaded
+            return False
+        return True
+    
+    @staticmethod
+    def _close(loaded: LoadedTree):
+        """Release a dropped tree's file (JSON trees hold nothing open)"""
+        if isinstance(loaded.tree['nodes'], LazyNodes):
+            loaded.tree['nodes'].store.close()
+    
+    @staticmethod
+    def _load(path: str) -> Dict:
+        """Read a tree file (binary stores stay on disk and load nodes on demand)"""
+        if is_tree_store(path):
+            return open_tree_store(path)
+        with open(path, 'r') as f:
+            return json.load(f)
+    
+    def invalidate(self, filename: str) -> bool:
+        """Drop a tree (players leasing it keep using it until they release it)"""
+        with self._lock:
+            loaded = self._trees.pop(os.path.abspath(filename), None)
+            if loaded is None:
+                return False
+            closable = self._retire(loaded)
+        if closable:
+            self._close(loaded)
+        return True
+    
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        with self._lock:
+            return {
+                'trees': len(self._trees),
+                'leased': sum(self._leases.values()),
+                'retired': len(self._retired),
+                'hits': self.hits,
+                'loads': self.loads,
+                'files': [os.path.basename(path) for path in self._trees]
+            }
+
+
+# Singleton instance
+_tree_cache = None
+_tree_cache_lock = threading.Lock()
+
+def get_tree_cache() -> TreeCache:
+    """Get or create global tree cache instance"""
+    global _tree_cache
+    with _tree_cache_lock:
+        if _tree_cache is None:
+            _tree_cache = TreeCache()
+    return _tree_cache
@@ -0,0 +1,569 @@
+"""
+Tree Farm - Distributed story-tree generation over a durable work queue
+Frontier nodes of many trees (genres x seeds) sit in a SQLite queue; any number of
+worker processes claim batches, generate them with one shared model each, and commit
+
+Usage:
+    python tree_farm.py add --genres detective war horror --seeds 0 1 2 --num-nodes 25
+    python tree_farm.py work                 (run one per GPU/CPU budget, on any machine)
+    python tree_farm.py status
+    python tree_farm.py export --out story_trees
+
+Workers on several machines need the database on a filesystem with working
+locks (local disk shared over NFS usually is not - use one queue host then).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from story_tree_store import TREE_STORE_EXTENSION, write_tree_store
+
+
+DEFAULT_DB = 'tree_farm.db'
+DEFAULT_MODEL = 'TinyLlama/TinyLlama-1.1B-Chat-v1.0'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trees (
+    tree_id TEXT PRIMARY KEY,
+    genre TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    num_nodes INTEGER NOT NULL,
+    max_depth INTEGER NOT NULL,
+    title TEXT,
+    characters TEXT,
+    locations TEXT,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    tree_id TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    parent_id TEXT,
+    choice_made TEXT,
+    depth INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    claimed_at REAL,
+    finished_at REAL,
+    text TEXT,
+    choices TEXT,
+    is_ending INTEGER,
+    PRIMARY KEY (tree_id, node_id)
+);
+CREATE INDEX IF NOT EXISTS nodes_by_status ON nodes (status, depth);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    model TEXT,
+    started REAL,
+    last_seen REAL,
+    nodes_done INTEGER DEFAULT 0,
+    batches INTEGER DEFAULT 0,
+    busy_seconds REAL DEFAULT 0
+);
+"""
+
+
+def node_seed(tree_seed: int, node_id: str) -> int:
+    """Sampling seed for one node - depends only on the tree's seed and the node's position"""
+    digest = hashlib.blake2b(f"{tree_seed}:{node_id}".encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class GenerationFarm:
+    """SQLite-backed queue of story-tree nodes waiting to be generated"""
+    
+    def __init__(self, db_path: str = DEFAULT_DB, lease_seconds: float = 900):
+        """
+        Open (or create) a farm database
+        
+        Args:
+            db_path: SQLite file shared by every worker
+            lease_seconds: A claimed batch not committed within this time is
+                           handed to another worker (its worker is assumed dead)
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction - IMMEDIATE so concurrent claimers never both see the same rows"""
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+            self._conn.execute('COMMIT')
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+    
+    def add_trees(self, genres: List[str], seeds: List[int], num_nodes: int = 25, max_depth: int = 5) -> List[str]:
+        """
+        Queue one tree per (genre, seed) - trees already in the farm are left alone
+        
+        Returns:
+            Ids of the newly queued trees
+        """
+        added = []
+        now = time.time()
+        
+        with self._transaction() as conn:
+            for genre in genres:
+                for seed in seeds:
+                    tree_id = f"{genre}_seed{seed}"
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO trees (tree_id, genre, seed, num_nodes, max_depth, status, created) "
+                        "VALUES (?, ?, ?, ?, ?, 'active', ?)",
+                        (tree_id, genre, seed, num_nodes, max_depth, now)
+                    )
+                    if cursor.rowcount:
+                        conn.execute(
+                            "INSERT INTO nodes (tree_id, node_id, depth, status) VALUES (?, 'start', 0, 'pending')",
+                            (tree_id,)
+                        )
+                        added.append(tree_id)
+        
+        return added
+    
+    def register_worker(self, worker_id: str, model_name: str):
+        """Record a worker so its throughput shows up in status"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, host, pid, model, started, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (worker_id, socket.gethostname(), os.getpid(), model_name, now, now)
+            )
+    
+    def claim(self, worker_id: str, max_batch: int) -> List[Dict]:
+        """
+        Claim up to max_batch pending nodes that can share one model call
+        (same genre and depth, shallowest first)
+        
+        Returns:
+            Claimed nodes with their tree's generation settings (empty if none pending)
+        """
+        now = time.time()
+        
+        with self._transaction() as conn:
+            # Hand back work from workers that died mid-batch
+            conn.execute(
+                "UPDATE nodes SET status = 'pending', worker_id = NULL, claimed_at = NULL "
+                "WHERE status = 'claimed' AND claimed_at < ?",
+                (now - self.lease_seconds,)
+            )
+            
+            first = conn.execute(
+                "SELECT t.genre, n.depth FROM nodes n JOIN trees t USING (tree_id) "
+                "WHERE n.status = 'pending' ORDER BY n.depth, n.tree_id, n.node_id LIMIT 1"
+            ).fetchone()
+            if first is None:
+                return []
+            
+            rows = conn.execute(
+                "SELECT n.tree_id, n.node_id, n.parent_id, n.choice_made, n.depth, "
+                "t.genre, t.seed, t.num_nodes, t.max_depth, "
+                "(SELECT COUNT(*) FROM nodes a WHERE a.tree_id = n.tree_id) AS allocated "
+                "FROM nodes n JOIN trees t USING (tree_id) "
+                "WHERE n.status = 'pending' AND t.genre = ? AND n.depth = ? "
+                "ORDER BY n.tree_id, n.node_id LIMIT ?",
+                (first['genre'], first['depth'], max_batch)
+            ).fetchall()
+            
+            conn.executemany(
+                "UPDATE nodes SET status = 'claimed', worker_id = ?, claimed_at = ? WHERE tree_id = ? AND node_id = ?",
+                [(worker_id, now, row['tree_id'], row['node_id']) for row in rows]
+            )
+        
+        return [dict(row) for row in rows]
+    
+    def get_context(self, tree_id: str, parent_id: Optional[str], max_nodes: int = 2) -> str:
+        """Text of a node's last max_nodes ancestors, oldest first (as StoryTreeGenerator builds it)"""
+        parts = []
+        current = parent_id
+        while current is not None and len(parts) < max_nodes:
+            row = self._conn.execute(
+                "SELECT parent_id, text FROM nodes WHERE tree_id = ? AND node_id = ?", (tree_id, current)
+            ).fetchone()
+            if row is None:
+                break
+            parts.append(row['text'] or '')
+            current = row['parent_id']
+        return '\n\n'.join(reversed(parts))
+    
+    def complete(self, worker_id: str, results: List[Dict], busy_seconds: float) -> int:
+        """
+        Commit generated nodes and queue their children (within each tree's node budget)
+        
+        Args:
+            worker_id: Worker that claimed the nodes
+            results: Dicts with tree_id, node_id, text, choices, is_ending
+                     (start nodes may also carry title, characters, locations)
+            busy_seconds: Time the worker spent generating them
+        
+        Returns:
+            Nodes committed (results whose lease was lost to another worker are dropped)
+        """
+        now = time.time()
+        committed = 0
+        
+        with self._transaction() as conn:
+            for result in results:
+                cursor = conn.execute(
+                    "UPDATE nodes SET status = 'done', finished_at = ?, text = ?, choices = ?, is_ending = ? "
+                    "WHERE tree_id = ? AND node_id = ? AND status = 'claimed' AND worker_id = ?",
+                    (now, result['text'], json.dumps(result['choices']), int(result['is_ending']),
+                     result['tree_id'], result['node_id'], worker_id)
+                )
+                if not cursor.rowcount:
+                    continue
+                committed += 1
+                
+                if 'title' in result:
+                    conn.execute(
+                        "UPDATE trees SET title = ?, characters = ?, locations = ? WHERE tree_id = ?",
+                        (result['title'], json.dumps(result['characters']), json.dumps(result['locations']),
+                         result['tree_id'])
+                    )
+                
+                tree = conn.execute(
+                    "SELECT num_nodes, (SELECT COUNT(*) FROM nodes WHERE tree_id = ?) AS allocated "
+                    "FROM trees WHERE tree_id = ?",
+                    (result['tree_id'], result['tree_id'])
+                ).fetchone()
+                allocated = tree['allocated']
+                depth = result['depth']
+                
+                for choice in result['choices']:
+                    if allocated >= tree['num_nodes']:
+                        break  # Over budget - this path stays undeveloped, like a serial run
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO nodes (tree_id, node_id, parent_id, choice_made, depth, status) "
+                        "VALUES (?, ?, ?, ?, ?, 'pending')",
+                        (result['tree_id'], choice['leads_to'], result['node_id'], choice['text'], depth + 1)
+                    )
+                    allocated += cursor.rowcount
+            
+            # Trees with nothing left in flight are finished
+            conn.execute(
+                "UPDATE trees SET status = 'done', finished = ? WHERE status = 'active' AND NOT EXISTS "
+                "(SELECT 1 FROM nodes WHERE nodes.tree_id = trees.tree_id AND nodes.status != 'done')",
+                (now,)
+            )
+            
+            conn.execute(
+                "UPDATE workers SET last_seen = ?, nodes_done = nodes_done + ?, batches = batches + 1, "
+                "busy_seconds = busy_seconds + ? WHERE worker_id = ?",
+                (now, committed, busy_seconds, worker_id)
+            )
+        
+        return committed
+    
+    def has_unfinished_work(self) -> bool:
+        """True while any node is pending or claimed"""
+        row = self._conn.execute("SELECT 1 FROM nodes WHERE status != 'done' LIMIT 1").fetchone()
+        return row is not None
+    
+    def get_stats(self) -> Dict:
+        """Progress per tree and throughput per worker"""
+        trees = []
+        for row in self._conn.execute(
+            "SELECT t.tree_id, t.status, t.num_nodes, "
+            "SUM(n.status = 'done') AS done, SUM(n.status = 'claimed') AS claimed, "
+            "SUM(n.status = 'pending') AS pending "
+            "FROM trees t LEFT JOIN nodes n USING (tree_id) GROUP BY t.tree_id ORDER BY t.tree_id"
+        ):
+            trees.append(dict(row))
+        
+        workers = []
+        for row in self._conn.execute("SELECT * FROM workers ORDER BY worker_id"):
+            worker = dict(row)
+            busy = worker['busy_seconds'] or 0
+            worker['nodes_per_minute'] = round(worker['nodes_done'] * 60 / busy, 2) if busy else 0.0
+            workers.append(worker)
+        
+        return {
+            'trees': trees,
+            'workers': workers,
+            'nodes_done': sum(tree['done'] or 0 for tree in trees),
+            'nodes_remaining': sum((tree['pending'] or 0) + (tree['claimed'] or 0) for tree in trees)
+        }
+    
+    def print_status(self):
+        """Print farm progress"""
+        stats = self.get_stats()
+        print(f"\n🌾 Tree farm: {self.db_path}")
+        print(f"   {stats['nodes_done']} nodes done, {stats['nodes_remaining']} queued or in progress\n")
+        
+        for tree in stats['trees']:
+            icon = '✅' if tree['status'] == 'done' else '⏳'
+            print(f"   {icon} {tree['tree_id']:<24} {tree['done'] or 0:>4} done  "
+                  f"{tree['claimed'] or 0:>3} claimed  {tree['pending'] or 0:>3} pending  (budget {tree['num_nodes']})")
+        
+        if stats['workers']:
+            print("\n   Workers:")
+            now = time.time()
+            for worker in stats['workers']:
+                idle = now - (worker['last_seen'] or now)
+                print(f"   🤖 {worker['worker_id']:<28} {worker['nodes_done']:>5} nodes  "
+                      f"{worker['nodes_per_minute']:>7.2f} nodes/min  (last seen {idle:.0f}s ago)")
+    
+    def build_tree(self, tree_id: str) -> Dict:
+        """Assemble a tree in StoryTreeGenerator's format from its finished nodes"""
+        meta = self._conn.execute("SELECT * FROM trees WHERE tree_id = ?", (tree_id,)).fetchone()
+        if meta is None:
+            raise KeyError(tree_id)
+        
+        tree = {
+            'genre': meta['genre'],
+            'title': meta['title'] or '',
+            'nodes': {},
+            'characters': json.loads(meta['characters'] or '[]'),
+            'locations': json.loads(meta['locations'] or '[]'),
+            'start_node': 'start',
+            'seed': meta['seed']
+        }
+        
+        for row in self._conn.execute(
+            "SELECT * FROM nodes WHERE tree_id = ? AND status = 'done' ORDER BY depth, node_id", (tree_id,)
+        ):
+            node = {
+                'node_id': row['node_id'],
+                'text': row['text'],
+                'choices': json.loads(row['choices']),
+                'depth': row['depth']
+            }
+            if row['is_ending']:
+                node['is_ending'] = True
+            if row['parent_id'] is not None:
+                node['parent_id'] = row['parent_id']
+                node['choice_made'] = row['choice_made']
+            tree['nodes'][row['node_id']] = node
+        
+        return tree
+    
+    def export_finished(self, out_dir: str, extension: str = TREE_STORE_EXTENSION) -> List[str]:
+        """Write every finished tree to out_dir (JSON or binary store, by extension)"""
+        os.makedirs(out_dir, exist_ok=True)
+        written = []
+        
+        for row in self._conn.execute("SELECT tree_id FROM trees WHERE status = 'done' ORDER BY tree_id").fetchall():
+            tree = self.build_tree(row['tree_id'])
+            filename = os.path.join(out_dir, f"{row['tree_id']}_story{extension}")
+            
+            if extension == TREE_STORE_EXTENSION:
+                write_tree_store(tree, filename)
+            else:
+                with open(f"{filename}.tmp", 'w') as f:
+                    json.dump(tree, f, indent=2)
+                os.replace(f"{filename}.tmp", filename)
+            
+            print(f"💾 {row['tree_id']}: {len(tree['nodes'])} nodes → {filename}")
+            written.append(filename)
+        
+        return written
+    
+    def close(self):
+        self._conn.close()
+
+
+class FarmWorker:
+    """Pulls node batches from a farm and generates them with one model"""
+    
+    def __init__(self, farm: GenerationFarm, model_name: str = DEFAULT_MODEL, batch_size: int = 8,
+                 deterministic: bool = False, worker_id: Optional[str] = None, use_cache: bool = False):
+        """
+        Initialize worker (loads the model)
+        
+        Args:
+            farm: Farm to pull work from
+            model_name: Model shared by every tree this worker touches
+            batch_size: Nodes per model call
+            deterministic: Generate one node per call, seeded from its tree seed and id,
+                           so output is identical no matter which worker gets the node
+                           (batched sampling shares one RNG stream across the batch)
+            worker_id: Name in status output (default host:pid)
+            use_cache: Reuse outputs from the generation cache - re-running a build
+                       with the same seeds then skips the model for unchanged nodes
+        """
+        # Imported here so 'add', 'status' and 'export' never load torch
+        from story_tree_generator import StoryTreeGenerator
+        
+        self.farm = farm
+        self.model_name = model_name
+        self.batch_size = 1 if deterministic else batch_size
+        self.deterministic = deterministic
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        
+        self.generator = StoryTreeGenerator(model_name=model_name)
+        self.generator.max_batch_size = self.batch_size
+        if use_cache:
+            self.generator.engine.enable_generation_cache()
+        farm.register_worker(self.worker_id, model_name)
+    
+    def run(self, poll_seconds: float = 5.0, max_batches: Optional[int] = None) -> int:
+        """
+        Work until the queue is drained
+        
+        Waits (rather than exits) while other workers still hold claims, since
+        their commits can queue more nodes.
+        
+        Returns:
+            Nodes committed by this worker
+        """
+        total = 0
+        batches = 0
+        
+        while max_batches is None or batches < max_batches:
+            claimed = self.farm.claim(self.worker_id, self.batch_size)
+            if not claimed:
+                if not self.farm.has_unfinished_work():
+                    break
+                time.sleep(poll_seconds)
+                continue
+            
+            start = time.time()
+            results = self._generate(claimed)
+            elapsed = time.time() - start
+            
+            committed = self.farm.complete(self.worker_id, results, elapsed)
+            total += committed
+            batches += 1
+            
+            stats = self.farm.get_stats()
+            print(f"✅ {self.worker_id}: {committed} {claimed[0]['genre']} nodes at depth {claimed[0]['depth']} "
+                  f"in {elapsed:.1f}s ({committed * 60 / max(elapsed, 1e-6):.1f}/min) - "
+                  f"farm {stats['nodes_done']} done, {stats['nodes_remaining']} left")
+        
+        print(f"🏁 {self.worker_id} finished: {total} nodes")
+        return total
+    
+    def _generate(self, claimed: List[Dict]) -> List[Dict]:
+        """Generate a claimed batch (one genre and depth)"""
+        generator = self.generator
+        genre = claimed[0]['genre']
+        depth = claimed[0]['depth']
+        self._seed(node_seed(claimed[0]['seed'], claimed[0]['node_id']))
+        
+        if depth == 0:
+            return [self._generate_start(node) for node in claimed]
+        
+        contexts = [self.farm.get_context(node['tree_id'], node['parent_id']) for node in claimed]
+        texts = generator._generate_node_contents(
+            [node['node_id'] for node in claimed], contexts, genre,
+            choices_made=[node['choice_made'] for node in claimed]
+        )
+        
+        results = []
+        needs_choices = []
+        for node, text in zip(claimed, texts):
+            # Same ending rules as a serial run; a tree whose budget is fully
+            # allocated can't take children, so its remaining nodes end
+            is_ending = (
+                depth >= node['max_depth'] - 1 or
+                node['allocated'] >= node['num_nodes'] or
+                generator._is_natural_ending(text)
+            )
+            result = {'tree_id': node['tree_id'], 'node_id': node['node_id'], 'depth': depth,
+                      'text': text, 'choices': [], 'is_ending': is_ending}
+            results.append(result)
+            if not is_ending:
+                needs_choices.append(result)
+        
+        if needs_choices:
+            if self.deterministic:
+                self._seed(node_seed(claimed[0]['seed'], f"{claimed[0]['node_id']}/choices"))
+            choice_lists = generator._generate_choices_batch(
+                [(result['node_id'], result['text']) for result in needs_choices], genre, depth
+            )
+            for result, choices in zip(needs_choices, choice_lists):
+                result['choices'] = choices
+        
+        return results
+    
+    def _seed(self, seed: int):
+        """Seed the next model calls (the engine derives each request's sampling seed from this)"""
+        random.seed(seed)
+        self.generator.engine.generation_seed = seed
+    
+    def _generate_start(self, node: Dict) -> Dict:
+        """Opening node plus the tree's metadata"""
+        generator = self.generator
+        genre = node['genre']
+        generator.genre = genre
+        
+        opening = generator._generate_opening(genre)
+        return {
+            'tree_id': node['tree_id'],
+            'node_id': 'start',
+            'depth': 0,
+            'text': opening,
+            'choices': generator._generate_initial_choices(opening, genre),
+            'is_ending': False,
+            'title': generator._extract_title(opening),
+            'characters': generator._extract_characters(opening),
+            'locations': generator._extract_locations(opening)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed story-tree generation")
+    parser.add_argument('--db', default=DEFAULT_DB, help="Farm database (shared by all workers)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    add = commands.add_parser('add', help="Queue trees for genres x seeds")
+    add.add_argument('--genres', nargs='+', required=True)
+    add.add_argument('--seeds', nargs='+', type=int, default=[0])
+    add.add_argument('--num-nodes', type=int, default=25)
+    add.add_argument('--max-depth', type=int, default=5)
+    
+    work = commands.add_parser('work', help="Generate queued nodes until the farm is done")
+    work.add_argument('--model', default=DEFAULT_MODEL)
+    work.add_argument('--batch-size', type=int, default=8)
+    work.add_argument('--deterministic', action='store_true',
+                      help="One node per model call, seeded per node (reproducible across workers)")
+    work.add_argument('--worker-id')
+    work.add_argument('--lease-seconds', type=float, default=900)
+    work.add_argument('--cache', action='store_true', help="Reuse outputs from the generation cache")
+    
+    commands.add_parser('status', help="Show progress and worker throughput")
+    
+    export = commands.add_parser('export', help="Write finished trees")
+    export.add_argument('--out', default='story_trees')
+    export.add_argument('--format', choices=[TREE_STORE_EXTENSION, '.json'], default=TREE_STORE_EXTENSION)
+    
+    args = parser.parse_args()
+    
+    if args.command == 'add':
+        farm = GenerationFarm(args.db)
+        added = farm.add_trees(args.genres, args.seeds, args.num_nodes, args.max_depth)
+        print(f"🌱 Queued {len(added)} tree(s): {', '.join(added) or 'none new'}")
+    elif args.command == 'work':
+        farm = GenerationFarm(args.db, lease_seconds=args.lease_seconds)
+        FarmWorker(farm, args.model, args.batch_size, args.deterministic, args.worker_id, args.cache).run()
+    elif args.command == 'status':
+        farm = GenerationFarm(args.db)
+        farm.print_status()
+    else:
+        farm = GenerationFarm(args.db)
+        farm.export_finished(args.out, args.format)
+    
+    farm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,17 +11,37 @@ os.environ['USE_TF'] = 'NO'  # Don't load TensorFlow
 os.environ['USE_TORCH'] = 'YES'  # Only use PyTorch
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'TRUE'  # Fix OpenMP conflict
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, g, render_template, request, jsonify, session
 from flask_cors import CORS
 
 # Import ENHANCED story engine
-from adaptive_story_engine_enhanced import AdaptiveStoryEngine, StoryBeat
+from adaptive_story_engine_enhanced import (
+    AdaptiveStoryEngine, GenerationCancelled, StoryBeat, foreground_generation_in_flight, speculative_generation
+)
 
 # Import intelligent model selector
 from model_selector import ModelSelector
 
 # Import simple story generator (fast, on-demand generation)
-from simple_story_generator import SimpleStoryGenerator
+from simple_story_generator import SimpleStoryGenerator, BranchPrefetchCache
+
+# Background worker for deferred work (summaries, speculation)
+from background_tasks import BackgroundWorker, get_background_worker
+from opening_pool import OpeningPool
+
+# Per-stage timing exposed at /api/metrics
+from metrics import get_metrics
+
+# Memory accounting and heap snapshots for the admin endpoints
+from memory_report import get_heap_snapshots, models_report, process_rss_bytes, session_report
+from sampling_profiler import get_sampling_profiler, get_torch_op_profiler, to_collapsed
+from engine_pool import get_engine_pool
+
+# Import story tree system
+from story_tree_generator import StoryTreeGenerator
+from story_tree_player import StoryTreePlayer
+from story_tree_store import TREE_STORE_EXTENSION
+from tree_cache import get_tree_cache
 
 import json
 import os
@@ -36,8 +56,12 @@ CORS(app)
 
 # Story storage
 STORY_DATA_FILE = 'story_sessions.json'
+story_data_lock = threading.Lock()  # One writer of STORY_DATA_FILE at a time
 story_engines = {}
 story_generators = {}  # Simple story generators
+tree_sessions = {}  # Story tree players: only the tree file, current node and history
+tree_jobs = {}  # Story tree generation status by tree file
+tree_worker = BackgroundWorker(name='story-trees')  # Tree builds take minutes - kept off the shared worker
 SESSION_TIMEOUT_HOURS = 2
 
 # INTELLIGENT MODEL SELECTION
@@ -72,6 +96,50 @@ print("="*70 + "\n")
 USE_ENHANCED_PROMPTS = True   # True = better quality, False = faster
 DEFAULT_GENRE = 'mystery'      # Options: mystery, horror, adventure, thriller, drama
 
+# Rolling summary - condense older story history in the background after each response
+ENABLE_ROLLING_SUMMARY = True
+
+# Speculative 'continue' - pre-generate the next narration while the player reads
+ENABLE_SPECULATIVE_CONTINUE = True
+SPECULATION_WAIT_SECONDS = 30  # Max wait for an in-flight speculation before generating fresh
+
+# Branch prefetch - pre-generate every offered simple-story choice while the player reads
+ENABLE_BRANCH_PREFETCH = True
+PREFETCH_MAX_QUEUED = 4  # CPU budget: skip prefetch when this many background tasks are waiting
+branch_cache = BranchPrefetchCache(max_entries=48, max_chars=150000)  # Memory budget
+
+# Generation cache - identical requests (e.g. fixed genre openings) reuse earlier output
+ENABLE_GENERATION_CACHE = False
+GENERATION_CACHE_SEED = 0  # Seeded sampling so cached and fresh outputs agree (None = random)
+
+# Opening pool - ready-made story openings, generated while the server is idle
+ENABLE_OPENING_POOL = True
+OPENING_POOL_FILE = 'opening_pool.json'
+OPENING_POOL_GENRES = ['mystery', 'detective', 'horror', 'thriller', 'drama', 'romance', 'romcom']
+OPENING_POOL_SIZE = 3  # Per genre
+OPENING_POOL_IDLE_SECONDS = 60  # Refill only after this long without a request
+opening_pool = OpeningPool(OPENING_POOL_FILE, OPENING_POOL_GENRES, OPENING_POOL_SIZE)
+last_request_time = time.time()
+
+# Metrics - per-stage timing histograms, scraped from /api/metrics (Prometheus format)
+ENABLE_METRICS = True
+get_metrics().enabled = ENABLE_METRICS
+
+# Model preload - load and warm up DEFAULT_MODEL in the background at boot (see /readyz)
+PRELOAD_MODEL = True
+SERVER_START_TIME = time.time()
+readiness = {'status': 'starting', 'model': DEFAULT_MODEL, 'error': None}
+PROBE_ENDPOINTS = ('healthz', 'readyz', 'api_metrics')  # Polling these doesn't count as activity
+
+# Admin endpoints (/api/admin/*) - memory report and heap snapshots
+ADMIN_LOCAL_ONLY = True  # Only answer requests from this machine
+
+# Story trees - generated once, served read-only from a shared in-memory cache
+TREES_DIR = 'story_trees'
+TREE_FILE_EXTENSIONS = ('.json', TREE_STORE_EXTENSION)
+MAX_TREE_NODES = 200  # Per /api/generate-tree request - every node is a model call
+MAX_TREE_DEPTH = 10
+
 
 def cleanup_old_sessions():
     """Remove story sessions older than SESSION_TIMEOUT_HOURS"""
@@ -88,12 +156,273 @@ def cleanup_old_sessions():
             del story_engines[session_id]
             removed.append(session_id)
     
+    for session_id in list(tree_sessions.keys()):
+        try:
+            created = datetime.fromisoformat(tree_sessions[session_id]['created'])
+            if created < cutoff:
+                del tree_sessions[session_id]
+                removed.append(session_id)
+        except (KeyError, ValueError):
+            del tree_sessions[session_id]
+            removed.append(session_id)
+    
     if removed:
+        # Drop any background work still queued for removed sessions
+        removed_ids = set(removed)
+        get_background_worker().cancel_matching(
+            lambda key: isinstance(key, tuple) and len(key) > 1 and key[1] in removed_ids
+        )
         print(f"🧹 Cleaned up {len(removed)} old session(s)")
     
     return removed
 
 
+def run_after_response(response, fn, *args):
+    """Run fn once the response has been sent, so its cost never lands on the player's wait"""
+    response.call_on_close(lambda: fn(*args))
+    return response
+
+
+def precompute_continue(session_id):
+    """Generate the likely 'continue' narration for a session and cache it"""
+    story_data = story_engines.get(session_id)
+    if not story_data:
+        return
+    
+    engine = story_data['engine']
+    version = engine.get_state_version()
+    
+    cached = story_data.get('speculative_continue')
+    if cached and cached['version'] == version:
+        return  # Already computed (or computing) for this state
+    
+    if foreground_generation_in_flight():
+        return  # A player is waiting on the model - don't double their wait
+    
+    speculation = {'version': version, 'text': None, 'ready': threading.Event(), 'cancel': threading.Event()}
+    story_data['speculative_continue'] = speculation
+    
+    try:
+        with speculative_generation(speculation['cancel']):
+            continuation = engine.generate_continue_narration(track_events=False)
+        
+        # Keep it only if no real action arrived while we were generating
+        if continuation and engine.get_state_version() == version:
+            speculation['text'] = continuation
+    except GenerationCancelled:
+        pass  # The story moved on - the model is already free again
+    finally:
+        speculation['ready'].set()
+
+
+def schedule_speculative_continue(session_id):
+    """Queue speculative 'continue' generation on the background worker"""
+    if ENABLE_SPECULATIVE_CONTINUE:
+        get_background_worker().submit(('continue', session_id), precompute_continue, session_id)
+
+
+def schedule_summary_update(engine, session_id):
+    """Queue condensing the session's older history on the background worker"""
+    if ENABLE_ROLLING_SUMMARY:
+        engine.schedule_summary_update(('summary', session_id))
+
+
+def invalidate_speculative_continue(session_id):
+    """Discard cached or queued 'continue' narration (the story is about to change)"""
+    get_background_worker().cancel(('continue', session_id))
+    story_data = story_engines.get(session_id)
+    if story_data:
+        speculation = story_data.pop('speculative_continue', None)
+        if speculation:
+            speculation['cancel'].set()  # Stop a running generation as well
+
+
+def take_speculative_continue(session_id, engine):
+    """
+    Use the precomputed 'continue' narration if it matches the current story state
+    
+    Waits for an in-flight speculation rather than generating the same thing twice.
+    
+    Returns:
+        Narration text, or None if nothing usable was precomputed
+    """
+    story_data = story_engines[session_id]
+    speculation = story_data.pop('speculative_continue', None)
+    
+    if not speculation or speculation['version'] != engine.get_state_version():
+        # Nothing started for this state - don't let a queued or stale task run after us
+        get_background_worker().cancel(('continue', session_id))
+        if speculation:
+            speculation['cancel'].set()
+        return None
+    
+    if not speculation['ready'].wait(timeout=SPECULATION_WAIT_SECONDS):
+        speculation['cancel'].set()  # Too slow - free the model for the fresh generation
+    return speculation['text']
+
+
+def prefetch_branches(session_id, node_id):
+    """Pre-generate all offered choices of a simple-story node in one batch"""
+    session_data = story_generators.get(session_id)
+    if not session_data or session_data['node_id'] != node_id:
+        return  # Player already moved on
+    
+    prefetch = {'node_id': node_id, 'ready': threading.Event(), 'cancel': threading.Event()}
+    session_data['prefetch'] = prefetch
+    
+    try:
+        # Prompt context comes from the generator's bounded window
+        with speculative_generation(prefetch['cancel']):
+            branches = session_data['generator'].prefetch_branches(session_data['choices'])
+        
+        # Only keep them if the player is still looking at this node
+        if session_data['node_id'] == node_id:
+            for choice_text, segment in branches.items():
+                branch_cache.put(session_id, node_id, choice_text, segment)
+    except GenerationCancelled:
+        pass  # The player is generating on demand instead
+    finally:
+        prefetch['ready'].set()
+
+
+def schedule_branch_prefetch(session_id):
+    """Queue branch prefetch on the background worker (within the CPU budget)"""
+    session_data = story_generators.get(session_id)
+    if not ENABLE_BRANCH_PREFETCH or not session_data or not session_data['choices']:
+        return
+    
+    worker = get_background_worker()
+    if worker.get_stats()['pending'] >= PREFETCH_MAX_QUEUED:
+        return  # Server is busy - players will generate on demand
+    
+    worker.submit(('branches', session_id), prefetch_branches, session_id, session_data['node_id'])
+
+
+def take_prefetched_branch(session_id, choice):
+    """
+    Get the pre-generated segment for choice at the session's current node
+    
+    Waits for an in-flight prefetch of this node rather than generating twice.
+    
+    Returns:
+        Segment dict, or None if it wasn't prefetched
+    """
+    session_data = story_generators[session_id]
+    node_id = session_data['node_id']
+    prefetch = session_data.pop('prefetch', None)
+    
+    if prefetch and prefetch['node_id'] == node_id:
+        if not prefetch['ready'].wait(timeout=SPECULATION_WAIT_SECONDS):
+            prefetch['cancel'].set()  # Too slow - free the model for the on-demand generation
+    else:
+        # Not started yet (or for an older node) - don't let it run after we've moved on
+        get_background_worker().cancel(('branches', session_id))
+        if prefetch:
+            prefetch['cancel'].set()
+    
+    return branch_cache.take(session_id, node_id, choice)
+
+
+def resolve_tree_file(tree_file):
+    """Map a client-supplied tree name to a path inside TREES_DIR (None if not allowed)"""
+    name = os.path.basename(tree_file or '')
+    if not name.endswith(TREE_FILE_EXTENSIONS):
+        return None
+    return os.path.join(TREES_DIR, name)
+
+
+def generate_tree_file(tree_path, genre, num_nodes, max_depth):
+    """Generate a story tree to disk (resumes from its checkpoint after an interruption)"""
+    job = tree_jobs[tree_path]
+    job['status'] = 'generating'
+    checkpoint = f"{tree_path}.checkpoint.jsonl"
+    
+    try:
+        generator = StoryTreeGenerator(model_name=DEFAULT_MODEL)
+        if os.path.exists(checkpoint):
+            tree = generator.resume_story_tree(checkpoint)
+        else:
+            tree = generator.generate_story_tree(genre=genre, num_nodes=num_nodes, max_depth=max_depth,
+                                                 checkpoint_file=checkpoint)
+        generator.save_tree(tree_path)
+        os.remove(checkpoint)
+        
+        job['status'] = 'ready'
+        job['nodes'] = len(tree['nodes'])
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+        raise
+    finally:
+        job['finished'] = datetime.now().isoformat()
+
+
+def tree_node_response(player, result):
+    """Shape a StoryTreePlayer result for the client"""
+    return {
+        'node_id': player.current_node_id,
+        'text': result['text'],
+        'choices': [choice['text'] for choice in result.get('choices', [])],
+        'is_ending': result.get('is_ending', False),
+        'type': result.get('type', 'tree_node'),
+        'matched_choice': result.get('matched_choice')
+    }
+
+
+@app.before_request
+def mark_request():
+    """Remember when the last request arrived (idle-time work waits for quiet)"""
+    global last_request_time
+    g.request_start = time.perf_counter()
+    if request.endpoint not in PROBE_ENDPOINTS:
+        last_request_time = time.time()
+
+
+@app.after_request
+def record_request_time(response):
+    """Request latency per endpoint (the metrics scrape itself is not counted)"""
+    start = g.get('request_start')
+    if start is not None and request.endpoint is not None and request.endpoint not in PROBE_ENDPOINTS:
+        get_metrics().observe('story_http_request_seconds', request.endpoint, time.perf_counter() - start)
+    return response
+
+
+def opening_pool_worker():
+    """Background thread that tops up the opening pool during quiet periods"""
+    while True:
+        time.sleep(10)
+        if ENABLE_OPENING_POOL and time.time() - last_request_time >= OPENING_POOL_IDLE_SECONDS:
+            opening_pool.schedule_refill(DEFAULT_MODEL)
+
+
+def preload_model():
+    """Load DEFAULT_MODEL and run a warmup generation so the first player gets a warm model"""
+    try:
+        readiness['status'] = 'loading'
+        start = time.time()
+        # Session engines share these weights, so this is the model the first /api/start uses
+        engine = get_engine_pool().get(DEFAULT_MODEL)
+        readiness['load_seconds'] = round(time.time() - start, 1)
+        
+        readiness['status'] = 'warming'
+        readiness['warmup_seconds'] = round(engine.warmup(), 1)
+        readiness['status'] = 'ready'
+        print(f"✅ Model ready: loaded in {readiness['load_seconds']}s, warmed up in {readiness['warmup_seconds']}s")
+    except Exception as e:
+        # Still serve - /api/start will try loading again and report its own error
+        readiness['status'] = 'failed'
+        readiness['error'] = str(e)[:500]
+        print(f"❌ Model preload failed: {e}")
+
+
+def start_preload():
+    """Preload in the background so the port is bound (and /healthz answers) right away"""
+    if not PRELOAD_MODEL:
+        readiness['status'] = 'ready'
+        return
+    threading.Thread(target=preload_model, name='model-preload', daemon=True).start()
+
+
 def session_cleanup_worker():
     """Background thread to periodically clean up old sessions"""
     while True:
@@ -105,6 +434,10 @@ def session_cleanup_worker():
 cleanup_thread = threading.Thread(target=session_cleanup_worker, daemon=True)
 cleanup_thread.start()
 
+# Start opening pool refill thread
+opening_pool_thread = threading.Thread(target=opening_pool_worker, daemon=True)
+opening_pool_thread.start()
+
 
 class ChapterManager:
     """Manages story chapters and determines good breaking points"""
@@ -185,6 +518,14 @@ class StoryDatabase:
             'timestamp': datetime.now().isoformat()
         })
     
+    def get_all(self):
+        """Whole database (same shape as /api/database)"""
+        return {
+            'characters': list(self.characters.values()),
+            'locations': list(self.locations.values()),
+            'events': self.events
+        }
+    
     def search(self, query):
         """Search database for query term"""
         query_lower = query.lower()
@@ -255,7 +596,7 @@ def get_or_create_engine(session_id, model_name=None, genre=None):
                 use_enhanced_prompts=USE_ENHANCED_PROMPTS
             )
             print(f"✅ Successfully loaded: {model}\n")
-                
+        
         except Exception as e:
             error_msg = str(e)
             print(f"\n❌ FAILED to load {model}")
@@ -287,6 +628,9 @@ def get_or_create_engine(session_id, model_name=None, genre=None):
         if engine is None:
             raise RuntimeError("All models failed to load!")
         
+        if ENABLE_GENERATION_CACHE:
+            engine.enable_generation_cache(seed=GENERATION_CACHE_SEED)
+        
         story_engines[session_id] = {
             'engine': engine,
             'chapters': [],
@@ -304,23 +648,26 @@ def get_or_create_engine(session_id, model_name=None, genre=None):
 
 def save_story_data():
     """Save story sessions to file"""
-    data = {}
-    for session_id, session_data in story_engines.items():
-        data[session_id] = {
-            'chapters': session_data['chapters'],
-            'current_chapter': session_data['current_chapter'],
-            'database': {
-                'characters': session_data['database'].characters,
-                'locations': session_data['database'].locations,
-                'events': session_data['database'].events
-            },
-            'created': session_data['created'],
-            'model': session_data.get('model', DEFAULT_MODEL),
-            'genre': session_data.get('genre', DEFAULT_GENRE)
-        }
-    
-    with open(STORY_DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    with get_metrics().span('save_sessions'), story_data_lock:
+        data = {}
+        for session_id, session_data in list(story_engines.items()):
+            data[session_id] = {
+                'chapters': session_data['chapters'],
+                'current_chapter': session_data['current_chapter'],
+                'database': {
+                    'characters': session_data['database'].characters,
+                    'locations': session_data['database'].locations,
+                    'events': session_data['database'].events
+                },
+                'created': session_data['created'],
+                'model': session_data.get('model', DEFAULT_MODEL),
+                'genre': session_data.get('genre', DEFAULT_GENRE)
+            }
+        
+        # Swap in atomically - concurrent players must never see (or write) half a file
+        with open(f"{STORY_DATA_FILE}.tmp", 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(f"{STORY_DATA_FILE}.tmp", STORY_DATA_FILE)
 
 
 @app.route('/')
@@ -337,7 +684,7 @@ def start_story():
     model_name = data.get('model', DEFAULT_MODEL)
     genre = data.get('genre', DEFAULT_GENRE)
     
-    session_id = f"story_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    session_id = f"story_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}"
     session['story_id'] = session_id
     
     # Create engine with specified model and genre (with automatic fallback)
@@ -348,7 +695,11 @@ def start_story():
     if custom_prompt:
         initial_story = engine.start_story(initial_prompt=custom_prompt, genre=genre)
     else:
-        initial_story = engine.start_story(genre=genre)
+        # A pooled opening skips the slowest wait of the whole story
+        pregenerated = opening_pool.take(story_data['model'], genre) if ENABLE_OPENING_POOL else None
+        if pregenerated:
+            print(f"⚡ Using pooled {genre} opening")
+        initial_story = engine.start_story(genre=genre, pregenerated=pregenerated)
     
     # Create first chapter
     story_data['chapters'].append({
@@ -358,7 +709,8 @@ def start_story():
         'started': datetime.now().isoformat()
     })
     
-    story_data['database'].extract_from_text(initial_story, 1)
+    with get_metrics().span('extract_entities'):
+        story_data['database'].extract_from_text(initial_story, 1)
     
     save_story_data()
     
@@ -383,7 +735,7 @@ def start_story():
             'message': f"⚠️ RAM CONSTRAINT DETECTED\n\nYour system couldn't load '{story_data.get('original_model')}' due to insufficient memory.\n\nUsing fallback model '{story_data['model']}' instead.\n\n⚡ Story quality may be reduced, but the adventure continues!"
         }
     
-    return jsonify(response)
+    return run_after_response(jsonify(response), schedule_speculative_continue, session_id)
 
 
 @app.route('/api/action', methods=['POST'])
@@ -401,35 +753,33 @@ def process_action():
     
     # Check if user wants to continue the story narration
     if user_action.lower().strip() == 'continue':
-        # Generate more story continuation with enhanced context
-        context = engine._build_context_with_story_elements(recent_action="", max_history=2)
-        current_beat = engine.genre_config["beats"][engine.genre_beat_index] if engine.genre_config else "story_development"
-        player_guidance = engine.player_profile.get_narrative_guidance()
-        
-        system_instruction = engine._build_continuation_instruction("normal", player_guidance, current_beat)
-        
-        # Generate next segment with story element awareness
-        continuation = engine._generate_until_user_choice(
-            context,
-            system_instruction=system_instruction,
-            current_beat=current_beat,
-            recent_action=""
-        )
+        # Use the narration precomputed while the player was reading, if any
+        continuation = take_speculative_continue(session_id, engine)
+        speculative = continuation is not None
+        
+        if not speculative:
+            # Generate next segment with story element awareness
+            continuation = engine.generate_continue_narration()
         
         # Add to current chapter
         current_chapter_idx = story_data['current_chapter'] - 1
         story_data['chapters'][current_chapter_idx]['content'].append(continuation)
         
         # Extract story elements from new content
-        story_data['database'].extract_from_text(continuation, story_data['current_chapter'])
-        engine._extract_story_elements(continuation)
-        engine._extract_genre_elements(continuation)
+        with get_metrics().span('extract_entities'):
+            story_data['database'].extract_from_text(continuation, story_data['current_chapter'])
+        engine.commit_continue_narration(continuation, track_events=speculative)
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'continuation': continuation,
             'database': story_data['database'].get_all()
         })
+        run_after_response(response, schedule_speculative_continue, session_id)
+        return run_after_response(response, schedule_summary_update, engine, session_id)
+    
+    # A real action changes the story - any precomputed 'continue' is stale
+    invalidate_speculative_continue(session_id)
     
     # Process action with enhanced engine
     status, continuation = engine.process_user_action(user_action)
@@ -447,8 +797,9 @@ def process_action():
     story_data['actions_since_chapter'] += 1
     
     # Extract story elements
-    story_data['database'].extract_from_text(continuation, story_data['current_chapter'])
-    story_data['database'].add_event(user_action, story_data['current_chapter'])
+    with get_metrics().span('extract_entities'):
+        story_data['database'].extract_from_text(continuation, story_data['current_chapter'])
+        story_data['database'].add_event(user_action, story_data['current_chapter'])
     
     # Check if should create new chapter
     should_break, transition = ChapterManager.should_create_chapter(
@@ -481,7 +832,7 @@ def process_action():
     
     save_story_data()
     
-    return jsonify({
+    response = jsonify({
         'success': True,
         'status': status,
         'story': continuation,
@@ -489,6 +840,10 @@ def process_action():
         'beat': engine.current_beat.value,
         'new_chapter': new_chapter
     })
+    
+    # While the player reads: precompute 'continue', then condense older history
+    run_after_response(response, schedule_speculative_continue, session_id)
+    return run_after_response(response, schedule_summary_update, engine, session_id)
 
 
 @app.route('/api/chapters', methods=['GET'])
@@ -565,6 +920,141 @@ def get_full_database():
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    """Per-stage timing histograms, token counts and retries in Prometheus text format"""
+    return Response(get_metrics().render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+def admin_allowed():
+    """Admin endpoints expose internals - keep them to local requests unless configured otherwise"""
+    return not ADMIN_LOCAL_ONLY or request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/api/admin/memory', methods=['GET'])
+def admin_memory():
+    """Approximate memory per session, shared model memory and process RSS"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'error': 'Admin endpoints are local only'}), 403
+    
+    sessions = {}
+    for kind, store in (('adaptive', story_engines), ('simple', story_generators), ('tree', tree_sessions)):
+        for session_id, session_data in list(store.items()):
+            sessions[session_id] = session_report(kind, session_data)
+    
+    engines = [data['engine'] for data in list(story_engines.values())]
+    engines += [data['generator'].engine for data in list(story_generators.values())]
+    engines += list(get_engine_pool().loaded_engines().values())
+    models = models_report(engines)
+    
+    largest = sorted(sessions, key=lambda session_id: -sessions[session_id]['total_bytes'])
+    return jsonify({
+        'success': True,
+        'rss_bytes': process_rss_bytes(),
+        'models': models,
+        'models_bytes': sum(model['bytes'] for model in models),
+        'sessions_bytes': sum(report['total_bytes'] for report in sessions.values()),
+        'session_count': len(sessions),
+        'sessions': {session_id: sessions[session_id] for session_id in largest},
+        'heap': get_heap_snapshots().status()
+    })
+
+
+@app.route('/api/admin/heap', methods=['POST'])
+def admin_heap():
+    """tracemalloc snapshots: action = start | baseline | diff | stop"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'error': 'Admin endpoints are local only'}), 403
+    
+    data = request.get_json() or {}
+    action = data.get('action', 'diff')
+    snapshots = get_heap_snapshots()
+    
+    try:
+        if action == 'start':
+            result = snapshots.start()
+        elif action == 'baseline':
+            result = snapshots.take_baseline()
+        elif action == 'diff':
+            result = snapshots.diff(
+                limit=int(data.get('limit', 25)),
+                group_by=data.get('group_by', 'lineno')
+            )
+        elif action == 'stop':
+            result = snapshots.stop()
+        else:
+            return jsonify({'success': False, 'error': f'Unknown action: {action}'})
+    except (RuntimeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)})
+    
+    return jsonify({'success': True, 'action': action, **result})
+
+
+@app.route('/api/admin/profile', methods=['POST'])
+def admin_profile():
+    """
+    Profile the live process for N seconds
+    
+    mode 'sampling' (default): Python stacks of all threads as collapsed-stack text
+    (JSON with format='json'); mode 'torch': op-level breakdown of model.generate calls
+    """
+    if not admin_allowed():
+        return jsonify({'success': False, 'error': 'Admin endpoints are local only'}), 403
+    
+    data = request.get_json() or {}
+    mode = data.get('mode', 'sampling')
+    
+    try:
+        seconds = float(data.get('seconds', 10))
+        interval_ms = float(data.get('interval_ms', 5))
+        top = int(data.get('top', 30))
+        if not (seconds > 0 and interval_ms >= 0 and top > 0):
+            raise ValueError("seconds and top must be positive, interval_ms not negative")
+        # At least 1 ms between samples - 0 would busy-spin a core for the whole profile
+        interval_ms = min(max(interval_ms, 1.0), 1000.0)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Bad profile parameters: {e}'}), 400
+    
+    try:
+        if mode == 'torch':
+            result = get_torch_op_profiler().run(seconds, top=top)
+            return jsonify({'success': True, 'mode': mode, **result})
+        
+        if mode != 'sampling':
+            return jsonify({'success': False, 'error': f'Unknown mode: {mode}'})
+        
+        result = get_sampling_profiler().profile(
+            seconds,
+            interval=interval_ms / 1000,
+            include_idle=bool(data.get('include_idle', False))
+        )
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    
+    collapsed = to_collapsed(result['stacks'])
+    if data.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'mode': mode,
+            'seconds': result['seconds'],
+            'samples': result['samples'],
+            'collapsed': collapsed
+        })
+    return Response(collapsed, mimetype='text/plain')
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok', 'uptime_seconds': round(time.time() - SERVER_START_TIME, 1)})
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once the default model is loaded and warm, 503 until then"""
+    return jsonify(readiness), 200 if readiness['status'] == 'ready' else 503
+
+
 @app.route('/api/summary', methods=['GET'])
 def get_summary():
     """Get story summary"""
@@ -598,7 +1088,7 @@ def start_simple_story():
     genre = data.get('genre', 'adventure').lower()
     
     # Generate session ID
-    session_id = f'story_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    session_id = f'story_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{os.urandom(4).hex()}'
     session['story_id'] = session_id
     
     # Validate genre
@@ -617,23 +1107,26 @@ def start_simple_story():
             'generator': generator,
             'created': datetime.now().isoformat(),
             'genre': genre,
-            'context': ''
+            'node_id': None,
+            'choices': []
         }
         
         # Get opening scene (instant - no AI generation needed)
         opening = generator.start_story(genre)
         
-        # Store opening text as context
-        story_generators[session_id]['context'] = opening['text']
+        # Track which node's choices are on offer (the generator keeps the transcript)
+        story_generators[session_id]['node_id'] = opening['node_id']
+        story_generators[session_id]['choices'] = [c['text'] for c in opening['choices']]
         
         print(f"✅ Story started successfully!")
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'session_id': session_id,
             'node': opening
         })
-        
+        return run_after_response(response, schedule_branch_prefetch, session_id)
+    
     except Exception as e:
         print(f"\n❌ Story start failed: {e}")
         import traceback
@@ -665,26 +1158,38 @@ def continue_story():
     
     session_data = story_generators[session_id]
     generator = session_data['generator']
-    context = session_data['context']
     
     try:
         print(f"\n🎬 Continuing story with choice: {choice}")
         
-        # Generate next segment (takes ~10-15 seconds)
-        next_segment = generator.continue_story(choice, context)
+        prefetched = take_prefetched_branch(session_id, choice)
+        
+        if prefetched:
+            # Generated in the background while the player was reading
+            next_segment = generator.accept_prefetched(choice, prefetched)
+            print(f"⚡ Using prefetched branch")
+        else:
+            # Generate next segment (takes ~10-15 seconds)
+            # Prompt is a bounded window of the transcript, not the whole story
+            next_segment = generator.continue_story(choice)
         
-        # Update context
-        new_context = context + "\n\n" + choice + "\n\n" + next_segment['text']
-        story_generators[session_id]['context'] = new_context
+        # The unchosen branches are no longer reachable
+        branch_cache.discard(session_id)
+        
+        story_generators[session_id]['node_id'] = next_segment['node_id']
+        story_generators[session_id]['choices'] = (
+            [] if next_segment.get('is_ending') else [c['text'] for c in next_segment['choices']]
+        )
         
         print(f"✅ Story segment generated!")
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'node': next_segment,
             'is_ending': next_segment.get('is_ending', False)
         })
-        
+        return run_after_response(response, schedule_branch_prefetch, session_id)
+    
     except Exception as e:
         print(f"\n❌ Story continuation failed: {e}")
         import traceback
@@ -695,6 +1200,134 @@ def continue_story():
         })
 
 
+# ============================================================================
+# STORY TREE ENDPOINTS - Pre-generated branching stories with instant responses
+# ============================================================================
+
+@app.route('/api/generate-tree', methods=['POST'])
+def generate_tree():
+    """Queue generation of a story tree file (check progress by posting the same request again)"""
+    data = request.get_json() or {}
+    genre = data.get('genre', 'detective').lower()
+    tree_path = resolve_tree_file(data.get('tree_file') or f"{genre}_story{TREE_STORE_EXTENSION}")
+    
+    try:
+        num_nodes = min(max(int(data.get('num_nodes', 25)), 1), MAX_TREE_NODES)
+        max_depth = min(max(int(data.get('max_depth', 5)), 1), MAX_TREE_DEPTH)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'num_nodes and max_depth must be integers'}), 400
+    
+    if tree_path is None:
+        return jsonify({
+            'success': False,
+            'error': f'Tree file must end in one of: {", ".join(TREE_FILE_EXTENSIONS)}'
+        })
+    
+    job = tree_jobs.get(tree_path)
+    if job and job['status'] in ('queued', 'generating'):
+        return jsonify({'success': True, 'tree_file': os.path.basename(tree_path), **job})
+    
+    if os.path.exists(tree_path) and not data.get('overwrite', False):
+        return jsonify({'success': True, 'tree_file': os.path.basename(tree_path), 'status': 'ready'})
+    
+    os.makedirs(TREES_DIR, exist_ok=True)
+    tree_jobs[tree_path] = {
+        'status': 'queued',
+        'genre': genre,
+        'created': datetime.now().isoformat()
+    }
+    tree_worker.submit(('tree', tree_path), generate_tree_file, tree_path, genre, num_nodes, max_depth)
+    
+    print(f"\n🌳 Queued {genre} story tree: {tree_path}")
+    return jsonify({'success': True, 'tree_file': os.path.basename(tree_path), **tree_jobs[tree_path]})
+
+
+@app.route('/api/load-tree', methods=['POST'])
+def load_tree():
+    """Start playing a story tree (the tree itself is shared by every player)"""
+    data = request.get_json() or {}
+    tree_path = resolve_tree_file(data.get('tree_file'))
+    
+    if tree_path is None or not os.path.exists(tree_path):
+        return jsonify({
+            'success': False,
+            'error': 'Story tree not found. Generate it with /api/generate-tree first.'
+        })
+    
+    with get_tree_cache().lease(tree_path) as loaded:
+        player = StoryTreePlayer(loaded.tree, model_name=DEFAULT_MODEL, choice_index=loaded.choice_index)
+        result = player.start()
+        
+        session_id = f"tree_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.urandom(4).hex()}"
+        session['story_id'] = session_id
+        tree_sessions[session_id] = {
+            'tree_file': tree_path,
+            'node_id': player.current_node_id,
+            'history': player.history,
+            'created': datetime.now().isoformat()
+        }
+        
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'title': loaded.tree.get('title', 'Untitled'),
+            'genre': loaded.tree.get('genre'),
+            'node': tree_node_response(player, result)
+        })
+
+
+@app.route('/api/play-node', methods=['POST'])
+def play_node():
+    """Follow a choice in a story tree (AI fallback only for inputs that match no choice)"""
+    data = request.get_json() or {}
+    session_id = data.get('session_id') or session.get('story_id')
+    choice = data.get('choice', '').strip()
+    
+    if not session_id or session_id not in tree_sessions:
+        return jsonify({
+            'success': False,
+            'error': 'No active story tree session. Load a tree first.'
+        })
+    
+    if not choice:
+        return jsonify({
+            'success': False,
+            'error': 'No choice provided'
+        })
+    
+    state = tree_sessions[session_id]
+    tree_cache = get_tree_cache()
+    try:
+        loaded = tree_cache.acquire(state['tree_file'])
+    except FileNotFoundError:
+        return jsonify({
+            'success': False,
+            'error': 'This story tree is no longer available.'
+        })
+    
+    try:
+        if state['node_id'] not in loaded.tree['nodes']:
+            return jsonify({
+                'success': False,
+                'error': 'This story tree has changed since you started. Load it again.'
+            })
+        
+        # Players are throwaway views over the shared tree - the session keeps only position
+        player = StoryTreePlayer(loaded.tree, model_name=DEFAULT_MODEL, choice_index=loaded.choice_index)
+        player.current_node_id = state['node_id']
+        player.history = state['history']
+        result = player.make_choice(choice)
+        state['node_id'] = player.current_node_id
+        
+        return jsonify({
+            'success': True,
+            'node': tree_node_response(player, result),
+            'is_ending': result.get('is_ending', False)
+        })
+    finally:
+        tree_cache.release(loaded)
+
+
 if __name__ == '__main__':
     print("=" * 70)
     print("  AI STORY GENERATOR - Enhanced Edition with Story Trees")
@@ -723,5 +1356,8 @@ if __name__ == '__main__':
     print("   Endpoints: /api/generate-tree, /api/load-tree, /api/play-node")
     print("=" * 70)
     
+    # Load and warm the model while the server already answers /healthz
+    start_preload()
+    
     # Start Flask server (debug=False prevents auto-reload crashes)
     app.run(host='0.0.0.0', port=port, debug=debug_mode, use_reloader=False)